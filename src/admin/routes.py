@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy import select, update
+from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.main import get_session
-from typing import List
+from db.main import get_session, mirror_to_shards
+from typing import List, Optional
 from .schemas import StaffUpdate
 from db.models import Staff, SuperAdmin
 from staff.schemas import StaffRead, StaffCreate
 from utils.helper_func import (raise_http_exception, get_password_hash,
                                    get_current_user, is_superadmin)
+from utils.revocation import revoke_subject
+from utils.encoding import rows_response, serialize_list, LIST_RESPONSES
+from utils.cache import admin_cache
+from utils.preconditions import if_match, check_version, versioned_update, etag
 
 admin_router = APIRouter()
 
@@ -29,14 +33,19 @@ async def create_staff(staff: StaffCreate, current_user: SuperAdmin = Depends(ge
     session.add(db_staff)
     await session.commit()
     await session.refresh(db_staff)
+    await mirror_to_shards(db_staff)
     return db_staff
 
-@admin_router.get("/api/superadmin/staff/", response_model=List[StaffRead])
-async def get_staff_members(current_user: SuperAdmin = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@admin_router.get("/api/superadmin/staff/", response_model=List[StaffRead], responses=LIST_RESPONSES)
+async def get_staff_members(request: Request, current_user: SuperAdmin = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
     is_superadmin(current_user)
-    result = await session.execute(select(Staff))
-    staff_members = result.scalars().all()
-    return staff_members
+
+    async def load():
+        result = await session.execute(select(Staff))
+        return serialize_list(result.scalars().all(), StaffRead)
+
+    rows = await admin_cache.get_or_load(session, Staff.__tablename__, "all", load)
+    return rows_response(request, rows)
 
 @admin_router.get("/api/superadmin/staff/{staff_id}/", response_model=StaffRead)
 async def get_staff_member(staff_id: int, current_user: SuperAdmin = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
@@ -47,29 +56,43 @@ async def get_staff_member(staff_id: int, current_user: SuperAdmin = Depends(get
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Staff member not found")
     return staff_member
 
+@admin_router.post("/api/superadmin/staff/{staff_id}/revoke-tokens/")
+async def revoke_staff_tokens(staff_id: int, current_user: SuperAdmin = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    """Sign a (possibly compromised) staff account out everywhere; new logins still work."""
+    is_superadmin(current_user)
+    result = await session.execute(select(Staff.id).where(Staff.id == staff_id))
+    if result.scalar() is None:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Staff member not found")
+    await revoke_subject(session, "staff", staff_id)
+    return {"message": "Staff tokens revoked"}
+
 @admin_router.patch("/api/superadmin/staff/{staff_id}/update/", response_model=StaffRead)
 async def update_staff_member(
     staff_id: int,
     staff_update: StaffUpdate,
+    response: Response,
+    expected: Optional[List[int]] = Depends(if_match),
     current_user: SuperAdmin = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
+    """Send the staff member's `version` as If-Match to fail with 412 rather than overwrite someone else's change."""
     is_superadmin(current_user)
-    result = await session.execute(select(Staff).where(Staff.id == staff_id))
-    db_staff_member = result.scalars().first()
-    if not db_staff_member:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff member not found")
-
     update_data = staff_update.model_dump(exclude_unset=True)
 
     if "password" in update_data and update_data["password"] is not None:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
 
-    await session.execute(
-        update(Staff)
-        .where(Staff.id == staff_id)
-        .values(update_data)
-    )
-    await session.commit()
-    await session.refresh(db_staff_member)
+    if not update_data:
+        result = await session.execute(select(Staff).where(Staff.id == staff_id))
+        db_staff_member = result.scalars().first()
+        if not db_staff_member:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff member not found")
+        check_version(db_staff_member, expected)
+    else:
+        db_staff_member, _ = await versioned_update(
+            session, Staff, staff_id, update_data, expected, "Staff member not found"
+        )
+        await session.commit()
+        await mirror_to_shards(db_staff_member)
+    response.headers["ETag"] = etag(db_staff_member.version)
     return db_staff_member
@@ -0,0 +1,75 @@
+"""
+Size and encode-time benchmark for the list encodings offered through
+content negotiation (see utils/encoding.py).
+
+Builds synthetic OrderRead rows, several orders per customer as in the
+admin list, and reports body size (raw and gzipped) and the time to encode
+them from already-serialized dicts. No database is needed.
+
+    cd src && python -m benchmarks.bench_encoding [--orders 2000] [--customers 200]
+"""
+import argparse
+import gzip
+import random
+import time
+from datetime import datetime, timedelta
+from order.schemas import OrderRead
+from utils.encoding import ENCODERS, serialize_list
+
+
+def make_orders(rng: random.Random, orders: int, customers: int):
+    now = datetime.utcnow()
+    people = [
+        {
+            "id": i,
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "email": f"customer{i}@example.com",
+            "registration_date": now - timedelta(days=rng.randrange(700)),
+            "region": "lagos",
+        }
+        for i in range(1, customers + 1)
+    ]
+    return [
+        OrderRead.model_validate({
+            "id": i,
+            "customer": rng.choice(people),
+            "destination_address": f"{rng.randrange(1, 300)} Ozumba Mbadiwe Avenue, Victoria Island",
+            "destination_lat": 6.4 + rng.random() * 0.3,
+            "destination_lon": 3.3 + rng.random() * 0.4,
+            "water_amount": rng.choice([1000, 2500, 5000, 9000]),
+            "status": rng.choice(["pairing", "en_route", "delivered"]),
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+            "driver_id": rng.choice([None, rng.randrange(1, 100)]),
+            "staff_assigned_id": None,
+            "driver_charge": rng.choice([None, round(rng.random() * 10000, 2)]),
+            "payment_status": "pending",
+            "payment_date": None,
+        })
+        for i in range(1, orders + 1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = serialize_list(make_orders(random.Random(1), args.orders, args.customers), OrderRead)
+    baseline = None
+    for media_type, encode in ENCODERS.items():
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            body = encode(rows)
+        elapsed = (time.perf_counter() - start) / args.rounds
+        zipped = len(gzip.compress(body))
+        baseline = baseline or (len(body), zipped)
+        print(f"{media_type:<38} {len(body):>9} B ({len(body) / baseline[0]:>5.0%})  "
+              f"gzip {zipped:>8} B ({zipped / baseline[1]:>5.0%})  encode {elapsed * 1000:>7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Training-time benchmark for the demand forecast.
+
+Generates several years of synthetic orders with daily and weekly
+seasonality, feeds them to a DemandAccumulator in FORECAST_CHUNK_SIZE
+chunks the way the database stream does, and times training and the
+forecast itself. No database is needed.
+
+    cd src && python -m benchmarks.bench_forecast [--years 3] [--orders-per-day 3000] [--zones 50]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from order.forecast import DemandAccumulator, local_tomorrow
+from config import Config
+
+
+def synthetic_chunks(rng: np.random.Generator, start: datetime, days: int, per_day: int, chunk_size: int):
+    """Yield (created_at, lat, lon, litres) chunks with a morning/evening peak and quieter weekends."""
+    hour_profile = np.array([1, 1, 1, 1, 2, 4, 8, 10, 9, 6, 5, 5, 5, 5, 5, 6, 8, 10, 9, 6, 4, 3, 2, 1], dtype=float)
+    day_profile = np.array([1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.6])
+    start64 = np.datetime64(start, "us")
+    total = days * per_day
+    for offset in range(0, total, chunk_size):
+        size = min(chunk_size, total - offset)
+        day = rng.integers(0, days, size)
+        weekday = (start.weekday() + day) % 7
+        keep = rng.random(size) < day_profile[weekday] / day_profile.max()
+        day = day[keep]
+        hour = rng.choice(24, size=len(day), p=hour_profile / hour_profile.sum())
+        seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, len(day))
+        created_at = start64 + seconds.astype("timedelta64[s]")
+        lat = 6.4 + rng.random(len(day)) * 0.4
+        lon = 3.1 + rng.random(len(day)) * 0.6
+        lat[rng.random(len(day)) < 0.05] = np.nan
+        litres = rng.choice([1000, 2500, 5000, 9000, 12000], size=len(day))
+        yield created_at, lat, lon, litres.astype(float)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--orders-per-day", type=int, default=3000)
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=Config.FORECAST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    end = datetime.utcnow()
+    days = int(args.years * 365)
+    start = end - timedelta(days=days)
+    accumulator = DemandAccumulator(
+        [f"zone-{i}" for i in range(args.zones)],
+        6.4 + rng.random(args.zones) * 0.4,
+        3.1 + rng.random(args.zones) * 0.6,
+        start=start,
+        end=end,
+    )
+    chunks = list(synthetic_chunks(rng, start, days, args.orders_per_day, args.chunk_size))
+
+    began = time.perf_counter()
+    for chunk in chunks:
+        accumulator.add(*chunk)
+    trained = time.perf_counter() - began
+    began = time.perf_counter()
+    orders, litres = accumulator.forecast(local_tomorrow(end))
+    forecast = time.perf_counter() - began
+
+    print(f"train:    {trained:>8.2f} s  ({accumulator.rows} orders over {days} days, "
+          f"{accumulator.rows / trained:.0f} orders/s, {len(chunks)} chunks)")
+    print(f"forecast: {forecast * 1000:>8.2f} ms  ({orders.sum():.0f} orders, {litres.sum():.0f} litres "
+          f"expected across {args.zones} zones tomorrow)")
+
+
+if __name__ == "__main__":
+    main()
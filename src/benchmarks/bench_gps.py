@@ -0,0 +1,72 @@
+"""
+Throughput benchmark for driver GPS ingestion.
+
+Measures the in-memory position store on its own, then the full
+POST /api/drivers/locations/ path (JSON parsing, token check, validation)
+in-process through httpx's ASGI transport, so no server or database is
+needed. Track points are buffered but not written, because the app
+lifespan (and with it the background writer) is not started.
+
+    cd src && python -m benchmarks.bench_gps [--drivers 5000] [--batch 5] [--requests 20000]
+"""
+import argparse
+import asyncio
+import random
+import time
+import httpx
+from driver.tracking import DriverPositions, parse_pings, track_writer
+from main import app
+from utils.helper_func import create_driver_token
+
+
+def make_batch(rng: random.Random, now: float, size: int):
+    lat, lon = 6.4 + rng.random() * 0.3, 3.2 + rng.random() * 0.4
+    return [[now - (size - i) * 3, lat + i * 1e-4, lon + i * 1e-4] for i in range(size)]
+
+
+def bench_store(drivers: int, batch: int, rounds: int):
+    rng = random.Random(1)
+    store = DriverPositions(sample_seconds=30)
+    now = time.time()
+    batches = [(rng.randrange(1, drivers + 1), parse_pings(make_batch(rng, now, batch))) for _ in range(rounds)]
+    start = time.perf_counter()
+    for driver_id, pings in batches:
+        store.update(driver_id, pings)
+    elapsed = time.perf_counter() - start
+    print(f"store:    {rounds * batch / elapsed:>10.0f} pings/s  ({len(store)} drivers tracked)")
+
+
+async def bench_endpoint(drivers: int, batch: int, requests: int, concurrency: int):
+    rng = random.Random(2)
+    tokens = {driver_id: f"Bearer {create_driver_token(driver_id)}" for driver_id in range(1, drivers + 1)}
+    now = time.time()
+    bodies = [(rng.randrange(1, drivers + 1), {"pings": make_batch(rng, now, batch)}) for _ in range(requests)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(chunk):
+            for driver_id, body in chunk:
+                response = await client.post(
+                    "/api/drivers/locations/", json=body, headers={"Authorization": tokens[driver_id]}
+                )
+                assert response.status_code == 202, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(bodies[i::concurrency]) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    print(f"endpoint: {requests * batch / elapsed:>10.0f} pings/s  ({requests / elapsed:.0f} requests/s, "
+          f"{track_writer.pending} track points buffered)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--drivers", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=5, help="pings per request")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    bench_store(args.drivers, args.batch, args.requests)
+    asyncio.run(bench_endpoint(args.drivers, args.batch, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+HTTP load test that reports throughput together with the number of Postgres
+connections the deployment holds.
+
+Start the server first, e.g. with the budgeted multi-worker mode:
+
+    cd src && WEB_CONCURRENCY=4 DB_CONNECTION_BUDGET=40 python serve.py
+
+then, from src/ in another shell:
+
+    python -m benchmarks.bench_load --url http://localhost:8000 --path /api/admin/customers/ \\
+        --user-type staff --user-id 1 --clients 200 --seconds 30
+
+The access token is minted locally with JWT_SECRET_KEY, so the user must
+exist. While the load runs, the script samples pg_stat_activity through
+DATABASE_URL. It then prints requests/s, latency percentiles and the peak
+number of connections, next to the configured budget.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import asyncpg
+import httpx
+from config import Config
+from utils.helper_func import create_access_token
+
+
+async def sample_connections(stop: asyncio.Event, samples: list):
+    dsn = Config.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(dsn)
+    try:
+        while not stop.is_set():
+            count = await conn.fetchval(
+                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+            )
+            samples.append(count)
+            try:
+                await asyncio.wait_for(stop.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await conn.close()
+
+
+async def client_loop(client: httpx.AsyncClient, path: str, headers: dict, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/api/admin/customers/")
+    parser.add_argument("--user-type", default="staff")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": str(args.user_id), "user_type": args.user_type})
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, errors, connections = [], [], []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_connections(stop, connections))
+
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + args.seconds
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_loop(client, args.path, headers, deadline, latencies, errors) for _ in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float("nan")
+    print(f"clients={args.clients} duration={elapsed:.1f}s path={args.path}")
+    print(f"requests ok={len(latencies)} errors={len(errors)} throughput={len(latencies) / elapsed:,.0f} req/s")
+    if latencies:
+        print(f"latency ms p50={statistics.median(latencies):.1f} p95={pct(0.95):.1f} p99={pct(0.99):.1f}")
+    if connections:
+        print(
+            f"postgres connections peak={max(connections)} mean={statistics.mean(connections):.1f} "
+            f"(DB_CONNECTION_BUDGET={Config.DB_CONNECTION_BUDGET} across {Config.DB_NODE_COUNT} node(s))"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Caller-side cost of logging, i.e. the time a request handler spends on the
+event loop per log call, for the setups in utils/log.py compared with the
+print calls they replace.
+
+Each simulated request logs one application line and one access line. The
+sink is a real file, then the same file behind a write delay standing in for
+a stdout pipe the log collector is slow to drain. Reports the per-request
+cost on the calling thread, the request rate that caps a single worker at,
+and for the queue handler how long the writer thread then needs to drain.
+No database is needed.
+
+    cd src && python -m benchmarks.bench_logging [--requests 20000] [--sink-delay-us 100]
+"""
+import argparse
+import logging
+import os
+import queue
+import tempfile
+import time
+from logging.handlers import QueueListener
+from utils.log import ContextQueueHandler, JsonFormatter, request_id_var, skip_unused_record_fields
+
+
+class SlowSink:
+    """File wrapper whose writes block for `delay` seconds, like a full pipe."""
+
+    def __init__(self, out, delay: float):
+        self.out = out
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        return self.out.write(text)
+
+    def flush(self):
+        self.out.flush()
+
+
+def run(name: str, requests: int, log_request, drain=None):
+    start = time.perf_counter()
+    for i in range(requests):
+        log_request(i)
+    elapsed = time.perf_counter() - start
+    drained = ""
+    if drain is not None:
+        drain_start = time.perf_counter()
+        drain()
+        drained = f"  writer drained {time.perf_counter() - drain_start:>6.2f} s later"
+    per_request = elapsed / requests
+    print(f"  {name:<32} {per_request * 1e6:>9.2f} us/request  {1 / per_request:>11,.0f} req/s{drained}")
+
+
+def bench_sink(sink, requests: int):
+    def with_print(i):
+        print(f"Simulating payment for order {i} for 2500.0", file=sink, flush=True)
+        print(f"POST /api/customers/orders/{i}/accept-charge/ 200", file=sink, flush=True)
+    run("print", requests, with_print)
+
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(JsonFormatter())
+
+    def with_logger(i):
+        logger.info("Simulating payment for order %d for %s", i, 2500.0, extra={"order_id": i})
+        logger.info("%s %s %d", "POST", "/api/customers/orders/", 200, extra={"status": 200, "duration_ms": 1.5})
+
+    logger.handlers = [handler]
+    run("JSON, synchronous handler", requests, with_logger)
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, handler)
+    logger.handlers = [ContextQueueHandler(records)]
+    listener.start()
+    run("JSON, queue handler", requests, with_logger, drain=listener.stop)
+
+    def disabled_debug(i):
+        logger.debug("Quoted order %d at %s", i, 2500.0)
+        logger.debug("Quoted order %d at %s", i, 2500.0)
+    run("disabled debug (2 calls)", requests, disabled_debug)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sink-delay-us", type=float, default=100)
+    args = parser.parse_args()
+
+    # As start_logging() does
+    skip_unused_record_fields()
+    request_id_var.set("0123456789abcdef0123456789abcdef")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "bench.log"), "w") as out:
+            print("file sink")
+            bench_sink(out, args.requests)
+            print(f"sink blocking {args.sink_delay_us:g} us per write")
+            bench_sink(SlowSink(out, args.sink_delay_us / 1e6), max(1, args.requests // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Multi-client benchmark for the dispatch work queue.
+
+Seeds PAIRING orders into the database at DATABASE_URL, then lets 1, 2, 4, ...
+concurrent staff members drain the queue with claim_rows(). Each claimer
+simulates handling its batch and then completes it. The run reports
+throughput and fails if any order was handed out to more than one staff
+member.
+
+Run it against a scratch database only. It creates its own rows and resets
+their state between runs.
+
+    cd src && python -m benchmarks.bench_order_claims [--orders 5000] [--batch 10] [--clients 1,2,4,8,16]
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from sqlalchemy import delete, insert, update, select
+from db.main import async_session, init_db, engine
+from db.models import Customer, Order, OrderStatus, Staff
+from utils.work_queue import claim_rows, held_by
+
+BENCH_EMAIL_DOMAIN = "claims.bench.local"
+
+
+async def seed(orders: int, clients: int):
+    async with async_session() as session:
+        await cleanup(session)
+        customer = Customer(first_name="Bench", last_name="Customer", email=f"customer@{BENCH_EMAIL_DOMAIN}", hashed_password="-")
+        session.add(customer)
+        staff = [
+            Staff(first_name="Bench", last_name=str(i), email=f"staff{i}@{BENCH_EMAIL_DOMAIN}", hashed_password="-")
+            for i in range(clients)
+        ]
+        session.add_all(staff)
+        await session.flush()
+        await session.execute(
+            insert(Order),
+            [{"customer_id": customer.id, "destination_address": f"{i} Bench Street", "water_amount": 1000} for i in range(orders)],
+        )
+        await session.commit()
+        return customer.id, [member.id for member in staff]
+
+
+async def cleanup(session):
+    result = await session.execute(select(Customer.id).where(Customer.email.like(f"%@{BENCH_EMAIL_DOMAIN}")))
+    customer_ids = result.scalars().all()
+    if customer_ids:
+        await session.execute(delete(Order).where(Order.customer_id.in_(customer_ids)))
+        await session.execute(delete(Customer).where(Customer.id.in_(customer_ids)))
+    await session.execute(delete(Staff).where(Staff.email.like(f"%@{BENCH_EMAIL_DOMAIN}")))
+    await session.commit()
+
+
+async def reset(customer_id: int):
+    async with async_session() as session:
+        await session.execute(
+            update(Order)
+            .where(Order.customer_id == customer_id)
+            .values(status=OrderStatus.PAIRING, claimed_by_id=None, claim_expires_at=None)
+        )
+        await session.commit()
+
+
+async def claimer(staff_id: int, batch: int, work_ms: float, seen: Counter):
+    handled = 0
+    async with async_session() as session:
+        while True:
+            ids = await claim_rows(
+                session,
+                Order,
+                ready=[Order.status == OrderStatus.PAIRING],
+                order_by=[Order.created_at, Order.id],
+                claimant_id=staff_id,
+                lease_seconds=60,
+                limit=batch,
+            )
+            if not ids:
+                return handled
+            seen.update(ids)
+            # Stand-in for the staff member pricing and pairing the batch
+            await asyncio.sleep(work_ms / 1000)
+            await session.execute(
+                update(Order)
+                .where(Order.id.in_(ids), held_by(Order, staff_id))
+                .values(status=OrderStatus.PENDING_PAYMENT, claimed_by_id=None, claim_expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            handled += len(ids)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--work-ms", type=float, default=5)
+    parser.add_argument("--clients", default="1,2,4,8,16")
+    args = parser.parse_args()
+    client_counts = [int(n) for n in args.clients.split(",")]
+
+    await init_db()
+    customer_id, staff_ids = await seed(args.orders, max(client_counts))
+    print(f"orders={args.orders} batch={args.batch} work_ms={args.work_ms}")
+    print(f"{'clients':>7} {'seconds':>8} {'orders/s':>10} {'duplicates':>10} {'spread':>12}")
+    try:
+        for clients in client_counts:
+            await reset(customer_id)
+            seen = Counter()
+            start = time.perf_counter()
+            handled = await asyncio.gather(
+                *(claimer(staff_id, args.batch, args.work_ms, seen) for staff_id in staff_ids[:clients])
+            )
+            elapsed = time.perf_counter() - start
+            duplicates = sum(1 for count in seen.values() if count > 1)
+            print(f"{clients:>7} {elapsed:>8.2f} {sum(handled) / elapsed:>10.0f} {duplicates:>10} {min(handled):>5}-{max(handled):<6}")
+            assert duplicates == 0, "an order was claimed by more than one staff member"
+            assert sum(handled) == args.orders, "some orders were never claimed"
+    finally:
+        async with async_session() as session:
+            await cleanup(session)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Throughput benchmark for the delivery quote engine.
+
+Loads a synthetic set of zones and rate bands into a standalone QuoteEngine
+and prices batches of random orders, so no database is needed. Also times
+single-order quotes, which is what create_order does.
+
+    cd src && python -m benchmarks.bench_quotes [--zones 200] [--orders 100000] [--batch 10000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from order.pricing import QuoteEngine
+
+
+def make_engine(rng: random.Random, zones: int) -> QuoteEngine:
+    engine = QuoteEngine()
+    zone_rows = [
+        (f"zone-{i}", 6.4 + rng.random() * 0.4, 3.1 + rng.random() * 0.6, i % 20 == 0)
+        for i in range(zones)
+    ]
+    rate_rows = [(0, 2000, 0.5, 150), (5000, 3000, 0.4, 180), (10000, 4500, 0.35, 220), (20000, 8000, 0.3, 300)]
+    engine.load(zone_rows, rate_rows)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--zones", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    engine = make_engine(rng, args.zones)
+    now = datetime.utcnow()
+    litres = [rng.choice([1000, 2500, 5000, 9000, 12000, 30000]) for _ in range(args.orders)]
+    lats = [6.4 + rng.random() * 0.4 for _ in range(args.orders)]
+    lons = [3.1 + rng.random() * 0.6 for _ in range(args.orders)]
+    created = [now - timedelta(minutes=rng.randrange(24 * 60)) for _ in range(args.orders)]
+
+    start = time.perf_counter()
+    priced = 0
+    for offset in range(0, args.orders, args.batch):
+        window = slice(offset, offset + args.batch)
+        quotes = engine.quote(litres[window], lats[window], lons[window], created[window])
+        priced += int((~np.isnan(quotes)).sum())
+    elapsed = time.perf_counter() - start
+    print(f"batch:  {args.orders / elapsed:>10.0f} quotes/s  ({priced} priced, {args.zones} zones, batch {args.batch})")
+
+    singles = min(args.orders, 20000)
+    start = time.perf_counter()
+    for i in range(singles):
+        engine.quote_one(litres[i], lats[i], lons[i], created[i])
+    elapsed = time.perf_counter() - start
+    print(f"single: {singles / elapsed:>10.0f} quotes/s  ({elapsed / singles * 1e6:.1f} us per create_order quote)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Latency benchmark for the admin search at 1M customers.
+
+Seeds synthetic customers into the database at DATABASE_URL with a single
+INSERT ... SELECT generate_series, then times prefix, fuzzy (typo) and email
+queries through staff.search and prints latency percentiles. It also
+prints one query plan so you can confirm the trigram/prefix indexes are used.
+Needs the pg_trgm extension.
+
+    cd src && python -m benchmarks.bench_search [--customers 1000000] [--queries 200] [--keep]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from sqlalchemy import text, select, or_
+from db.main import async_session, init_db, engine
+from staff.search import search_customers, _match, customer_full_name, customer_email
+from db.models import Customer
+
+BENCH_EMAIL_DOMAIN = "search.bench.local"
+FIRST_NAMES = ["adaeze", "chinedu", "emeka", "funmilayo", "ibrahim", "kelechi", "ngozi", "oluwaseun",
+               "tunde", "yetunde", "aisha", "babajide", "chioma", "damilola", "ifeoma", "musa"]
+LAST_NAMES = ["okafor", "adeyemi", "balogun", "eze", "nwosu", "okonkwo", "abubakar", "adebayo",
+              "ogunleye", "obi", "danjuma", "onyekachi", "afolabi", "ibekwe", "lawal", "uche"]
+
+
+async def seed(customers: int):
+    async with async_session() as session:
+        existing = await session.scalar(
+            text("SELECT count(*) FROM customers WHERE email LIKE :pattern"), {"pattern": f"%@{BENCH_EMAIL_DOMAIN}"}
+        )
+        if existing >= customers:
+            return
+        await session.execute(
+            text(
+                """
+                INSERT INTO customers (first_name, last_name, email, hashed_password, registration_date)
+                SELECT ((:first)::text[])[1 + (i * 7919) % array_length((:first)::text[], 1)],
+                       ((:last)::text[])[1 + (i * 104729) % array_length((:last)::text[], 1)] || (i % 997)::text,
+                       'user' || i || '@' || (:domain)::text,
+                       '-',
+                       now()
+                FROM generate_series((:start)::int, (:stop)::int) AS i
+                """
+            ),
+            {"first": FIRST_NAMES, "last": LAST_NAMES, "domain": BENCH_EMAIL_DOMAIN,
+             "start": existing + 1, "stop": customers},
+        )
+        await session.commit()
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE customers"))
+
+
+def make_queries(n: int):
+    rng = random.Random(7)
+    queries = []
+    for i in range(n):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        kind = i % 3
+        if kind == 0:
+            queries.append(("prefix", f"{first} {last[:3]}"))
+        elif kind == 1:
+            # Drop one letter to simulate a typo
+            cut = rng.randrange(1, len(last))
+            queries.append(("fuzzy", f"{first} {last[:cut]}{last[cut + 1:]}"))
+        else:
+            queries.append(("email", f"user{rng.randrange(1, 1_000_000)}@"))
+    return queries
+
+
+async def explain(q: str):
+    name_match, _ = _match(customer_full_name, q)
+    email_match, _ = _match(customer_email, q)
+    stmt = select(Customer.id).where(or_(name_match, email_match)).limit(20)
+    compiled = stmt.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+    async with engine.connect() as conn:
+        plan = await conn.execute(text(f"EXPLAIN {compiled}"))
+        return "\n".join(row[0] for row in plan)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded customers for later runs")
+    args = parser.parse_args()
+
+    await init_db()
+    start = time.perf_counter()
+    await seed(args.customers)
+    print(f"seeded {args.customers} customers in {time.perf_counter() - start:.1f}s")
+
+    timings = {}
+    async with async_session() as session:
+        for kind, q in make_queries(args.queries):
+            start = time.perf_counter()
+            await search_customers(session, q, args.limit)
+            timings.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+
+    print(f"{'kind':>7} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for kind, samples in timings.items():
+        samples.sort()
+        p = lambda pct: samples[min(len(samples) - 1, int(len(samples) * pct))]
+        print(f"{kind:>7} {len(samples):>5} {statistics.median(samples):>8.2f} {p(0.95):>8.2f} {p(0.99):>8.2f}")
+    print()
+    print(await explain("chinedu oka"))
+
+    if not args.keep:
+        async with async_session() as session:
+            await session.execute(text("DELETE FROM customers WHERE email LIKE :pattern"), {"pattern": f"%@{BENCH_EMAIL_DOMAIN}"})
+            await session.commit()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
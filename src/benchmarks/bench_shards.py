@@ -0,0 +1,143 @@
+"""
+Multi-database check for the region shards.
+
+Point DATABASE_URL at the directory database and SHARD_DATABASE_URLS at two or
+more scratch databases (they can all live on one local Postgres), e.g.
+
+    createdb wta_dir && createdb wta_east && createdb wta_west
+    export DATABASE_URL=postgresql+asyncpg://postgres@localhost/wta_dir
+    export SHARD_DATABASE_URLS='{"east": "postgresql+asyncpg://postgres@localhost/wta_east",
+                                "west": "postgresql+asyncpg://postgres@localhost/wta_west"}'
+    cd src && python -m benchmarks.bench_shards [--orders 2000]
+
+It registers one customer per region, writes orders through that region's
+shard, then checks that the directory locates every order on the shard holding it,
+that no id is handed out twice across shards, that customers are mirrored
+only into their own shard, and that fan_out() returns every order. Finally it
+times the concurrent fan-out against querying the shards one after another.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from sqlalchemy import delete, insert, select
+from db.main import (SHARD_REGIONS, async_session, engine, fan_out, id_in, init_db, is_directory,
+                     locate_many, mirror_to_shards, new_row_ids, shard_engines, shard_session)
+from db.models import Customer, Order, ShardKey
+
+BENCH_EMAIL_DOMAIN = "shards.bench.local"
+
+
+async def seed(orders: int):
+    customers = {}
+    async with async_session() as session:
+        for region in SHARD_REGIONS:
+            customer = Customer(
+                first_name="Bench", last_name=region, email=f"{region}@{BENCH_EMAIL_DOMAIN}",
+                hashed_password="-", region=region,
+            )
+            session.add(customer)
+            customers[region] = customer
+        await session.commit()
+    for region, customer in customers.items():
+        await mirror_to_shards(customer, [region])
+        ids = await new_row_ids("orders", region, orders)
+        async with shard_session(region) as session:
+            await session.execute(
+                insert(Order),
+                [{"id": order_id, "customer_id": customer.id, "destination_address": f"{i} {region} Street",
+                  "water_amount": 1000}
+                 for i, order_id in enumerate(ids)],
+            )
+            await session.commit()
+    return {region: customer.id for region, customer in customers.items()}
+
+
+async def cleanup():
+    async with async_session() as session:
+        result = await session.execute(select(Customer.id).where(Customer.email.like(f"%@{BENCH_EMAIL_DOMAIN}")))
+        customer_ids = result.scalars().all()
+    if not customer_ids:
+        return
+    order_ids = []
+    for region in SHARD_REGIONS:
+        async with shard_session(region) as session:
+            result = await session.execute(
+                delete(Order).where(Order.customer_id.in_(customer_ids)).returning(Order.id)
+            )
+            order_ids.extend(result.scalars())
+            if not is_directory(region):
+                await session.execute(delete(Customer).where(Customer.id.in_(customer_ids)))
+            await session.commit()
+    async with async_session() as session:
+        await session.execute(delete(ShardKey).where(ShardKey.table_name == "orders", id_in(ShardKey.row_id, order_ids)))
+        await session.execute(delete(Customer).where(Customer.id.in_(customer_ids)))
+        await session.commit()
+
+
+async def bench_orders(session):
+    result = await session.execute(
+        select(Order.id, Customer.region)
+        .join(Customer, Order.customer_id == Customer.id)
+        .where(Customer.email.like(f"%@{BENCH_EMAIL_DOMAIN}"))
+    )
+    return result.all()
+
+
+async def check(customer_ids, orders: int):
+    seen = Counter()
+    for region in SHARD_REGIONS:
+        async with shard_session(region) as session:
+            rows = await bench_orders(session)
+            mirrored = await session.scalars(select(Customer.region).where(Customer.id.in_(customer_ids.values())))
+            mirrored = set(mirrored)
+        assert len(rows) == orders, f"{region}: expected {orders} orders, found {len(rows)}"
+        located = await locate_many("orders", [order_id for order_id, _ in rows])
+        assert all(located.get(order_id) == region for order_id, _ in rows), f"{region}: order id routes elsewhere"
+        assert all(owner == region for _, owner in rows), f"{region}: holds another region's orders"
+        if not is_directory(region):
+            assert mirrored == {region}, f"{region}: unexpected customer mirrors {mirrored}"
+        seen.update(order_id for order_id, _ in rows)
+        print(f"{region:>10}: {len(rows)} orders, first id {min(order_id for order_id, _ in rows)}")
+    assert all(count == 1 for count in seen.values()), "an order id was issued by more than one shard"
+    merged = await fan_out(bench_orders)
+    assert sorted(order_id for order_id, _ in merged) == sorted(seen), "fan_out lost or duplicated orders"
+
+
+async def time_fan_out(rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fan_out(bench_orders)
+    concurrent = (time.perf_counter() - start) / rounds * 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for region in SHARD_REGIONS:
+            async with shard_session(region) as session:
+                await bench_orders(session)
+    sequential = (time.perf_counter() - start) / rounds * 1000
+    print(f"fan-out over {len(SHARD_REGIONS)} shards: concurrent {concurrent:.2f} ms, sequential {sequential:.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000, help="orders per region")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    if len(SHARD_REGIONS) < 2:
+        raise SystemExit("Set SHARD_DATABASE_URLS to at least two databases")
+
+    await init_db()
+    await cleanup()
+    try:
+        customer_ids = await seed(args.orders)
+        await check(customer_ids, args.orders)
+        await time_fan_out(args.rounds)
+        print("ok")
+    finally:
+        await cleanup()
+        for shard_engine in set(shard_engines.values()) | {engine}:
+            await shard_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark for batch valuation of recyclable submissions.
+
+Prices 1M synthetic submissions with the vectorized TariffTable and compares
+it against pricing the same rows one at a time in Python.
+
+    cd src && python -m benchmarks.bench_valuation [--rows 1000000] [--batch 5000]
+"""
+import argparse
+import time
+import numpy as np
+from recycle.valuation import TariffTable, normalize_type
+
+TARIFFS = [
+    ("plastic", 2.50, 0.50),
+    ("glass", 1.75, 0.75),
+    ("aluminium", 6.00, 0.50),
+    ("paper", 0.80, 0.40),
+    ("cardboard", 1.10, 0.40),
+    ("electronics", 12.00, 2.00),
+]
+
+
+def scalar_price(tariffs, recyclable_type, is_pickup):
+    tariff = tariffs.get(normalize_type(recyclable_type))
+    if tariff is None:
+        return None
+    unit_value, pickup_fee = tariff
+    return round(max(unit_value - (pickup_fee if is_pickup else 0), 0), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    names = [name for name, _, _ in TARIFFS] + ["Plastic ", "GLASS", "unknown"]
+    types = [names[i] for i in rng.integers(0, len(names), args.rows)]
+    pickup = rng.random(args.rows) < 0.4
+
+    table = TariffTable()
+    table.load(TARIFFS)
+
+    start = time.perf_counter()
+    vectorized = np.concatenate([
+        table.price(types[i:i + args.batch], pickup[i:i + args.batch])
+        for i in range(0, args.rows, args.batch)
+    ])
+    vectorized_time = time.perf_counter() - start
+
+    lookup = {name: (unit, fee) for name, unit, fee in TARIFFS}
+    start = time.perf_counter()
+    scalar = [scalar_price(lookup, t, p) for t, p in zip(types, pickup.tolist())]
+    scalar_time = time.perf_counter() - start
+
+    expected = np.array([np.nan if v is None else v for v in scalar])
+    assert np.allclose(vectorized, expected, equal_nan=True)
+
+    print(f"rows={args.rows} batch={args.batch}")
+    print(f"vectorized: {vectorized_time:.3f}s ({args.rows / vectorized_time:,.0f} rows/s)")
+    print(f"per-row:    {scalar_time:.3f}s ({args.rows / scalar_time:,.0f} rows/s)")
+    print(f"speedup:    {scalar_time / vectorized_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -7,6 +8,129 @@ class Settings(BaseSettings):
     ADMIN_EMAIL: str
     ADMIN_PASSWORD: str
 
+    # Serving and connection budget, see db/main.py:pool_settings
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = 1
+    DB_NODE_COUNT: int = 1
+    DB_CONNECTION_BUDGET: int = 40
+    DB_POOL_TIMEOUT: int = 60
+    # Set when connecting through PgBouncer/pgcat in transaction mode
+    DB_EXTERNAL_POOLER: bool = False
+
+    # Logging, see utils/log.py. LOG_LEVELS overrides single loggers,
+    # e.g. {"access": "WARNING", "order.pricing": "DEBUG"}
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+
+    # Region shards for orders, drivers and recyclables, as a JSON object of
+    # region -> database URL. Empty means everything lives in DATABASE_URL.
+    SHARD_DATABASE_URLS: Dict[str, str] = {}
+    DEFAULT_REGION: str = "default"
+
+    # Outgoing mail
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 1025
+    SMTP_USERNAME: Optional[str] = None
+    SMTP_PASSWORD: Optional[str] = None
+    SMTP_USE_TLS: bool = False
+    MAIL_FROM: str = "no-reply@wta.local"
+    MAIL_POOL_SIZE: int = 4
+    MAIL_BATCH_SIZE: int = 50
+    MAIL_BATCH_INTERVAL_MS: int = 200
+    MAIL_QUEUE_MAX_SIZE: int = 10000
+    PASSWORD_RESET_URL: str = "http://localhost:3000/reset-password"
+    PASSWORD_RESET_TOKEN_EXPIRE_MINUTES: int = 15
+
+    # Recyclable image uploads
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 256 * 1024
+    THUMBNAIL_MAX_SIZE: int = 320
+    THUMBNAIL_WORKERS: int = 2
+
+    # Recyclable valuation
+    VALUATION_BATCH_SIZE: int = 5000
+    VALUATION_INTERVAL_SECONDS: int = 30
+
+    # Order archival
+    ORDER_ARCHIVE_AFTER_DAYS: int = 30
+    ORDER_ARCHIVE_BATCH_SIZE: int = 1000
+    ORDER_ARCHIVE_INTERVAL_SECONDS: int = 300
+
+    # Order event log
+    ORDER_EVENT_FLUSH_INTERVAL_MS: int = 5
+    ORDER_EVENT_BATCH_SIZE: int = 500
+    ORDER_EVENT_SPILL_PATH: str = "order_events.spill"
+
+    # Driver GPS tracking
+    DRIVER_TOKEN_EXPIRE_DAYS: int = 30
+    GPS_MAX_PINGS_PER_BATCH: int = 500
+    GPS_TRACK_SAMPLE_SECONDS: int = 30
+    GPS_STALE_SECONDS: int = 120
+    GPS_TRACK_FLUSH_INTERVAL_MS: int = 1000
+    GPS_TRACK_SPILL_PATH: str = "driver_locations.spill"
+    ETA_AVERAGE_SPEED_KMH: float = 30.0
+    ETA_ROAD_FACTOR: float = 1.3
+
+    # Driver feedback
+    FEEDBACK_FLUSH_INTERVAL_MS: int = 1000
+    FEEDBACK_BATCH_SIZE: int = 500
+    FEEDBACK_SPILL_PATH: str = "driver_feedback.spill"
+    # Ratings this many days old weigh half as much in a driver's recent rating
+    RATING_RECENT_HALF_LIFE_DAYS: float = 30.0
+
+    # Driver roster cache
+    ROSTER_REFRESH_SECONDS: float = 2.0
+    ROSTER_LOOKBACK_SECONDS: int = 5
+
+    # Token revocation
+    TOKEN_DENYLIST_SYNC_SECONDS: int = 5
+    TOKEN_DENYLIST_REBUILD_SECONDS: int = 3600
+    TOKEN_DENYLIST_CAPACITY: int = 100000
+    TOKEN_DENYLIST_ERROR_RATE: float = 0.001
+
+    # Offline reports, see reports/jobs.py
+    REPORT_WORKERS: int = 2
+    REPORT_CHUNK_SIZE: int = 50000
+    REPORT_POLL_SECONDS: int = 5
+    REPORT_LEASE_SECONDS: int = 3600
+    REPORT_MAX_DAYS: int = 366
+
+    # Delivery quotes
+    QUOTE_INTERVAL_SECONDS: int = 30
+    QUOTE_BATCH_SIZE: int = 5000
+    QUOTE_UTC_OFFSET_HOURS: int = 0
+    # Local hour of day -> price multiplier; hours not listed are 1.0
+    QUOTE_SURGE_MULTIPLIERS: Dict[int, float] = {7: 1.2, 8: 1.2, 17: 1.25, 18: 1.25}
+
+    # Demand forecast (local time uses QUOTE_UTC_OFFSET_HOURS)
+    FORECAST_HISTORY_WEEKS: int = 104
+    FORECAST_HALF_LIFE_WEEKS: float = 8.0
+    FORECAST_CHUNK_SIZE: int = 50000
+    FORECAST_INTERVAL_SECONDS: int = 3600
+
+    # Per-route rate limits: route name -> [requests, window_seconds], per user
+    RATE_LIMITS: Dict[str, List[int]] = {
+        "create_order": [10, 60],
+        "create_recyclable_submission": [10, 60],
+    }
+
+    # Staff work queues
+    REVIEW_LEASE_SECONDS: int = 300
+    DISPATCH_LEASE_SECONDS: int = 300
+    CLAIM_BATCH_MAX: int = 50
+
+    # Read-through cache for admin collections (customers, staff)
+    ADMIN_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Admin batch-get endpoints
+    BATCH_GET_MAX_IDS: int = 100
+
+    # Admin search
+    SEARCH_MIN_QUERY_LENGTH: int = 2
+    SEARCH_MAX_LIMIT: int = 50
+
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore"
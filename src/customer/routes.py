@@ -1,20 +1,39 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+import logging
+from fastapi import APIRouter, Depends, status, HTTPException, Request
+from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import EmailStr
 from sqlalchemy import select
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from typing import List, Optional
 from datetime import datetime
-from db.main import get_session
+from db.main import get_session, is_region, mirror_to_shards, new_row_id
 from jose import JWTError, jwt
 from config import Config
 from db.models import Customer, Order, OrderStatus, RecyclableSubmission, PaymentStatus
-from order.schemas import OrderRead, OrderCreate
-from recycle.schemas import RecyclableSubmissionRead, RecyclableSubmissionCreate
+from order.schemas import OrderRead, OrderCreate, OrderDetailRead
+from order.archive import get_customer_order_history, get_order_or_archived
+from order.events import record_order_event, snapshot, diff
+from order.pricing import quote_engine
+from driver.tracking import latest_position, estimate_eta_seconds
+from recycle.schemas import (RecyclableSubmissionRead, RecyclableSubmissionCreate, RecyclableImageRead,
+                             CreditBalanceRead, CreditLedgerEntryRead)
+from recycle.credits import get_balance, get_ledger, redeem_credit, ZERO
+from recycle.storage import image_store, iter_multipart_file, InvalidUpload, UploadTooLarge, IMAGE_HASH_PATTERN
 from utils.helper_func import (raise_http_exception, get_password_hash, verify_password, 
-                                   create_access_token, get_current_user)
+                                   create_access_token, get_current_user, get_customer_shard_session, customer_region,
+                                   create_password_reset_token, get_token_payload, PASSWORD_RESET_PURPOSE)
+from utils.revocation import revoke_token
+from utils.mailer import mail_queue, build_password_reset_email
+from utils.rate_limit import rate_limit
+from utils.encoding import list_response, LIST_RESPONSES
+from utils.fieldsets import FieldSet, fieldset
 from .schemas import CustomerRead, CustomerCreate
 
+logger = logging.getLogger(__name__)
+
 customer_router = APIRouter()
 
 @customer_router.post("/api/customers/register/", response_model=CustomerRead, status_code=status.HTTP_201_CREATED)
@@ -23,17 +42,22 @@ async def register_customer(customer: CustomerCreate, session: AsyncSession = De
     db_customer = result.scalars().first()
     if db_customer:
         await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Email already registered")
+    region = customer.region or Config.DEFAULT_REGION
+    if not is_region(region):
+        await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Unknown service region")
     hashed_password = get_password_hash(customer.password)
     db_customer = Customer(
         first_name=customer.first_name,
         last_name=customer.last_name,
         email=customer.email,
         hashed_password=hashed_password,
+        region=region,
     )
-    print("Here 3")
     session.add(db_customer)
     await session.commit()
     await session.refresh(db_customer)
+    await mirror_to_shards(db_customer, [region])
+    logger.info("Registered customer %d", db_customer.id, extra={"customer_id": db_customer.id, "region": region})
     return db_customer
 
 @customer_router.post("/api/customers/login/")
@@ -46,15 +70,27 @@ async def login_customer(form_data: OAuth2PasswordRequestForm = Depends(), sessi
     access_token = create_access_token(access_token_data)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@customer_router.post("/api/customers/logout/")
+async def logout_customer(
+    payload: dict = Depends(get_token_payload),
+    current_customer: Customer = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Revoke the bearer token; other tokens of the customer stay valid."""
+    if not isinstance(current_customer, Customer):
+        await raise_http_exception(status.HTTP_403_FORBIDDEN, "Only customers can log out here")
+    await revoke_token(session, payload)
+    return {"message": "Logged out"}
+
 @customer_router.post("/api/customers/password/reset/request/")
 async def request_customer_password_reset(email: EmailStr, session: AsyncSession = Depends(get_session)):
     result = await session.execute(select(Customer).where(Customer.email == email))
     db_customer = result.scalars().first()
     if not db_customer:
         await raise_http_exception(status.HTTP_404_NOT_FOUND, "Email not found")
-    #  Send email with reset link (implementation depends on your email service)
-    #  The reset link should contain a token (e.g., a short-lived JWT)
-    print(f"Reset link sent to {email}") # Replace with actual email sending
+    token = create_password_reset_token(db_customer.id, "customer")
+    if not mail_queue.enqueue(build_password_reset_email(email, token)):
+        await raise_http_exception(status.HTTP_503_SERVICE_UNAVAILABLE, "Unable to send email right now, please retry")
     return {"message": "Password reset link sent to your email"}
 
 @customer_router.post("/api/customers/password/reset/confirm/")
@@ -65,7 +101,7 @@ async def confirm_customer_password_reset(new_password: str, confirm_new_passwor
         payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
         user_id = payload.get("sub")
         user_type = payload.get("user_type")
-        if user_type != 'customer':
+        if user_type != 'customer' or payload.get("purpose") != PASSWORD_RESET_PURPOSE:
             await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Invalid Token")
     except JWTError:
         await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Invalid token")
@@ -78,73 +114,102 @@ async def confirm_customer_password_reset(new_password: str, confirm_new_passwor
     await session.commit()
     return {"message": "Password reset successfully"}
 
-@customer_router.post("/api/customers/orders/", response_model=OrderRead, status_code=status.HTTP_201_CREATED)
-async def create_order(order: OrderCreate, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@customer_router.post("/api/customers/orders/", response_model=OrderRead, status_code=status.HTTP_201_CREATED,
+                      dependencies=[Depends(rate_limit("create_order"))])
+async def create_order(order: OrderCreate, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_customer_shard_session)):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only create orders.")
     db_order = Order(
+        id=await new_row_id("orders", customer_region(current_customer)),
         customer_id=current_customer.id,
         destination_address=order.destination_address,
+        destination_lat=order.destination_lat,
+        destination_lon=order.destination_lon,
         water_amount=order.water_amount,
+        # None when there is no location or pricing yet; staff can still set it by hand
+        driver_charge=quote_engine.quote_one(order.water_amount, order.destination_lat, order.destination_lon),
     )
     session.add(db_order)
     await session.commit()
-    await session.refresh(db_order)
+    await session.refresh(db_order, ["customer"])
+    record_order_event(db_order.id, "created", current_customer, diff(
+        dict.fromkeys(["destination_address", "water_amount", "status", "driver_charge"]), db_order
+    ))
     return db_order
 
-@customer_router.get("/api/customers/orders/", response_model=List[OrderRead])
-async def get_customer_orders(current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@customer_router.get("/api/customers/orders/", response_model=List[OrderRead], responses=LIST_RESPONSES)
+async def get_customer_orders(
+    request: Request,
+    fields: FieldSet = Depends(fieldset(OrderRead)),
+    current_customer: Customer = Depends(get_current_user),
+    session: AsyncSession = Depends(get_customer_shard_session),
+):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own orders.")
-    result = await session.execute(
-        select(Order).where(Order.customer_id == current_customer.id)
-    )
-    orders = result.scalars().all()
-    return orders
+    orders = await get_customer_order_history(session, current_customer.id, fields)
+    return list_response(request, orders, fields.model)
 
-@customer_router.get("/api/customers/orders/{order_id}/", response_model=OrderRead)
-async def get_customer_order(order_id: int, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@customer_router.get("/api/customers/orders/{order_id}/", response_model=OrderDetailRead)
+async def get_customer_order(order_id: int, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_customer_shard_session)):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own order.")
-    result = await session.execute(
-        select(Order)
-        .where(Order.id == order_id, Order.customer_id == current_customer.id)
-    )
-    order = result.scalars().first()
+    order = await get_order_or_archived(session, order_id, current_customer.id)
     if not order:
         await raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
-    return order
+    detail = OrderDetailRead.model_validate(order)
+    if order.status == OrderStatus.EN_ROUTE and order.driver_id is not None:
+        position = await latest_position(session, order.driver_id)
+        if position is not None:
+            detail.driver_lat, detail.driver_lon = position[0], position[1]
+            detail.driver_position_at = datetime.utcfromtimestamp(position[2])
+            if order.destination_lat is not None and order.destination_lon is not None:
+                detail.eta_seconds = estimate_eta_seconds(
+                    position[0], position[1], order.destination_lat, order.destination_lon
+                )
+    return detail
 
 @customer_router.patch("/api/customers/orders/{order_id}/cancel/", response_model=OrderRead)
-async def cancel_order(order_id: int, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def cancel_order(order_id: int, current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_customer_shard_session)):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only cancel their own orders.")
     result = await session.execute(
         select(Order)
         .where(Order.id == order_id, Order.customer_id == current_customer.id)
+        .options(joinedload(Order.customer))
     )
     db_order = result.scalars().first()
     if not db_order:
         await raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
     if db_order.status != OrderStatus.PAIRING:
         await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Order cannot be cancelled at this status")
+    before = snapshot(db_order, ["status"])
     db_order.status = OrderStatus.CANCELLED
     await session.commit()
     await session.refresh(db_order)
+    record_order_event(db_order.id, "cancelled", current_customer, diff(before, db_order))
     return db_order
 
-@customer_router.post("/api/customers/recyclables/", response_model=RecyclableSubmissionRead, status_code=status.HTTP_201_CREATED)
+@customer_router.post("/api/customers/recyclables/", response_model=RecyclableSubmissionRead, status_code=status.HTTP_201_CREATED,
+                      dependencies=[Depends(rate_limit("create_recyclable_submission"))])
 async def create_recyclable_submission(
     submission: RecyclableSubmissionCreate,
     current_customer: Customer = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_customer_shard_session),
 ):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only create recyclable submissions.")
 
+    image_url = submission.image_url
+    if submission.image_hash:
+        if not image_store.exists(submission.image_hash):
+            await raise_http_exception(status.HTTP_400_BAD_REQUEST, "Unknown image_hash, upload the image first")
+        image_url = f"/api/recyclables/images/{submission.image_hash}/"
+
     db_submission = RecyclableSubmission(
+        id=await new_row_id("recyclable_submissions", customer_region(current_customer)),
         customer_id=current_customer.id,
-        image_url=submission.image_url,
+        image_url=image_url,
+        image_hash=submission.image_hash,
         recyclable_type=submission.recyclable_type,
         pickup_option=submission.pickup_option,
         pickup_address=submission.pickup_address,
@@ -152,33 +217,75 @@ async def create_recyclable_submission(
     )
     session.add(db_submission)
     await session.commit()
-    await session.refresh(db_submission)
+    await session.refresh(db_submission, ["customer"])
     return db_submission
 
-@customer_router.get("/api/customers/recyclables/", response_model=List[RecyclableSubmissionRead])
+@customer_router.post("/api/customers/recyclables/images/", response_model=RecyclableImageRead, status_code=status.HTTP_201_CREATED)
+async def upload_recyclable_image(request: Request, current_customer: Customer = Depends(get_current_user)):
+    """
+    Stream a multipart `file` field into the content-addressed image store.
+    The returned `image_hash` is then passed to the submission endpoint.
+    """
+    if not isinstance(current_customer, Customer):
+        await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only upload recyclable images.")
+    try:
+        stored = await image_store.save(iter_multipart_file(request, "file"))
+    except UploadTooLarge as exc:
+        await raise_http_exception(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, str(exc))
+    except InvalidUpload as exc:
+        await raise_http_exception(status.HTTP_400_BAD_REQUEST, str(exc))
+    try:
+        await image_store.ensure_thumbnail(stored.image_hash)
+    except Exception:
+        # Pillow could not decode it, so it is not an image we want to keep
+        if stored.created:
+            image_store.delete(stored.image_hash)
+        await raise_http_exception(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "File is not a supported image")
+    image_url = f"/api/recyclables/images/{stored.image_hash}/"
+    return RecyclableImageRead(
+        image_hash=stored.image_hash,
+        image_url=image_url,
+        thumbnail_url=f"{image_url}?thumbnail=true",
+        size=stored.size,
+    )
+
+@customer_router.get("/api/recyclables/images/{image_hash}/")
+async def get_recyclable_image(image_hash: str, thumbnail: bool = False, current_user = Depends(get_current_user)):
+    if not IMAGE_HASH_PATTERN.match(image_hash) or not image_store.exists(image_hash):
+        await raise_http_exception(status.HTTP_404_NOT_FOUND, "Image not found")
+    if thumbnail:
+        return FileResponse(image_store.thumbnail_path(image_hash), media_type="image/jpeg")
+    return FileResponse(image_store.image_path(image_hash))
+
+@customer_router.get("/api/customers/recyclables/", response_model=List[RecyclableSubmissionRead], responses=LIST_RESPONSES)
 async def get_customer_recyclable_submissions(
+    request: Request,
+    fields: FieldSet = Depends(fieldset(RecyclableSubmissionRead)),
     current_customer: Customer = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_customer_shard_session),
 ):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own recyclable submissions.")
     result = await session.execute(
-        select(RecyclableSubmission).where(RecyclableSubmission.customer_id == current_customer.id)
+        select(RecyclableSubmission)
+        .where(RecyclableSubmission.customer_id == current_customer.id)
+        .options(*fields.options(RecyclableSubmission))
     )
     submissions = result.scalars().all()
-    return submissions
+    return list_response(request, submissions, fields.model)
 
 @customer_router.get("/api/customers/recyclables/{submission_id}/", response_model=RecyclableSubmissionRead)
 async def get_customer_recyclable_submission(
     submission_id: int,
     current_customer: Customer = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_customer_shard_session),
 ):
     if not isinstance(current_customer, Customer):
         await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own recyclable submission.")
     result = await session.execute(
         select(RecyclableSubmission)
         .where(RecyclableSubmission.id == submission_id, RecyclableSubmission.customer_id == current_customer.id)
+        .options(joinedload(RecyclableSubmission.customer))
     )
     submission = result.scalars().first()
     if not submission:
@@ -188,15 +295,21 @@ async def get_customer_recyclable_submission(
 @customer_router.post("/api/customers/orders/{order_id}/accept-charge/")
 async def accept_driver_charge(
     order_id: int,
+    use_credit: bool = False,
     current_customer: Customer = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_customer_shard_session),
 ):
     """
     Accept the driver's charge for an order and update the order status.
+    With `use_credit`, recycling credit pays for as much of the charge as it
+    covers and only the rest goes to the payment gateway.
     """
+    # Locked until commit, so a second accept of the same order waits here and then sees it is no longer pairing
     result = await session.execute(
         select(Order)
         .where(Order.id == order_id, Order.customer_id == current_customer.id)
+        .options(joinedload(Order.customer))
+        .with_for_update(of=Order)
     )
     db_order = result.scalars().first()
     if not db_order:
@@ -212,17 +325,57 @@ async def accept_driver_charge(
         raise HTTPException(
             status_code=400, detail="Driver charge has not been set for this order."
         )
+    credit_applied = ZERO
+    if use_credit:
+        # Locks the balance until commit; rolled back with the order if payment fails
+        credit_applied = await redeem_credit(session, current_customer.id, db_order.driver_charge, order_id)
+    amount_due = db_order.driver_charge - credit_applied
+
     #  Integrate with payment gateway
     #  Test simulation for a successful payment
-    print(f"Simulating payment for order {order_id} for {db_order.driver_charge}")
+    logger.info("Simulating payment for order %d for %s", order_id, amount_due,
+                extra={"order_id": order_id, "amount": amount_due, "credit_applied": credit_applied})
     payment_successful = True
 
     if payment_successful:
+        before = snapshot(db_order, ["status", "payment_status", "payment_date"])
         db_order.status = OrderStatus.PENDING_PAYMENT
         db_order.payment_status = PaymentStatus.PAID
         db_order.payment_date = datetime.utcnow()
-        await session.commit()
+        try:
+            await session.commit()
+        except IntegrityError:
+            # The order already has a redemption (ix_credit_ledger_order_id): accepted by another request
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="This order's charge has already been accepted")
         await session.refresh(db_order)
-        return {"message": "Payment successful.  Awaiting dispatch.", "order": db_order}
+        changes = diff(before, db_order)
+        if credit_applied:
+            changes["credit_applied"] = [None, float(credit_applied)]
+        record_order_event(db_order.id, "charge_accepted", current_customer, changes)
+        return {
+            "message": "Payment successful.  Awaiting dispatch.",
+            "order": db_order,
+            "credit_applied": credit_applied,
+            "amount_charged": amount_due,
+        }
     else:
+        await session.rollback()
         raise HTTPException(status_code=400, detail="Payment failed")
+
+@customer_router.get("/api/customers/credits/", response_model=CreditBalanceRead)
+async def get_credit_balance(current_customer: Customer = Depends(get_current_user), session: AsyncSession = Depends(get_customer_shard_session)):
+    if not isinstance(current_customer, Customer):
+        await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own credit.")
+    return {"balance": await get_balance(session, current_customer.id)}
+
+@customer_router.get("/api/customers/credits/ledger/", response_model=List[CreditLedgerEntryRead])
+async def get_credit_ledger(
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    current_customer: Customer = Depends(get_current_user),
+    session: AsyncSession = Depends(get_customer_shard_session),
+):
+    if not isinstance(current_customer, Customer):
+        await raise_http_exception(status.HTTP_403_FORBIDDEN, "Customers can only view their own credit.")
+    return await get_ledger(session, current_customer.id, before_id, min(max(limit, 1), 500))
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 class BaseSchema(BaseModel):
@@ -12,7 +13,12 @@ class CustomerBase(BaseSchema):
 
 class CustomerCreate(CustomerBase):
     password: str
+    region: Optional[str] = None
 
 class CustomerRead(CustomerBase):
     id: int
-    registration_date: datetime
\ No newline at end of file
+    registration_date: datetime
+    region: str
+
+class CustomerSearchHit(CustomerRead):
+    score: float
@@ -0,0 +1,19 @@
+import asyncio
+from db.main import SHARD_REGIONS, init_db, shard_session
+from recycle.credits import backfill_credits
+
+async def main():
+    await init_db()
+    total = 0
+    for region in SHARD_REGIONS:
+        async with shard_session(region) as session:
+            while True:
+                count = await backfill_credits(session)
+                await session.commit()
+                if not count:
+                    break
+                total += count
+    print(f"Credit ledger backfilled: {total} submissions.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
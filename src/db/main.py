@@ -1,22 +1,71 @@
+import asyncio
+from collections import OrderedDict
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, any_, bindparam, text, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import AsyncGenerator
-from config import Config
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+from config import Config, Settings
 
 DATABASE_URL=Config.DATABASE_URL
 
 # SQLAlchemy Base model for model declarations
 Base = declarative_base()
 
+def database_count(settings: Settings = Config) -> int:
+    """Distinct databases each process opens a pool to: the directory plus any separate shards."""
+    return len({settings.DATABASE_URL, *settings.SHARD_DATABASE_URLS.values()})
+
+def pool_settings(settings: Settings = Config) -> dict:
+    """
+    Split DB_CONNECTION_BUDGET evenly across every pool that is opened:
+    WEB_CONCURRENCY workers on each of DB_NODE_COUNT nodes, each with one
+    engine per database. Half of each pool's share is kept open, the rest is
+    overflow. A budget too small to give every pool a connection is refused
+    rather than overrun.
+    """
+    processes = max(1, settings.WEB_CONCURRENCY * settings.DB_NODE_COUNT)
+    databases = database_count(settings)
+    per_pool = settings.DB_CONNECTION_BUDGET // (processes * databases)
+    if per_pool < 1:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET={settings.DB_CONNECTION_BUDGET} is less than one connection for each of "
+            f"{databases} databases in each of {processes} processes (WEB_CONCURRENCY x DB_NODE_COUNT); "
+            f"raise it to at least {processes * databases}"
+        )
+    pool_size = max(1, (per_pool + 1) // 2)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": per_pool - pool_size,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+def check_regions(settings: Settings = Config):
+    """Refuse to start with a DEFAULT_REGION that no shard serves."""
+    if settings.SHARD_DATABASE_URLS and settings.DEFAULT_REGION not in settings.SHARD_DATABASE_URLS:
+        raise ValueError(
+            f"DEFAULT_REGION={settings.DEFAULT_REGION!r} is not one of the regions in SHARD_DATABASE_URLS "
+            f"({', '.join(sorted(settings.SHARD_DATABASE_URLS))})"
+        )
+
+def engine_options(settings: Settings = Config) -> dict:
+    options = {"echo": False, "future": True, **pool_settings(settings)}
+    if settings.DB_EXTERNAL_POOLER:
+        # Transaction-mode poolers hand each transaction to an arbitrary server
+        # connection, so prepared statements must not be cached or reused by name.
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return options
+
+check_regions()
+
 # Create the async engine
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    pool_size=20,
-    max_overflow=20,
-    pool_timeout=60
-)
+engine = create_async_engine(DATABASE_URL, **engine_options())
 
 # Create a session factory
 async_session = sessionmaker(
@@ -25,15 +74,256 @@ async_session = sessionmaker(
     class_=AsyncSession
 )
 
+# Region shards. DATABASE_URL stays the global directory (customers, staff,
+# super admins); orders, drivers and recyclable submissions live on the shard
+# of their service region. Without SHARD_DATABASE_URLS there is a single shard
+# backed by the directory engine, so nothing changes for single-database setups.
+if Config.SHARD_DATABASE_URLS:
+    shard_engines = {
+        region: engine if url == DATABASE_URL else create_async_engine(url, **engine_options())
+        for region, url in sorted(Config.SHARD_DATABASE_URLS.items())
+    }
+else:
+    shard_engines = {Config.DEFAULT_REGION: engine}
+
+SHARD_REGIONS: List[str] = list(shard_engines)
+
+shard_sessions = {
+    region: sessionmaker(bind=shard_engine, expire_on_commit=False, class_=AsyncSession)
+    for region, shard_engine in shard_engines.items()
+}
+
+# Rows of sharded tables are registered in the directory's shard_keys before
+# they are written, under an id drawn from the directory's own sequence for the
+# table. Ids are unique across shards and a row stays routable however many
+# shards are added later. Values are the tables whose ids share the sequence.
+SHARDED_TABLES = {
+    "orders": ("orders", "orders_archive"),
+    "drivers": ("drivers",),
+    "recyclable_submissions": ("recyclable_submissions",),
+}
+
+# Rows never move between shards, so located regions are cached for good (LRU)
+SHARD_KEY_CACHE_SIZE = 100_000
+_shard_keys: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+
+# Directory rows are mirrored into shards so shard-side foreign keys and joins
+# (Order.customer, Order.staff_assigned) keep working. Columns a shard has no
+# business holding are replaced with these placeholders.
+MIRROR_PLACEHOLDERS = {"hashed_password": "!", "created_by_id": None}
+
+def is_region(region: str) -> bool:
+    return region in shard_engines
+
+def is_directory(region: str) -> bool:
+    return shard_engines[region] is engine
+
+async def fan_out(query: Callable[[AsyncSession], Awaitable[list]], regions: Optional[Iterable[str]] = None) -> list:
+    """Run `query` against every shard concurrently and concatenate the results."""
+    async def run(region):
+        async with shard_sessions[region]() as session:
+            return await query(session)
+    results = await asyncio.gather(*(run(region) for region in (regions or SHARD_REGIONS)))
+    return [row for rows in results for row in rows]
+
+def id_in(column, ids: Iterable[int]):
+    """`column = ANY(:ids)`: one array parameter however many ids, so the statement is cached once."""
+    return column == any_(bindparam(None, list(ids), type_=ARRAY(Integer)))
+
+async def mirror_to_shards(obj, regions: Optional[Iterable[str]] = None):
+    """Upsert a directory row (Customer, Staff) into the given shards."""
+    table = obj.__table__
+    values = {column.name: MIRROR_PLACEHOLDERS.get(column.name, getattr(obj, column.key)) for column in table.columns}
+    for region in regions or SHARD_REGIONS:
+        if is_directory(region):
+            continue
+        async with shard_engines[region].begin() as conn:
+            stmt = insert(table).values(values)
+            await conn.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.id],
+                set_={name: stmt.excluded[name] for name in values if name != "id"},
+            ))
+
+def _remember(table_name: str, row_id: int, region: str):
+    _shard_keys[(table_name, row_id)] = region
+    _shard_keys.move_to_end((table_name, row_id))
+    while len(_shard_keys) > SHARD_KEY_CACHE_SIZE:
+        _shard_keys.popitem(last=False)
+
+async def locate_many(table_name: str, ids: Iterable[int]) -> Dict[int, str]:
+    """Region of each id of a sharded table; ids that were never registered are left out."""
+    if not Config.SHARD_DATABASE_URLS:
+        return {row_id: Config.DEFAULT_REGION for row_id in ids}
+    from .models import ShardKey
+    found, missing = {}, []
+    for row_id in ids:
+        region = _shard_keys.get((table_name, row_id))
+        if region is None:
+            missing.append(row_id)
+        else:
+            _shard_keys.move_to_end((table_name, row_id))
+            found[row_id] = region
+    if missing:
+        async with async_session() as session:
+            result = await session.execute(
+                select(ShardKey.row_id, ShardKey.region)
+                .where(ShardKey.table_name == table_name, id_in(ShardKey.row_id, missing))
+            )
+            for row_id, region in result:
+                _remember(table_name, row_id, region)
+                found[row_id] = region
+    return found
+
+async def locate(table_name: str, row_id: int) -> Optional[str]:
+    """Region of the shard holding `row_id` of a sharded table, None if there is no such row."""
+    return (await locate_many(table_name, [row_id])).get(row_id)
+
+async def new_row_ids(table_name: str, region: str, count: int = 1) -> List[Optional[int]]:
+    """
+    Ids for `count` new rows of a sharded table on `region`'s shard, registered
+    before the rows are written. Without shards the ids are None and the
+    table's own sequence fills them in.
+    """
+    if table_name not in SHARDED_TABLES:
+        raise ValueError(f"{table_name} is not sharded")
+    if not Config.SHARD_DATABASE_URLS:
+        return [None] * count
+    from .models import ShardKey
+    async with async_session() as session:
+        result = await session.execute(
+            text(f"SELECT nextval('{table_name}_id_seq') FROM generate_series(1, :count)"), {"count": count}
+        )
+        ids = result.scalars().all()
+        await session.execute(
+            insert(ShardKey),
+            [{"table_name": table_name, "row_id": row_id, "region": region} for row_id in ids],
+        )
+        await session.commit()
+    for row_id in ids:
+        _remember(table_name, row_id, region)
+    return ids
+
+async def new_row_id(table_name: str, region: str) -> Optional[int]:
+    return (await new_row_ids(table_name, region))[0]
+
+async def _align_id_sequences():
+    """Move the directory's id sequences past every id already on a shard, never backwards."""
+    for table_name, tables in SHARDED_TABLES.items():
+        top = 0
+        for region in SHARD_REGIONS:
+            async with shard_engines[region].connect() as conn:
+                for table in tables:
+                    top = max(top, await conn.scalar(text(f"SELECT coalesce(max(id), 0) FROM {table}")))
+        if not top:
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(f"SELECT setval('{table_name}_id_seq', :top) FROM {table_name}_id_seq "
+                     f"WHERE :top > CASE WHEN is_called THEN last_value ELSE last_value - 1 END"),
+                {"top": top},
+            )
+
+async def sync_shard_keys(batch_size: int = 1000) -> List[Tuple[str, int, str]]:
+    """
+    Register rows that are on a shard but not in the directory: data from
+    before the move to shards, or from before shard_keys existed. Safe to
+    rerun. Returns (table, id, region) for ids found on more than one shard;
+    those stay routed to the region registered first and need fixing by hand.
+    """
+    from .models import ShardKey
+    conflicts = []
+    for table_name, tables in SHARDED_TABLES.items():
+        for region in SHARD_REGIONS:
+            for table in tables:
+                last_id = 0
+                while True:
+                    async with shard_engines[region].connect() as conn:
+                        result = await conn.execute(
+                            text(f"SELECT id FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                            {"last_id": last_id, "limit": batch_size},
+                        )
+                        ids = result.scalars().all()
+                    if not ids:
+                        break
+                    async with engine.begin() as conn:
+                        await conn.execute(
+                            insert(ShardKey).on_conflict_do_nothing(),
+                            [{"table_name": table_name, "row_id": row_id, "region": region} for row_id in ids],
+                        )
+                        result = await conn.execute(
+                            select(ShardKey.row_id).where(
+                                ShardKey.table_name == table_name,
+                                id_in(ShardKey.row_id, ids),
+                                ShardKey.region != region,
+                            )
+                        )
+                        conflicts.extend((table_name, row_id, region) for row_id in result.scalars())
+                    last_id = ids[-1]
+    return conflicts
+
+async def sync_directory_mirrors(customers: bool = False, batch_size: int = 1000):
+    """
+    Copy staff (and optionally customers) into the shards. Staff is small and
+    synced on every start; the customer backfill is only needed once when
+    moving an existing database to shards (python -m db.sync_mirrors).
+    """
+    from .models import Customer, Staff
+    async with async_session() as session:
+        result = await session.execute(select(Staff))
+        for staff in result.scalars():
+            await mirror_to_shards(staff)
+        if not customers:
+            return
+        last_id = 0
+        while True:
+            result = await session.execute(
+                select(Customer).where(Customer.id > last_id).order_by(Customer.id).limit(batch_size)
+            )
+            customers = result.scalars().all()
+            if not customers:
+                break
+            for customer in customers:
+                await mirror_to_shards(customer, [customer.region])
+            last_id = customers[-1].id
+
 # Start DB engine
 async def init_db():
     from . import models
-    async with engine.begin() as conn:
-        
-        # Scans for any Base models & creates them
-        await conn.run_sync(Base.metadata.create_all)
+    engines = [engine] + [shard_engine for shard_engine in shard_engines.values() if shard_engine is not engine]
+    for db_engine in engines:
+        async with db_engine.begin() as conn:
+            # Trigram indexes used by the admin search
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+            # Scans for any Base models & creates them. Every database gets the
+            # full schema; shards only fill the region-scoped tables plus mirrors.
+            await conn.run_sync(Base.metadata.create_all)
+    if Config.SHARD_DATABASE_URLS:
+        await _align_id_sequences()
+        await sync_directory_mirrors()
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
-        
\ No newline at end of file
+
+def shard_session(region: str) -> AsyncSession:
+    return shard_sessions[region]()
+
+async def _located_region(table_name: str, row_id: int, missing: str) -> str:
+    region = await locate(table_name, row_id)
+    if region is None or not is_region(region):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=missing)
+    return region
+
+async def get_order_shard_session(order_id: int) -> AsyncGenerator[AsyncSession, None]:
+    async with shard_session(await _located_region("orders", order_id, "Order not found")) as session:
+        yield session
+
+async def get_driver_shard_session(driver_id: int) -> AsyncGenerator[AsyncSession, None]:
+    async with shard_session(await _located_region("drivers", driver_id, "Driver not found")) as session:
+        yield session
+
+async def get_submission_shard_session(submission_id: int) -> AsyncGenerator[AsyncSession, None]:
+    region = await _located_region("recyclable_submissions", submission_id, "Recyclable submission not found")
+    async with shard_session(region) as session:
+        yield session
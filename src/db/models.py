@@ -1,8 +1,10 @@
 from datetime import datetime
-from sqlalchemy import (Column, Integer, String, DateTime, 
-                        ForeignKey, Enum, Numeric, Boolean)
+from sqlalchemy import (Column, Integer, BigInteger, SmallInteger, Float, String, Text, DateTime, Date,
+                        ForeignKey, Enum, Numeric, Boolean, Index, func, literal_column)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
+from config import Config
 from .main import Base
 
 
@@ -25,6 +27,12 @@ class PickupOption(str, PyEnum):
     PICKUP = "pickup"
     DROPOFF = "dropoff"
     
+class ReportStatus(str, PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 class PaymentStatus(str, PyEnum):
     PENDING = "pending"
     PAID = "paid"
@@ -39,9 +47,38 @@ class Customer(Base):
     email = Column(String, unique=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     registration_date = Column(DateTime, default=datetime.utcnow)
+    # Home service region; picks the shard holding this customer's orders and recyclables
+    region = Column(String, nullable=False, default=lambda: Config.DEFAULT_REGION)
     orders = relationship("Order", back_populates="customer", cascade="all, delete-orphan")
     recyclable_submissions = relationship("RecyclableSubmission", back_populates="customer", cascade="all, delete-orphan")
 
+    # Admin search (staff/search.py): trigram indexes for fuzzy matches,
+    # text_pattern_ops indexes for prefix LIKE. Requires the pg_trgm extension.
+    __table_args__ = (
+        Index(
+            "ix_customers_full_name_trgm",
+            func.lower(first_name + literal_column("' '") + last_name).label("full_name"),
+            postgresql_using="gin",
+            postgresql_ops={"full_name": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_customers_full_name_prefix",
+            func.lower(first_name + literal_column("' '") + last_name).label("full_name"),
+            postgresql_ops={"full_name": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_customers_email_trgm",
+            func.lower(email).label("email_lower"),
+            postgresql_using="gin",
+            postgresql_ops={"email_lower": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_customers_email_prefix",
+            func.lower(email).label("email_lower"),
+            postgresql_ops={"email_lower": "text_pattern_ops"},
+        ),
+    )
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -49,6 +86,8 @@ class Order(Base):
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     customer = relationship("Customer", back_populates="orders")
     destination_address = Column(String, nullable=False)
+    destination_lat = Column(Float, nullable=True)
+    destination_lon = Column(Float, nullable=True)
     water_amount = Column(Numeric(10, 2), nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.PAIRING)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -56,10 +95,90 @@ class Order(Base):
     driver_id = Column(Integer, ForeignKey("drivers.id"), nullable=True)
     driver = relationship("Driver")
     staff_assigned_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
-    staff_assigned = relationship("Staff")
+    staff_assigned = relationship("Staff", foreign_keys=[staff_assigned_id])
     driver_charge = Column(Numeric(10, 2), nullable=True)
     payment_status = Column(Enum(PaymentStatus), default=PaymentStatus.PENDING)
     payment_date = Column(DateTime, nullable=True)
+    # Dispatch work-queue lease, see utils/work_queue.py
+    claimed_by_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+    # Optimistic concurrency, see utils/preconditions.py
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        Index("ix_orders_pairing", "created_at", postgresql_where=(status == OrderStatus.PAIRING)),
+        Index("ix_orders_customer_id", "customer_id"),
+        # Only finished orders waiting for the archiver, see order/archive.py
+        Index(
+            "ix_orders_archivable",
+            "updated_at",
+            postgresql_where=status.in_([OrderStatus.DELIVERED, OrderStatus.CANCELLED]),
+        ),
+        Index(
+            "ix_orders_destination_address_trgm",
+            func.lower(destination_address).label("address_lower"),
+            postgresql_using="gin",
+            postgresql_ops={"address_lower": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_orders_destination_address_prefix",
+            func.lower(destination_address).label("address_lower"),
+            postgresql_ops={"address_lower": "text_pattern_ops"},
+        ),
+    )
+
+class OrderArchive(Base):
+    """
+    Delivered and cancelled orders moved out of `orders` by order/archive.py.
+    Range-partitioned by month on created_at; partitions are created as rows
+    arrive. No foreign keys, so old partitions can be detached or dropped.
+    """
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    customer_id = Column(Integer, nullable=False)
+    customer = relationship(
+        "Customer", primaryjoin="foreign(OrderArchive.customer_id) == Customer.id", viewonly=True
+    )
+    destination_address = Column(String, nullable=False)
+    destination_lat = Column(Float, nullable=True)
+    destination_lon = Column(Float, nullable=True)
+    water_amount = Column(Numeric(10, 2), nullable=False)
+    status = Column(Enum(OrderStatus), nullable=False)
+    updated_at = Column(DateTime)
+    driver_id = Column(Integer, nullable=True)
+    staff_assigned_id = Column(Integer, nullable=True)
+    driver_charge = Column(Numeric(10, 2), nullable=True)
+    payment_status = Column(Enum(PaymentStatus))
+    payment_date = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_orders_archive_customer_id", "customer_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+class OrderEvent(Base):
+    """
+    Append-only audit log of order changes, written through order/events.py.
+    `changes` maps each changed field to [old, new]. Lives on the order's
+    shard; no foreign key so events outlive archival of the order.
+    """
+    __tablename__ = "order_events"
+
+    id = Column(BigInteger, primary_key=True)
+    order_id = Column(Integer, nullable=False)
+    event = Column(String, nullable=False)
+    actor_type = Column(String, nullable=False)
+    actor_id = Column(Integer, nullable=True)
+    changes = Column(JSONB, nullable=False, default=dict)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_order_events_order_id", "order_id", "created_at"),
+    )
 
 class Driver(Base):
     __tablename__ = "drivers"
@@ -69,8 +188,65 @@ class Driver(Base):
     last_name = Column(String, nullable=False)
     phone_number = Column(String, nullable=False)
     vehicle_details = Column(String, nullable=False)
+    vehicle_type = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Watermark for the incremental roster refresh in driver/roster.py
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    region = Column(String, nullable=False, default=lambda: Config.DEFAULT_REGION)
+    version = Column(Integer, nullable=False, server_default="1")
+    # Rating aggregates, kept up to date by feedback/ratings.py as feedback is
+    # written. The recent sums decay with RATING_RECENT_HALF_LIFE_DAYS as of
+    # rating_recent_at; their ratio is the recent mean.
+    rating_count = Column(Integer, nullable=False, server_default="0")
+    rating_sum = Column(Integer, nullable=False, server_default="0")
+    rating_recent_sum = Column(Float, nullable=False, server_default="0")
+    rating_recent_weight = Column(Float, nullable=False, server_default="0")
+    rating_recent_at = Column(DateTime, nullable=True)
+    __mapper_args__ = {"version_id_col": version}
+
+    @property
+    def rating_mean(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @property
+    def rating_recent(self):
+        return round(self.rating_recent_sum / self.rating_recent_weight, 2) if self.rating_recent_weight else None
+
+class DriverFeedback(Base):
+    """
+    A customer's rating of the driver who delivered an order, one per order.
+    Written in batches by feedback/ratings.py; lives on the order's shard,
+    which is also the driver's.
+    """
+    __tablename__ = "driver_feedback"
+
+    id = Column(BigInteger, primary_key=True)
+    order_id = Column(Integer, nullable=False)
+    driver_id = Column(Integer, ForeignKey("drivers.id", ondelete="CASCADE"), nullable=False)
+    customer_id = Column(Integer, nullable=False)
+    rating = Column(SmallInteger, nullable=False)
+    comment = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_driver_feedback_order_id", "order_id", unique=True),
+        Index("ix_driver_feedback_driver_id", "driver_id", "id"),
+    )
+
+class DriverLocation(Base):
+    """Downsampled GPS track, one point per GPS_TRACK_SAMPLE_SECONDS per driver."""
+    __tablename__ = "driver_locations"
+
+    id = Column(BigInteger, primary_key=True)
+    driver_id = Column(Integer, nullable=False)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_driver_locations_driver_id", "driver_id", "recorded_at"),
+    )
 
 class Staff(Base):
     __tablename__ = "staff"
@@ -83,6 +259,88 @@ class Staff(Base):
     created_by_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
     created_by = relationship("Staff", remote_side=[id])
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version}
+
+class TableVersion(Base):
+    """Write counter per table, bumped inside the writing transaction (see db/versions.py)."""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class DemandForecast(Base):
+    """Next-day demand forecast built by order/forecast.py's worker; the endpoint only serves these."""
+    __tablename__ = "demand_forecasts"
+
+    day = Column(Date, primary_key=True)
+    generated_at = Column(DateTime, nullable=False)
+    forecast = Column(JSONB, nullable=False)
+
+class ShardKey(Base):
+    """Which region's shard holds a sharded row; kept in the directory database (see db/main.py:locate)."""
+    __tablename__ = "shard_keys"
+
+    table_name = Column(String, primary_key=True)
+    row_id = Column(Integer, primary_key=True)
+    region = Column(String, nullable=False)
+
+class RevokedToken(Base):
+    """Denylisted access token, kept until the token would have expired anyway."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    user_type = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class RevokedSubject(Base):
+    """Every token of this user issued at or before `revoked_at` is revoked."""
+    __tablename__ = "revoked_subjects"
+
+    user_type = Column(String, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class ReportJob(Base):
+    """Offline report request, picked up by reports/jobs.py; the finished CSV is its ReportArtifact."""
+    __tablename__ = "report_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    status = Column(Enum(ReportStatus), nullable=False, default=ReportStatus.PENDING)
+    requested_by_type = Column(String, nullable=False)
+    requested_by_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    rows_scanned = Column(BigInteger, nullable=True)
+    row_count = Column(Integer, nullable=True)
+    file_name = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    # Worker lease (claimant is a random id per worker process, pids repeat
+    # across nodes), see utils/work_queue.py; renewed while the report is
+    # built, so only a job whose worker died becomes claimable again
+    claimed_by_id = Column(Integer, nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_report_jobs_open",
+            "id",
+            postgresql_where=status.in_([ReportStatus.PENDING, ReportStatus.RUNNING]),
+        ),
+    )
+
+class ReportArtifact(Base):
+    """A finished report's CSV, kept in the database so any node can serve the download."""
+    __tablename__ = "report_artifacts"
+
+    job_id = Column(Integer, ForeignKey("report_jobs.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
 
 class SuperAdmin(Base):
     __tablename__ = "super_admins"
@@ -99,6 +357,7 @@ class RecyclableSubmission(Base):
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     customer = relationship("Customer", back_populates="recyclable_submissions")
     image_url = Column(String, nullable=False)
+    image_hash = Column(String(64), nullable=True, index=True)
     recyclable_type = Column(String, nullable=False)
     estimated_value = Column(Numeric(10, 2), nullable=True)
     pickup_option = Column(Enum(PickupOption), nullable=False)
@@ -106,4 +365,77 @@ class RecyclableSubmission(Base):
     dropoff_location = Column(String, nullable=True)
     status = Column(Enum(RecyclableStatus), default=RecyclableStatus.PENDING_REVIEW)
     credited_amount = Column(Numeric(10, 2), nullable=True)
-    submission_date = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    submission_date = Column(DateTime, default=datetime.utcnow)
+    # Review queue lease, see utils/work_queue.py
+    claimed_by_id = Column(Integer, ForeignKey("staff.id"), nullable=True)
+    claim_expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_recyclable_submissions_pending_review",
+            "submission_date",
+            postgresql_where=(status == RecyclableStatus.PENDING_REVIEW),
+        ),
+    )
+
+class CreditLedgerEntry(Base):
+    """
+    Append-only log of a customer's recycling credit, written through
+    recycle/credits.py: positive amounts for credited submissions, negative
+    for credit redeemed against an order. Lives on the customer's shard.
+    """
+    __tablename__ = "credit_ledger"
+
+    id = Column(BigInteger, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    amount = Column(Numeric(10, 2), nullable=False)
+    balance_after = Column(Numeric(12, 2), nullable=False)
+    submission_id = Column(Integer, nullable=True)
+    order_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_credit_ledger_customer_id", "customer_id", "id"),
+        # A submission is credited, and an order paid from credit, at most once
+        Index("ix_credit_ledger_submission_id", "submission_id", unique=True,
+              postgresql_where=(submission_id.is_not(None))),
+        Index("ix_credit_ledger_order_id", "order_id", unique=True,
+              postgresql_where=(order_id.is_not(None))),
+    )
+
+class CustomerBalance(Base):
+    """Running credit balance per customer, kept in step with `credit_ledger`."""
+    __tablename__ = "customer_balances"
+
+    customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(Numeric(12, 2), nullable=False, server_default="0")
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DeliveryZone(Base):
+    """Pricing zone, represented by its centroid. Depot zones are where tankers fill up."""
+    __tablename__ = "delivery_zones"
+
+    name = Column(String, primary_key=True)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    is_depot = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class DeliveryRate(Base):
+    """Delivery price for orders of at least `min_litres`, up to the next band."""
+    __tablename__ = "delivery_rates"
+
+    min_litres = Column(Numeric(10, 2), primary_key=True)
+    base_fee = Column(Numeric(10, 2), nullable=False)
+    per_litre = Column(Numeric(10, 4), nullable=False)
+    per_km = Column(Numeric(10, 2), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class RecyclableTariff(Base):
+    __tablename__ = "recyclable_tariffs"
+
+    recyclable_type = Column(String, primary_key=True)
+    unit_value = Column(Numeric(10, 2), nullable=False)
+    pickup_fee = Column(Numeric(10, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
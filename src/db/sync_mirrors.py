@@ -0,0 +1,14 @@
+import asyncio
+from db.main import init_db, sync_directory_mirrors, sync_shard_keys
+
+async def main():
+    await init_db()
+    await sync_directory_mirrors(customers=True)
+    print("Directory mirrors synced.")
+    conflicts = await sync_shard_keys()
+    for table_name, row_id, region in conflicts:
+        print(f"{table_name} {row_id} on {region} is also on another shard and stays routed there")
+    print(f"Shard keys synced, {len(conflicts)} conflicting ids.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+"""
+Per-table version counters for caches of rarely written tables.
+
+Every ORM flush and every bulk INSERT/UPDATE/DELETE run through a Session
+that touches one of VERSIONED_TABLES increments that table's row in
+`table_versions`, in the same transaction as the write. A cache that
+remembers the version it read at knows it is still fresh if the version
+has not moved, which costs one primary-key lookup.
+
+Only tables written rarely are versioned: the counter row is locked until
+the writing transaction commits, so a hot table would serialize its writers.
+"""
+from itertools import chain
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from db.models import TableVersion
+
+VERSIONED_TABLES = frozenset({"customers", "drivers", "staff"})
+
+
+def bump_statement(table_name: str):
+    stmt = insert(TableVersion).values(table_name=table_name, version=1)
+    return stmt.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1},
+    )
+
+
+def _bump(session: Session, table_names):
+    # Fixed order, so two transactions bumping the same tables cannot deadlock
+    for table_name in sorted(table_names):
+        session.connection().execute(bump_statement(table_name))
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_tables(session: Session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    changed = chain(session.new, (obj for obj in session.dirty if session.is_modified(obj)), session.deleted)
+    tables = {obj.__table__.name for obj in changed} & VERSIONED_TABLES
+    if tables:
+        _bump(session, tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None and table.name in VERSIONED_TABLES:
+        _bump(orm_execute_state.session, [table.name])
+
+
+async def table_version(session: AsyncSession, table_name: str) -> int:
+    result = await session.execute(select(TableVersion.version).where(TableVersion.table_name == table_name))
+    return result.scalar() or 0
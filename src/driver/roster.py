@@ -0,0 +1,121 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from db.main import SHARD_REGIONS, shard_session
+from db.models import Driver
+from db.versions import table_version
+from config import Config
+
+
+class DriverRecord:
+    """Slotted copy of a `drivers` row; much smaller than a mapped Driver instance."""
+    __slots__ = ("id", "first_name", "last_name", "phone_number", "vehicle_details", "vehicle_type",
+                 "is_active", "region", "created_at", "updated_at", "version",
+                 "rating_count", "rating_sum", "rating_recent_sum", "rating_recent_weight")
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values[name])
+
+    rating_mean = Driver.rating_mean
+    rating_recent = Driver.rating_recent
+
+
+ROSTER_COLUMNS = [getattr(Driver, name) for name in DriverRecord.__slots__]
+
+
+class DriverRoster:
+    """
+    Per-worker cache of every driver, refreshed incrementally: each refresh
+    only reads rows whose `updated_at` moved past the shard's watermark, and
+    at most once every `refresh_seconds`. A shard whose `drivers` version has
+    not moved is skipped after a single lookup. Writes made through this worker
+    are applied straight away with `put`; other workers see them on their
+    next refresh.
+    """
+
+    def __init__(self, refresh_seconds: float, lookback_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        # Re-read a little before the watermark so rows committed late with an
+        # older updated_at are not skipped
+        self.lookback = timedelta(seconds=lookback_seconds)
+        self._drivers: Dict[int, DriverRecord] = {}
+        self._sorted: Optional[List[DriverRecord]] = None
+        self._watermarks: Dict[str, datetime] = {}
+        self._versions: Dict[str, int] = {}
+        self._refreshed_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def put(self, driver: Driver):
+        self._drivers[driver.id] = DriverRecord(**{name: getattr(driver, name) for name in DriverRecord.__slots__})
+        self._sorted = None
+
+    def invalidate(self):
+        """Force a refresh on the next read."""
+        self._refreshed_at = float("-inf")
+
+    async def refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return
+            started = time.monotonic()
+            for region in SHARD_REGIONS:
+                await self._refresh_shard(region)
+            self._refreshed_at = started
+
+    async def _refresh_shard(self, region: str):
+        query = select(*ROSTER_COLUMNS)
+        watermark = self._watermarks.get(region)
+        if watermark is not None:
+            query = query.where(Driver.updated_at >= watermark - self.lookback)
+        async with shard_session(region) as session:
+            version = await table_version(session, Driver.__tablename__)
+            if watermark is not None and version == self._versions.get(region):
+                # No driver written on this shard since the last refresh
+                return
+            result = await session.execute(query)
+            rows = result.all()
+        self._versions[region] = version
+        for row in rows:
+            self._drivers[row.id] = DriverRecord(**row._mapping)
+            if row.updated_at is not None and (watermark is None or row.updated_at > watermark):
+                watermark = row.updated_at
+        if rows:
+            self._sorted = None
+        if watermark is not None:
+            self._watermarks[region] = watermark
+
+    async def list(self, active: Optional[bool] = None, vehicle_type: Optional[str] = None) -> List[DriverRecord]:
+        await self.refresh()
+        if self._sorted is None:
+            self._sorted = sorted(self._drivers.values(), key=lambda driver: driver.id)
+        drivers = self._sorted
+        if active is not None:
+            drivers = [driver for driver in drivers if driver.is_active == active]
+        if vehicle_type is not None:
+            vehicle_type = vehicle_type.lower()
+            drivers = [driver for driver in drivers if (driver.vehicle_type or "").lower() == vehicle_type]
+        return drivers
+
+    async def get(self, driver_id: int) -> Optional[DriverRecord]:
+        await self.refresh()
+        driver = self._drivers.get(driver_id)
+        if driver is None:
+            # Possibly created on another worker since the last refresh
+            await self.refresh(force=True)
+            driver = self._drivers.get(driver_id)
+        return driver
+
+    async def get_many(self, driver_ids: List[int]) -> Dict[int, DriverRecord]:
+        """Drivers found among `driver_ids`, with at most one forced refresh for the misses."""
+        await self.refresh()
+        if any(driver_id not in self._drivers for driver_id in driver_ids):
+            await self.refresh(force=True)
+        return {driver_id: self._drivers[driver_id] for driver_id in driver_ids if driver_id in self._drivers}
+
+
+driver_roster = DriverRoster(Config.ROSTER_REFRESH_SECONDS, Config.ROSTER_LOOKBACK_SECONDS)
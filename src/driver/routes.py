@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, status
+from config import Config
+from utils.helper_func import raise_http_exception, get_current_driver_id
+from .schemas import DriverPingBatch, DriverPingAck
+from .tracking import parse_pings, record_pings
+
+driver_router = APIRouter()
+
+@driver_router.post("/api/drivers/locations/", response_model=DriverPingAck, status_code=status.HTTP_202_ACCEPTED)
+async def report_driver_locations(batch: DriverPingBatch, driver_id: int = Depends(get_current_driver_id)):
+    """
+    Batched GPS pings from the driver app. Updates the driver's live position
+    in memory; a downsampled track is written to the database in the background.
+    """
+    if len(batch.pings) > Config.GPS_MAX_PINGS_PER_BATCH:
+        raise_http_exception(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"At most {Config.GPS_MAX_PINGS_PER_BATCH} pings per batch"
+        )
+    pings = parse_pings(batch.pings)
+    if len(pings):
+        record_pings(driver_id, pings)
+    return DriverPingAck(accepted=len(pings), rejected=len(batch.pings) - len(pings))
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 
 class BaseSchema(BaseModel):
@@ -11,18 +11,34 @@ class DriverBase(BaseSchema):
     last_name: str
     phone_number: str
     vehicle_details: str
+    vehicle_type: Optional[str] = None
     is_active: bool
 
 class DriverCreate(DriverBase):
-    pass
+    region: Optional[str] = None
 
 class DriverRead(DriverBase):
     id: int
     created_at: datetime
-    
+    updated_at: Optional[datetime] = None
+    region: str
+    version: int
+    # Precomputed as feedback comes in, see feedback/ratings.py
+    rating_count: int = 0
+    rating_mean: Optional[float] = None
+    rating_recent: Optional[float] = None
+
 class DriverUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     phone_number: Optional[str] = None
     vehicle_details: Optional[str] = None
-    is_active: Optional[bool] = None
\ No newline at end of file
+    vehicle_type: Optional[str] = None
+    is_active: Optional[bool] = None
+class DriverPingBatch(BaseModel):
+    # [unix_timestamp, latitude, longitude] rows, oldest first or in any order
+    pings: List[Tuple[float, float, float]]
+
+class DriverPingAck(BaseModel):
+    accepted: int
+    rejected: int
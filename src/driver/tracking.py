@@ -0,0 +1,144 @@
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import DriverLocation
+from utils.batch_writer import BufferedBatchWriter
+from config import Config
+
+EARTH_RADIUS_KM = 6371.0
+
+track_writer = BufferedBatchWriter(
+    DriverLocation.__table__,
+    shard_key=("drivers", "driver_id"),
+    flush_interval_ms=Config.GPS_TRACK_FLUSH_INTERVAL_MS,
+    batch_size=5000,
+    spill_path=Config.GPS_TRACK_SPILL_PATH,
+)
+
+
+class DriverPositions:
+    """
+    Latest position per driver, kept in flat numpy arrays with one slot per
+    driver instead of an object per ping. Also decides which pings make it
+    into the persisted track: at most one per `sample_seconds` per driver.
+    """
+
+    def __init__(self, sample_seconds: int, capacity: int = 1024):
+        self.sample_seconds = sample_seconds
+        self._slots: Dict[int, int] = {}
+        self._lat = np.full(capacity, np.nan)
+        self._lon = np.full(capacity, np.nan)
+        self._at = np.zeros(capacity)
+        self._sampled_at = np.full(capacity, -np.inf)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _slot(self, driver_id: int) -> int:
+        slot = self._slots.get(driver_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._at):
+                self._grow()
+            self._slots[driver_id] = slot
+        return slot
+
+    def _grow(self):
+        extra = len(self._at)
+        self._lat = np.concatenate([self._lat, np.full(extra, np.nan)])
+        self._lon = np.concatenate([self._lon, np.full(extra, np.nan)])
+        self._at = np.concatenate([self._at, np.zeros(extra)])
+        self._sampled_at = np.concatenate([self._sampled_at, np.full(extra, -np.inf)])
+
+    def update(self, driver_id: int, pings: np.ndarray) -> List[Tuple[float, float, float]]:
+        """
+        Apply a batch of (unix_ts, lat, lon) rows sorted by time. Returns the
+        pings that should be added to the persisted track.
+        """
+        slot = self._slot(driver_id)
+        if pings[-1, 0] >= self._at[slot]:
+            self._at[slot], self._lat[slot], self._lon[slot] = pings[-1]
+        samples = []
+        sampled_at = self._sampled_at[slot]
+        for ts, lat, lon in pings.tolist():
+            if ts - sampled_at >= self.sample_seconds:
+                samples.append((ts, lat, lon))
+                sampled_at = ts
+        self._sampled_at[slot] = sampled_at
+        return samples
+
+    def get(self, driver_id: int) -> Optional[Tuple[float, float, float]]:
+        """(lat, lon, unix_ts) of the last ping, or None if this worker has not seen the driver."""
+        slot = self._slots.get(driver_id)
+        if slot is None:
+            return None
+        return float(self._lat[slot]), float(self._lon[slot]), float(self._at[slot])
+
+
+driver_positions = DriverPositions(Config.GPS_TRACK_SAMPLE_SECONDS)
+
+
+def parse_pings(pings: List[Tuple[float, float, float]]) -> np.ndarray:
+    """Drop out-of-range or future pings and sort the rest by time."""
+    rows = np.asarray(pings, dtype=np.float64).reshape(-1, 3)
+    ts, lat, lon = rows[:, 0], rows[:, 1], rows[:, 2]
+    valid = (
+        (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        & (ts > 0) & (ts <= time.time() + 60)
+    )
+    rows = rows[valid]
+    return rows[np.argsort(rows[:, 0], kind="stable")]
+
+
+def record_pings(driver_id: int, pings: np.ndarray) -> int:
+    """Update the live position and queue downsampled track points. Returns how many were queued."""
+    samples = driver_positions.update(driver_id, pings)
+    for ts, lat, lon in samples:
+        track_writer.add({
+            "driver_id": driver_id,
+            "lat": lat,
+            "lon": lon,
+            "recorded_at": datetime.utcfromtimestamp(ts),
+        })
+    return len(samples)
+
+
+async def latest_position(session: AsyncSession, driver_id: int) -> Optional[Tuple[float, float, float]]:
+    """
+    Live position from this worker's store, falling back to the last persisted
+    track point (pings for a driver may have landed on another worker).
+    Positions older than GPS_STALE_SECONDS are ignored.
+    """
+    now = time.time()
+    position = driver_positions.get(driver_id)
+    if position is None or now - position[2] > Config.GPS_STALE_SECONDS:
+        result = await session.execute(
+            select(DriverLocation.lat, DriverLocation.lon, DriverLocation.recorded_at)
+            .where(DriverLocation.driver_id == driver_id)
+            .order_by(DriverLocation.recorded_at.desc())
+            .limit(1)
+        )
+        row = result.first()
+        if row is not None:
+            recorded_at = row.recorded_at.replace(tzinfo=timezone.utc).timestamp()
+            if position is None or recorded_at > position[2]:
+                position = (row.lat, row.lon, recorded_at)
+    if position is None or now - position[2] > Config.GPS_STALE_SECONDS:
+        return None
+    return position
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def estimate_eta_seconds(lat: float, lon: float, destination_lat: float, destination_lon: float) -> int:
+    """Straight-line distance stretched by ETA_ROAD_FACTOR at ETA_AVERAGE_SPEED_KMH."""
+    distance_km = haversine_km(lat, lon, destination_lat, destination_lon) * Config.ETA_ROAD_FACTOR
+    return int(distance_km / Config.ETA_AVERAGE_SPEED_KMH * 3600)
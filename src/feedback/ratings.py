@@ -0,0 +1,123 @@
+"""
+Customer ratings of drivers. Feedback is buffered and written in batches;
+the same transaction folds each batch into the rating aggregates on the
+driver rows, so a driver's count, mean and recent mean are read straight
+off `drivers` (and the roster) instead of averaged over `driver_feedback`.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import DateTime, Float, Integer, bindparam, extract, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from db.models import Driver, DriverFeedback
+from db.versions import bump_statement
+from utils.batch_writer import BufferedBatchWriter
+from config import Config
+
+
+def decay(age_seconds: float, half_life_seconds: float) -> float:
+    return 0.5 ** (max(age_seconds, 0.0) / half_life_seconds)
+
+
+def rating_deltas(rows: List[dict], now: datetime, half_life_seconds: float) -> List[dict]:
+    """
+    Per-driver increments for a batch of new ratings, ordered by driver id:
+    count and sum, plus the recent sum and weight decayed to `now`.
+    """
+    deltas: Dict[int, dict] = defaultdict(lambda: {"count": 0, "sum": 0, "recent_sum": 0.0, "recent_weight": 0.0})
+    for row in rows:
+        delta = deltas[row["driver_id"]]
+        weight = decay((now - row["created_at"]).total_seconds(), half_life_seconds)
+        delta["count"] += 1
+        delta["sum"] += row["rating"]
+        delta["recent_sum"] += weight * row["rating"]
+        delta["recent_weight"] += weight
+    # Fixed order, so two batches touching the same drivers cannot deadlock
+    return [{"b_driver_id": driver_id, **{f"b_{name}": value for name, value in delta.items()}, "b_now": now}
+            for driver_id, delta in sorted(deltas.items())]
+
+
+def aggregate_statement(half_life_seconds: float):
+    """Add one driver's batch increments, first decaying the stored recent sums from rating_recent_at to now."""
+    now = bindparam("b_now", type_=DateTime)
+    age = extract("epoch", now - func.coalesce(Driver.rating_recent_at, now))
+    factor = func.power(0.5, func.greatest(age, 0) / half_life_seconds)
+    return (
+        update(Driver)
+        .where(Driver.id == bindparam("b_driver_id"))
+        .values(
+            rating_count=Driver.rating_count + bindparam("b_count", type_=Integer),
+            rating_sum=Driver.rating_sum + bindparam("b_sum", type_=Integer),
+            rating_recent_sum=Driver.rating_recent_sum * factor + bindparam("b_recent_sum", type_=Float),
+            rating_recent_weight=Driver.rating_recent_weight * factor + bindparam("b_recent_weight", type_=Float),
+            rating_recent_at=func.greatest(func.coalesce(Driver.rating_recent_at, now), now),
+        )
+    )
+
+
+class FeedbackWriter(BufferedBatchWriter):
+    """
+    Inserts buffered feedback and updates the rated drivers' aggregates in
+    the same shard transaction, one UPDATE per driver per batch however many
+    ratings it got. A second rating of an order is dropped by the insert and
+    never reaches the aggregates, which also makes spill replays safe. A
+    rating of a driver deleted meanwhile fails the foreign key and is split
+    out and dropped by BufferedBatchWriter, without holding up the others.
+    """
+
+    def __init__(self, half_life_days: float, **kwargs):
+        super().__init__(DriverFeedback.__table__, **kwargs)
+        self.half_life_seconds = half_life_days * 86400
+
+    async def write_rows(self, conn: AsyncConnection, rows: List[dict]):
+        table = self.table
+        result = await conn.execute(
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.order_id])
+            .returning(table.c.driver_id, table.c.rating, table.c.created_at),
+            rows,
+        )
+        written = [row._asdict() for row in result.all()]
+        if not written:
+            return
+        deltas = rating_deltas(written, datetime.utcnow(), self.half_life_seconds)
+        await conn.execute(aggregate_statement(self.half_life_seconds), deltas)
+        # Session writes bump this through db/versions.py; this is a bare connection
+        await conn.execute(bump_statement(Driver.__tablename__))
+
+
+feedback_writer = FeedbackWriter(
+    Config.RATING_RECENT_HALF_LIFE_DAYS,
+    shard_key=("orders", "order_id"),
+    flush_interval_ms=Config.FEEDBACK_FLUSH_INTERVAL_MS,
+    batch_size=Config.FEEDBACK_BATCH_SIZE,
+    spill_path=Config.FEEDBACK_SPILL_PATH,
+)
+
+
+def record_feedback(order, customer_id: int, rating: int, comment: Optional[str] = None):
+    """Queue a rating of `order`'s driver; it reaches the database within FEEDBACK_FLUSH_INTERVAL_MS."""
+    feedback_writer.add({
+        "order_id": order.id,
+        "driver_id": order.driver_id,
+        "customer_id": customer_id,
+        "rating": rating,
+        "comment": comment,
+        "created_at": datetime.utcnow(),
+    })
+
+
+async def has_feedback(session: AsyncSession, order_id: int) -> bool:
+    result = await session.execute(select(DriverFeedback.id).where(DriverFeedback.order_id == order_id))
+    return result.first() is not None
+
+
+async def get_driver_feedback(session: AsyncSession, driver_id: int, before_id: Optional[int] = None,
+                              limit: int = 50) -> List[DriverFeedback]:
+    """Newest first; pass the last id seen as `before_id` for the next page."""
+    query = select(DriverFeedback).where(DriverFeedback.driver_id == driver_id)
+    if before_id is not None:
+        query = query.where(DriverFeedback.id < before_id)
+    result = await session.execute(query.order_by(DriverFeedback.id.desc()).limit(limit))
+    return result.scalars().all()
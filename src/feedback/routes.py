@@ -0,0 +1,46 @@
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from db.main import get_driver_shard_session
+from db.models import Customer, OrderStatus, Staff
+from driver.roster import driver_roster
+from order.archive import get_order_or_archived
+from feedback.ratings import record_feedback, has_feedback, get_driver_feedback
+from feedback.schemas import FeedbackCreate, FeedbackRead
+from utils.helper_func import raise_http_exception, get_current_user, get_customer_shard_session, is_staff_or_superadmin
+
+feedback_router = APIRouter()
+
+@feedback_router.post("/api/customers/orders/{order_id}/feedback/", status_code=status.HTTP_202_ACCEPTED)
+async def rate_order(
+    order_id: int,
+    feedback: FeedbackCreate,
+    current_customer: Customer = Depends(get_current_user),
+    session: AsyncSession = Depends(get_customer_shard_session),
+):
+    """Rate the driver of a delivered order, once per order. Written in the background within a second."""
+    if not isinstance(current_customer, Customer):
+        raise_http_exception(status.HTTP_403_FORBIDDEN, "Only customers can rate their orders.")
+    order = await get_order_or_archived(session, order_id, current_customer.id)
+    if not order:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
+    if order.status != OrderStatus.DELIVERED or order.driver_id is None:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "Only delivered orders can be rated")
+    # Catches repeats once written; a repeat still in the buffer is dropped on insert
+    if await has_feedback(session, order_id):
+        raise_http_exception(status.HTTP_409_CONFLICT, "This order has already been rated")
+    record_feedback(order, current_customer.id, feedback.rating, feedback.comment)
+    return {"message": "Thanks for your feedback"}
+
+@feedback_router.get("/api/admin/drivers/{driver_id}/feedback/", response_model=List[FeedbackRead])
+async def get_feedback_for_driver(
+    driver_id: int,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_driver_shard_session),
+):
+    is_staff_or_superadmin(current_user)
+    if await driver_roster.get(driver_id) is None:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Driver not found")
+    return await get_driver_feedback(session, driver_id, before_id, min(max(limit, 1), 500))
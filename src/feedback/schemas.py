@@ -0,0 +1,20 @@
+from typing import Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class BaseSchema(BaseModel):
+    class Config:
+        from_attributes = True
+
+class FeedbackCreate(BaseModel):
+    rating: int = Field(ge=1, le=5)
+    comment: Optional[str] = Field(None, max_length=1000)
+
+class FeedbackRead(BaseSchema):
+    id: int
+    order_id: int
+    driver_id: int
+    customer_id: int
+    rating: int
+    comment: Optional[str]
+    created_at: datetime
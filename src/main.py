@@ -1,16 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
 from contextlib import asynccontextmanager
+import logging
 from admin.routes import admin_router
 from customer.routes import customer_router
 from staff.routes import staff_router
+from driver.routes import driver_router
+from reports.routes import reports_router
+from feedback.routes import feedback_router
+from driver.tracking import track_writer
 from db.main import init_db, engine
 from db.models import SuperAdmin
 from config import Config
 from utils.helper_func import get_password_hash
+from utils.mailer import mail_queue
+from recycle.storage import image_store
+from recycle.valuation import run_valuation_worker
+from order.archive import run_archive_worker
+from order.pricing import run_quote_worker
+from order.forecast import run_forecast_worker
+from order.events import order_event_writer
+from feedback.ratings import feedback_writer
+from utils.revocation import run_denylist_sync
+from reports.jobs import run_report_worker, report_runner
+from utils.log import start_logging, stop_logging, RequestIdMiddleware, REQUEST_ID_HEADER
 from sqlalchemy.ext.asyncio import AsyncSession
 
+logger = logging.getLogger(__name__)
+
 async def create_super_admin():
     """
     Creates the initial superadmin user. This should only be run once.
@@ -19,7 +40,7 @@ async def create_super_admin():
         async with AsyncSession(bind=conn) as db:
             result = await db.execute(select(SuperAdmin).limit(1))
             if result.scalar_one_or_none():
-                print("SuperAdmin already exists.")
+                logger.info("SuperAdmin already exists.")
                 return
             email = Config.ADMIN_EMAIL
             password = Config.ADMIN_PASSWORD
@@ -27,15 +48,39 @@ async def create_super_admin():
             superadmin = SuperAdmin(email=email, hashed_password=hashed_password)
             db.add(superadmin)
             await db.commit()
-            print("SuperAdmin created.")
+            logger.info("SuperAdmin created.")
 
 @asynccontextmanager
 async def life_span(app: FastAPI):
-    print(f"Server is starting...")
+    start_logging()
+    logger.info("Server is starting...")
     await init_db()
     # await create_super_admin()
+    await mail_queue.start()
+    await order_event_writer.start()
+    await track_writer.start()
+    await feedback_writer.start()
+    valuation_task = asyncio.create_task(run_valuation_worker())
+    archive_task = asyncio.create_task(run_archive_worker())
+    quote_task = asyncio.create_task(run_quote_worker())
+    forecast_task = asyncio.create_task(run_forecast_worker())
+    denylist_task = asyncio.create_task(run_denylist_sync())
+    report_task = asyncio.create_task(run_report_worker())
     yield
-    print(f"Server has been stopped")
+    valuation_task.cancel()
+    archive_task.cancel()
+    quote_task.cancel()
+    forecast_task.cancel()
+    denylist_task.cancel()
+    report_task.cancel()
+    await order_event_writer.stop()
+    await track_writer.stop()
+    await feedback_writer.stop()
+    await mail_queue.stop()
+    image_store.shutdown()
+    report_runner.shutdown()
+    logger.info("Server has been stopped")
+    stop_logging()
 
 app = FastAPI(
     title="Water Tanker Availability Application",
@@ -53,11 +98,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
+# Outermost, so the request id covers everything below, CORS included
+app.add_middleware(RequestIdMiddleware)
+
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    # A versioned row (Order, Driver, Staff) changed between being read and written
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Modified concurrently by another request, please retry"},
+    )
 
 app.include_router(customer_router, tags=["Customers"])
 app.include_router(staff_router, tags=["Staff"])
 app.include_router(admin_router, tags=["Admin"])
+app.include_router(driver_router, tags=["Drivers"])
+app.include_router(reports_router, tags=["Reports"])
+app.include_router(feedback_router, tags=["Feedback"])
 
 
 @app.get("/")
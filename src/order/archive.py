@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy import select, delete, insert, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from db.main import SHARD_REGIONS, shard_session, id_in
+from db.models import Order, OrderArchive, OrderStatus
+from utils.fieldsets import FieldSet
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+# Columns carried over into orders_archive; claim leases are dropped on the way
+ARCHIVED_COLUMNS = [column.name for column in OrderArchive.__table__.columns if column.name != "archived_at"]
+
+# Arbitrary key for pg_try_advisory_xact_lock, so only one worker archives a shard at a time
+ARCHIVE_LOCK_KEY = 0x0A5C41
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+async def ensure_archive_partitions(session: AsyncSession, months: Iterable[datetime]):
+    """Create the monthly orders_archive partitions that rows are about to land in."""
+    for month in sorted(set(months)):
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS orders_archive_{month:%Y_%m} PARTITION OF orders_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+        ))
+
+
+async def archive_orders_batch(session: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+    """
+    Move up to `batch_size` finished orders last touched before `cutoff` into
+    orders_archive in one DELETE ... RETURNING / INSERT statement. Returns the
+    number of rows moved; 0 also means another worker holds the archive lock.
+    """
+    locked = await session.scalar(select(func.pg_try_advisory_xact_lock(ARCHIVE_LOCK_KEY)))
+    if not locked:
+        return 0
+    result = await session.execute(
+        select(Order.id, Order.created_at)
+        .where(Order.status.in_(ARCHIVABLE_STATUSES), Order.updated_at < cutoff)
+        .order_by(Order.updated_at)
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if not rows:
+        await session.commit()
+        return 0
+    await ensure_archive_partitions(session, (month_start(created_at) for _, created_at in rows))
+
+    moved = (
+        delete(Order)
+        .where(Order.id.in_([order_id for order_id, _ in rows]), Order.status.in_(ARCHIVABLE_STATUSES))
+        .returning(*(Order.__table__.c[name] for name in ARCHIVED_COLUMNS))
+        .cte("moved")
+    )
+    result = await session.execute(
+        insert(OrderArchive)
+        .from_select(ARCHIVED_COLUMNS, select(*(moved.c[name] for name in ARCHIVED_COLUMNS)))
+        .add_cte(moved)
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def archive_orders(
+    session: AsyncSession,
+    older_than_days: int = Config.ORDER_ARCHIVE_AFTER_DAYS,
+    batch_size: int = Config.ORDER_ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Drain archivable orders in short batches so locks and WAL bursts stay small."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    while True:
+        moved = await archive_orders_batch(session, cutoff, batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+def order_options(model, fields: Optional[FieldSet]) -> list:
+    return fields.options(model) if fields is not None else [joinedload(model.customer)]
+
+
+async def get_customer_order_history(session: AsyncSession, customer_id: int, fields: Optional[FieldSet] = None) -> List:
+    """Live orders followed by archived ones, for a single customer."""
+    result = await session.execute(
+        select(Order)
+        .where(Order.customer_id == customer_id)
+        .options(*order_options(Order, fields))
+    )
+    orders = list(result.scalars().all())
+    result = await session.execute(
+        select(OrderArchive)
+        .where(OrderArchive.customer_id == customer_id)
+        .options(*order_options(OrderArchive, fields))
+        .order_by(OrderArchive.created_at.desc())
+    )
+    orders.extend(result.scalars().all())
+    return orders
+
+
+async def get_order_or_archived(session: AsyncSession, order_id: int, customer_id: Optional[int] = None,
+                                fields: Optional[FieldSet] = None):
+    """Look an order up in `orders`, falling back to orders_archive."""
+    for model in (Order, OrderArchive):
+        query = select(model).where(model.id == order_id).options(*order_options(model, fields))
+        if customer_id is not None:
+            query = query.where(model.customer_id == customer_id)
+        result = await session.execute(query)
+        order = result.scalars().first()
+        if order:
+            return order
+    return None
+
+
+async def get_orders_or_archived(session: AsyncSession, order_ids: List[int], fields: Optional[FieldSet] = None) -> List:
+    """Several orders by id in one query per table, falling back to orders_archive for those not live."""
+    orders = []
+    remaining = list(order_ids)
+    for model in (Order, OrderArchive):
+        if not remaining:
+            break
+        result = await session.execute(select(model).where(id_in(model.id, remaining)).options(*order_options(model, fields)))
+        found = result.scalars().all()
+        orders.extend(found)
+        found_ids = {order.id for order in found}
+        remaining = [order_id for order_id in remaining if order_id not in found_ids]
+    return orders
+
+
+async def run_archive_worker(interval: int = Config.ORDER_ARCHIVE_INTERVAL_SECONDS):
+    """Background loop: move finished orders out of the hot table on every shard."""
+    while True:
+        try:
+            for region in SHARD_REGIONS:
+                async with shard_session(region) as session:
+                    archived = await archive_orders(session)
+                if archived:
+                    logger.info("Archived %d orders on shard %s", archived, region)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Order archival pass failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Customer, Staff, SuperAdmin, OrderEvent
+from utils.batch_writer import BufferedBatchWriter
+from config import Config
+
+ACTOR_TYPES = {Customer: "customer", Staff: "staff", SuperAdmin: "superadmin"}
+
+order_event_writer = BufferedBatchWriter(
+    OrderEvent.__table__,
+    shard_key=("orders", "order_id"),
+    flush_interval_ms=Config.ORDER_EVENT_FLUSH_INTERVAL_MS,
+    batch_size=Config.ORDER_EVENT_BATCH_SIZE,
+    spill_path=Config.ORDER_EVENT_SPILL_PATH,
+)
+
+
+def snapshot(order, fields) -> Dict[str, Any]:
+    """Current values of `fields`, to diff against after the change."""
+    return {field: getattr(order, field) for field in fields}
+
+
+def diff(before: Dict[str, Any], order) -> Dict[str, list]:
+    """{field: [old, new]} for every field in `before` whose value changed, JSON-safe."""
+    return {
+        field: jsonable_encoder([old, getattr(order, field)])
+        for field, old in before.items()
+        if getattr(order, field) != old
+    }
+
+
+def record_order_event(order_id: int, event: str, actor, changes: Optional[Dict[str, list]] = None):
+    """Queue an audit event; it reaches order_events within a few milliseconds."""
+    order_event_writer.add({
+        "order_id": order_id,
+        "event": event,
+        "actor_type": ACTOR_TYPES.get(type(actor), "system"),
+        "actor_id": getattr(actor, "id", None),
+        "changes": changes or {},
+        "created_at": datetime.utcnow(),
+    })
+
+
+async def get_order_events(session: AsyncSession, order_id: int):
+    result = await session.execute(
+        select(OrderEvent)
+        .where(OrderEvent.order_id == order_id)
+        .order_by(OrderEvent.created_at, OrderEvent.id)
+    )
+    return result.scalars().all()
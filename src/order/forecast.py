@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Sequence
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.main import SHARD_REGIONS, async_session, fan_out, shard_session
+from db.models import DeliveryZone, DemandForecast, Order, OrderArchive, OrderStatus
+from order.pricing import nearest_zones, unit_vectors
+from order.schemas import DemandForecastRead, ZoneDemandForecast
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_WEEK = 168
+UNASSIGNED_ZONE = "unassigned"
+ONE_HOUR = np.timedelta64(1, "h")
+
+# Arbitrary key for pg_try_advisory_xact_lock, so only one worker in the deployment scans the history at a time
+FORECAST_LOCK_KEY = 0xF0CA57
+
+
+class DemandAccumulator:
+    """
+    Seasonal model of order demand per zone and local hour of the week.
+
+    History is fed in chunks through `add`; each order counts towards its
+    (zone, hour-of-week) slot with a weight that halves every
+    `half_life_weeks`, so recent weeks dominate. The state is two
+    zones x 168 arrays no matter how many years are fed in. A slot's forecast
+    is its weighted order count divided by the weighted number of times that
+    hour of the week occurred since the first order in the window.
+    """
+
+    def __init__(self, zone_names: Sequence[str], zone_lat: Sequence[float], zone_lon: Sequence[float],
+                 start: datetime, end: datetime, half_life_weeks: float = Config.FORECAST_HALF_LIFE_WEEKS):
+        self.zone_names = list(zone_names) + [UNASSIGNED_ZONE]
+        self.zone_vectors = unit_vectors(zone_lat, zone_lon).reshape(-1, 3)
+        self.start = start.replace(minute=0, second=0, microsecond=0)
+        self.end = end.replace(minute=0, second=0, microsecond=0)
+        self.hours = int((self.end - self.start) / timedelta(hours=1))
+        self._start64 = np.datetime64(self.start, "us")
+        local_start = self.start + timedelta(hours=Config.QUOTE_UTC_OFFSET_HOURS)
+        self._start_slot = local_start.weekday() * 24 + local_start.hour
+        # Weight of an order placed in each hour of the window, newest hour = 1
+        self._weights = 0.5 ** ((self.hours - 1 - np.arange(self.hours)) / (half_life_weeks * HOURS_PER_WEEK))
+        self.orders = np.zeros((len(self.zone_names), HOURS_PER_WEEK))
+        self.litres = np.zeros((len(self.zone_names), HOURS_PER_WEEK))
+        self.rows = 0
+        # Hours before the first order are not counted as zero-demand history
+        self._first_hour = self.hours
+
+    def add(self, created_at: np.ndarray, lat: np.ndarray, lon: np.ndarray, litres: np.ndarray):
+        """Fold a chunk of orders in. `created_at` is datetime64 in UTC; missing coordinates are NaN."""
+        hour = (np.asarray(created_at, dtype="datetime64[us]") - self._start64) // ONE_HOUR
+        keep = (hour >= 0) & (hour < self.hours)
+        hour, lat, lon, litres = hour[keep], np.asarray(lat)[keep], np.asarray(lon)[keep], np.asarray(litres)[keep]
+        if len(hour):
+            self._first_hour = min(self._first_hour, int(hour.min()))
+        zone = np.full(len(hour), len(self.zone_names) - 1)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        if len(self.zone_vectors) and located.any():
+            zone[located] = nearest_zones(lat[located], lon[located], self.zone_vectors)
+        slot = zone * HOURS_PER_WEEK + (hour + self._start_slot) % HOURS_PER_WEEK
+        weight = self._weights[hour]
+        size = self.orders.size
+        self.orders += np.bincount(slot, weights=weight, minlength=size).reshape(self.orders.shape)
+        self.litres += np.bincount(slot, weights=weight * litres, minlength=size).reshape(self.litres.shape)
+        self.rows += len(hour)
+
+    def _occurrences(self) -> np.ndarray:
+        """Weighted number of times each hour of the week occurs between the first order and the end of the window."""
+        hour = np.arange(self._first_hour, self.hours)
+        return np.bincount((hour + self._start_slot) % HOURS_PER_WEEK, weights=self._weights[hour],
+                           minlength=HOURS_PER_WEEK)
+
+    def forecast(self, day: date):
+        """Expected (orders, litres) per zone for each local hour of `day`, as zones x 24 arrays."""
+        slots = day.weekday() * 24 + np.arange(24)
+        occurrences = self._occurrences()[slots]
+        seen = occurrences > 0
+        orders = np.zeros((len(self.zone_names), 24))
+        litres = np.zeros((len(self.zone_names), 24))
+        orders[:, seen] = self.orders[:, slots[seen]] / occurrences[seen]
+        litres[:, seen] = self.litres[:, slots[seen]] / occurrences[seen]
+        return orders, litres
+
+
+async def accumulate_history(session: AsyncSession, accumulator: DemandAccumulator,
+                             chunk_size: int = Config.FORECAST_CHUNK_SIZE):
+    """Stream live and archived orders in the window into `accumulator`, `chunk_size` rows at a time."""
+    for model in (Order, OrderArchive):
+        result = await session.stream(
+            select(model.created_at, model.destination_lat, model.destination_lon, model.water_amount)
+            .where(
+                model.created_at >= accumulator.start,
+                model.created_at < accumulator.end,
+                model.status != OrderStatus.CANCELLED,
+            )
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            created_at, lat, lon, litres = zip(*rows)
+            accumulator.add(
+                np.array(created_at, dtype="datetime64[us]"),
+                np.array(lat, dtype=np.float64),
+                np.array(lon, dtype=np.float64),
+                np.array(litres, dtype=np.float64),
+            )
+
+
+def local_tomorrow(now: datetime) -> date:
+    return (now + timedelta(hours=Config.QUOTE_UTC_OFFSET_HOURS)).date() + timedelta(days=1)
+
+
+def seconds_to_local_midnight(now: datetime) -> float:
+    local = now + timedelta(hours=Config.QUOTE_UTC_OFFSET_HOURS)
+    midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - local).total_seconds()
+
+
+class DemandForecaster:
+    """
+    Builds the forecast for the next local day in the background and stores
+    it in `demand_forecasts` on the directory; requests only ever read the
+    stored forecast. The history scan runs under a transaction advisory lock
+    on the directory, so one worker in the whole deployment builds at a time,
+    and a worker that gets the lock after another finished finds a fresh
+    forecast stored and skips the scan.
+    """
+
+    def __init__(self, max_age_seconds: int = Config.FORECAST_INTERVAL_SECONDS):
+        self.max_age = timedelta(seconds=max_age_seconds)
+        self._wakeup = asyncio.Event()
+        self._force = False
+
+    async def build(self, day: Optional[date] = None) -> DemandForecastRead:
+        """Scan the order history on every shard and forecast `day` (default: the next local day)."""
+        now = datetime.utcnow()
+        day = day or local_tomorrow(now)
+        async with shard_session(SHARD_REGIONS[0]) as session:
+            result = await session.execute(select(DeliveryZone.name, DeliveryZone.lat, DeliveryZone.lon).order_by(DeliveryZone.name))
+            zones = result.all()
+        accumulator = DemandAccumulator(
+            [name for name, _, _ in zones], [lat for _, lat, _ in zones], [lon for _, _, lon in zones],
+            start=now - timedelta(weeks=Config.FORECAST_HISTORY_WEEKS),
+            end=now,
+        )
+
+        # add() never awaits, so the shards can share one accumulator
+        async def stream(session) -> List:
+            await accumulate_history(session, accumulator)
+            return []
+
+        await fan_out(stream)
+        orders, litres = accumulator.forecast(day)
+        return DemandForecastRead(
+            day=day,
+            generated_at=now,
+            history_start=accumulator.start,
+            orders_seen=accumulator.rows,
+            zones=[
+                ZoneDemandForecast(
+                    zone=name,
+                    orders=np.round(orders[i], 2).tolist(),
+                    litres=np.round(litres[i], 2).tolist(),
+                    total_orders=round(float(orders[i].sum()), 2),
+                    total_litres=round(float(litres[i].sum()), 2),
+                )
+                for i, name in enumerate(accumulator.zone_names)
+            ],
+        )
+
+    async def refresh(self, force: bool = False) -> Optional[DemandForecastRead]:
+        """
+        Build and store the next day's forecast, unless another worker is
+        building one or (without `force`) a fresh one is already stored.
+        Returns the new forecast, or None if nothing was built.
+        """
+        async with async_session() as session:
+            # Held by the transaction, so it stays on one server connection
+            # behind a transaction-mode pooler; the commit storing the forecast
+            # releases it
+            if not await session.scalar(select(func.pg_try_advisory_xact_lock(FORECAST_LOCK_KEY))):
+                return None
+            day = local_tomorrow(datetime.utcnow())
+            if not force:
+                generated_at = await session.scalar(
+                    select(DemandForecast.generated_at).where(DemandForecast.day == day)
+                )
+                if generated_at is not None and datetime.utcnow() - generated_at < self.max_age:
+                    return None
+            forecast = await self.build(day)
+            stmt = insert(DemandForecast).values(
+                day=forecast.day, generated_at=forecast.generated_at, forecast=forecast.model_dump(mode="json"),
+            )
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[DemandForecast.day],
+                set_={"generated_at": stmt.excluded.generated_at, "forecast": stmt.excluded.forecast},
+            ))
+            await session.commit()
+        return forecast
+
+    def request_refresh(self):
+        """Have this worker's background loop rebuild the forecast now instead of at its next tick."""
+        self._force = True
+        self._wakeup.set()
+
+    async def get(self) -> Optional[DemandForecastRead]:
+        """The newest stored forecast, None before the first one is built. Never scans the history."""
+        async with async_session() as session:
+            stored = await session.scalar(select(DemandForecast).order_by(DemandForecast.day.desc()).limit(1))
+        if stored is None or stored.day != local_tomorrow(datetime.utcnow()):
+            # Missing, or the local day rolled over before the worker caught up
+            self.request_refresh()
+        return None if stored is None else DemandForecastRead.model_validate(stored.forecast)
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+demand_forecaster = DemandForecaster()
+
+
+async def run_forecast_worker(interval: int = Config.FORECAST_INTERVAL_SECONDS):
+    """Background loop: keep the stored next-day forecast fresh, and rebuild it soon after local midnight."""
+    while True:
+        force, demand_forecaster._force = demand_forecaster._force, False
+        try:
+            forecast = await demand_forecaster.refresh(force=force)
+            if forecast is not None:
+                logger.info("Demand forecast for %s built from %d orders", forecast.day, forecast.orders_seen)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Demand forecast failed")
+        await demand_forecaster.wait(min(interval, seconds_to_local_midnight(datetime.utcnow()) + 1))
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import Integer, Numeric, column, select, update, func, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.main import SHARD_REGIONS, shard_session
+from db.models import DeliveryRate, DeliveryZone, Order, OrderStatus
+from order.events import record_order_event
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_matrix_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distance between every point of set 1 (rows) and set 2 (columns)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    dlat = lat2[None, :] - lat1[:, None]
+    dlon = lon2[None, :] - lon1[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_pairs_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distance between the i-th point of set 1 and the i-th point of set 2."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def nearest_zones(lat: np.ndarray, lon: np.ndarray, zone_vectors: np.ndarray) -> np.ndarray:
+    """
+    Index of the closest zone for every point. The great-circle nearest point
+    is the one with the largest dot product of unit vectors, so this is one
+    matrix product instead of a haversine per point and zone.
+    """
+    return (unit_vectors(lat, lon) @ zone_vectors.T).argmax(axis=1)
+
+
+def surge_table() -> np.ndarray:
+    table = np.ones(24)
+    for hour, multiplier in Config.QUOTE_SURGE_MULTIPLIERS.items():
+        table[int(hour) % 24] = multiplier
+    return table
+
+
+class _QuoteSnapshot:
+    __slots__ = ("zone_names", "zone_lat", "zone_lon", "zone_vectors", "distance_km", "depot_km",
+                 "band_min", "base_fee", "per_litre", "per_km", "version")
+
+    def __init__(self, zones: Sequence[Tuple[str, float, float, bool]], rates: Sequence[Tuple[float, float, float, float]],
+                 version=None):
+        self.zone_names = [name for name, _, _, _ in zones]
+        self.zone_lat = np.array([lat for _, lat, _, _ in zones], dtype=np.float64)
+        self.zone_lon = np.array([lon for _, _, lon, _ in zones], dtype=np.float64)
+        self.zone_vectors = unit_vectors(self.zone_lat, self.zone_lon)
+        is_depot = np.array([depot for _, _, _, depot in zones], dtype=bool)
+        # Zone-to-zone road distance, computed once per reload
+        self.distance_km = haversine_matrix_km(self.zone_lat, self.zone_lon, self.zone_lat, self.zone_lon)
+        self.distance_km *= Config.ETA_ROAD_FACTOR
+        # Distance from the closest depot to each zone
+        if is_depot.any():
+            self.depot_km = self.distance_km[is_depot].min(axis=0)
+        else:
+            self.depot_km = np.full(len(zones), np.nan)
+        rates = sorted(rates)
+        self.band_min = np.array([float(row[0]) for row in rates], dtype=np.float64)
+        self.base_fee = np.array([float(row[1]) for row in rates], dtype=np.float64)
+        self.per_litre = np.array([float(row[2]) for row in rates], dtype=np.float64)
+        self.per_km = np.array([float(row[3]) for row in rates], dtype=np.float64)
+        self.version = version
+
+
+class QuoteEngine:
+    """
+    In-memory copy of `delivery_zones` and `delivery_rates`, plus the derived
+    zone distance matrix. Quotes are pure array arithmetic over a snapshot
+    that reloads swap in whole, the same way recycle.valuation.TariffTable does.
+    """
+
+    def __init__(self):
+        self._snapshot = _QuoteSnapshot([], [])
+        self._surge = surge_table()
+
+    @property
+    def ready(self) -> bool:
+        snapshot = self._snapshot
+        return len(snapshot.band_min) > 0 and not np.isnan(snapshot.depot_km).all()
+
+    def load(self, zones, rates, version=None):
+        self._snapshot = _QuoteSnapshot(zones, rates, version)
+
+    async def reload(self, session: AsyncSession, force: bool = False) -> bool:
+        """Reload from the database if zones or rates changed since the last load."""
+        result = await session.execute(
+            select(
+                select(func.max(DeliveryZone.updated_at)).scalar_subquery(),
+                select(func.count()).select_from(DeliveryZone).scalar_subquery(),
+                select(func.max(DeliveryRate.updated_at)).scalar_subquery(),
+                select(func.count()).select_from(DeliveryRate).scalar_subquery(),
+            )
+        )
+        version = tuple(result.one())
+        if not force and version == self._snapshot.version:
+            return False
+        zones = await session.execute(
+            select(DeliveryZone.name, DeliveryZone.lat, DeliveryZone.lon, DeliveryZone.is_depot).order_by(DeliveryZone.name)
+        )
+        rates = await session.execute(
+            select(DeliveryRate.min_litres, DeliveryRate.base_fee, DeliveryRate.per_litre, DeliveryRate.per_km)
+        )
+        self.load(zones.all(), rates.all(), version)
+        return True
+
+    def quote(self, water_amount, lat, lon, at: Sequence[datetime]) -> np.ndarray:
+        """
+        Quote a batch of deliveries. Returns a float array with NaN where no
+        quote is possible (missing coordinates, no zones/depots or no rate band
+        for the volume).
+        """
+        snapshot = self._snapshot
+        litres = np.asarray(water_amount, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        quotes = np.full(len(litres), np.nan)
+        if not self.ready or len(litres) == 0:
+            return quotes
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        if not located.any():
+            return quotes
+        lat, lon = lat[located], lon[located]
+        zone = nearest_zones(lat, lon, snapshot.zone_vectors)
+        # Depot to the destination's zone, then centroid to the door
+        local_km = haversine_pairs_km(lat, lon, snapshot.zone_lat[zone], snapshot.zone_lon[zone]) * Config.ETA_ROAD_FACTOR
+        distance = snapshot.depot_km[zone] + local_km
+
+        band = np.searchsorted(snapshot.band_min, litres[located], side="right") - 1
+        in_band = band >= 0
+        band = np.maximum(band, 0)
+        price = snapshot.base_fee[band] + snapshot.per_litre[band] * litres[located] + snapshot.per_km[band] * distance
+
+        offset = timedelta(hours=Config.QUOTE_UTC_OFFSET_HOURS)
+        hours = np.fromiter(((moment + offset).hour for moment in np.asarray(at)[located]), dtype=np.int64, count=len(zone))
+        price = np.round(price * self._surge[hours], 2)
+        quotes[located] = np.where(in_band & ~np.isnan(distance), price, np.nan)
+        return quotes
+
+    def quote_one(self, water_amount: float, lat: Optional[float], lon: Optional[float],
+                  at: Optional[datetime] = None) -> Optional[float]:
+        if lat is None or lon is None:
+            return None
+        value = self.quote([water_amount], [lat], [lon], [at or datetime.utcnow()])[0]
+        return None if np.isnan(value) else float(value)
+
+
+quote_engine = QuoteEngine()
+
+
+async def quote_pending_orders(session: AsyncSession, batch_size: int = Config.QUOTE_BATCH_SIZE) -> int:
+    """Attach quotes to PAIRING orders that have coordinates but no charge yet, one keyset page at a time."""
+    quoted = 0
+    last_id = 0
+    while quote_engine.ready:
+        result = await session.execute(
+            select(Order.id, Order.water_amount, Order.destination_lat, Order.destination_lon, Order.created_at)
+            .where(
+                Order.status == OrderStatus.PAIRING,
+                Order.driver_charge.is_(None),
+                Order.destination_lat.is_not(None),
+                Order.destination_lon.is_not(None),
+                Order.id > last_id,
+            )
+            .order_by(Order.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        ids, amounts, lats, lons, created = zip(*rows)
+        quotes = quote_engine.quote(amounts, lats, lons, created)
+        priced = [(order_id, float(quote)) for order_id, quote in zip(ids, quotes) if not np.isnan(quote)]
+        if priced:
+            quoted_rows = values(column("id", Integer), column("charge", Numeric(10, 2)), name="quoted").data(priced)
+            # Only fill in charges staff have not set in the meantime
+            result = await session.execute(
+                update(Order)
+                .where(Order.id == quoted_rows.c.id, Order.driver_charge.is_(None))
+                .values(driver_charge=quoted_rows.c.charge, version=Order.version + 1)
+                .returning(Order.id, Order.driver_charge),
+                execution_options={"synchronize_session": False},
+            )
+            updated = result.all()
+            await session.commit()
+            for order_id, charge in updated:
+                record_order_event(order_id, "quoted", None, {"driver_charge": [None, float(charge)]})
+            quoted += len(updated)
+        last_id = ids[-1]
+    return quoted
+
+
+async def run_quote_worker(interval: int = Config.QUOTE_INTERVAL_SECONDS):
+    """Background loop: pick up zone/rate changes, then quote orders created before they existed."""
+    while True:
+        try:
+            for index, region in enumerate(SHARD_REGIONS):
+                async with shard_session(region) as session:
+                    if index == 0:
+                        await quote_engine.reload(session)
+                    await quote_pending_orders(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Quote pass failed")
+        await asyncio.sleep(interval)
@@ -1,6 +1,6 @@
-from typing import Optional
-from datetime import datetime
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from pydantic import BaseModel, Field
 from db.models import OrderStatus, PaymentStatus
 from customer.schemas import CustomerRead
 
@@ -14,7 +14,8 @@ class OrderBase(BaseSchema):
     status: OrderStatus = OrderStatus.PAIRING
 
 class OrderCreate(OrderBase):
-    pass
+    destination_lat: Optional[float] = Field(None, ge=-90, le=90)
+    destination_lon: Optional[float] = Field(None, ge=-180, le=180)
 
 class OrderRead(OrderBase):
     id: int
@@ -26,12 +27,77 @@ class OrderRead(OrderBase):
     driver_charge: Optional[float]
     payment_status: PaymentStatus
     payment_date: Optional[datetime]
+    claimed_by_id: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+    destination_lat: Optional[float] = None
+    destination_lon: Optional[float] = None
+    # Send back as If-Match to update; archived orders have none
+    version: Optional[int] = None
+
+class OrderDetailRead(OrderRead):
+    # Only filled in while the order is en route and the driver is reporting
+    driver_lat: Optional[float] = None
+    driver_lon: Optional[float] = None
+    driver_position_at: Optional[datetime] = None
+    eta_seconds: Optional[int] = None
 
 class OrderUpdate(BaseModel):
     destination_address: Optional[str] = None
+    destination_lat: Optional[float] = Field(None, ge=-90, le=90)
+    destination_lon: Optional[float] = Field(None, ge=-180, le=180)
     water_amount: Optional[float] = None
     status: Optional[OrderStatus] = None
     driver_id: Optional[int] = None
     driver_charge: Optional[float] = None
     payment_status: Optional[PaymentStatus] = None
-    payment_date: Optional[datetime] = None
\ No newline at end of file
+    payment_date: Optional[datetime] = None
+
+class OrderSearchHit(BaseSchema):
+    id: int
+    customer_id: int
+    destination_address: str
+    status: OrderStatus
+    created_at: datetime
+    score: float
+
+class OrderEventRead(BaseSchema):
+    id: int
+    order_id: int
+    event: str
+    actor_type: str
+    actor_id: Optional[int]
+    changes: Dict[str, List[Any]]
+    created_at: datetime
+
+class DeliveryZoneBase(BaseSchema):
+    name: str
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    is_depot: bool = False
+
+class DeliveryZoneRead(DeliveryZoneBase):
+    updated_at: datetime
+
+class DeliveryRateBase(BaseSchema):
+    min_litres: float = Field(ge=0)
+    base_fee: float = Field(ge=0)
+    per_litre: float = Field(ge=0)
+    per_km: float = Field(ge=0)
+
+class DeliveryRateRead(DeliveryRateBase):
+    updated_at: datetime
+
+class ZoneDemandForecast(BaseModel):
+    zone: str
+    # Expected orders and litres for each local hour of the day, 0-23
+    orders: List[float]
+    litres: List[float]
+    total_orders: float
+    total_litres: float
+
+class DemandForecastRead(BaseModel):
+    day: date
+    generated_at: datetime
+    history_start: datetime
+    orders_seen: int
+    zones: List[ZoneDemandForecast]
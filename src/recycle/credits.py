@@ -0,0 +1,101 @@
+"""
+Customer recycling credit. Every change is an append-only `credit_ledger`
+entry, and `customer_balances` holds the running total, updated in the same
+transaction as the entry so a balance read is a single primary-key lookup.
+Both live on the customer's shard, next to the submissions and orders they
+refer to; the caller commits.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import CreditLedgerEntry, CustomerBalance, RecyclableStatus, RecyclableSubmission
+
+RECYCLABLE_CREDIT = "recyclable_credit"
+ORDER_REDEMPTION = "order_redemption"
+
+ZERO = Decimal("0.00")
+
+
+async def get_balance(session: AsyncSession, customer_id: int) -> Decimal:
+    balance = await session.scalar(select(CustomerBalance.balance).where(CustomerBalance.customer_id == customer_id))
+    return balance if balance is not None else ZERO
+
+
+async def grant_credit(session: AsyncSession, customer_id: int, amount, submission_id: int) -> CreditLedgerEntry:
+    """
+    Credit `amount` for a reviewed submission. The upsert adds to the balance
+    in place and holds its row lock until commit, so concurrent credits queue
+    up and each entry's `balance_after` is exact.
+    """
+    now = datetime.utcnow()
+    stmt = insert(CustomerBalance).values(customer_id=customer_id, balance=amount, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CustomerBalance.customer_id],
+        set_={"balance": CustomerBalance.balance + stmt.excluded.balance, "updated_at": stmt.excluded.updated_at},
+    ).returning(CustomerBalance.balance)
+    balance = await session.scalar(stmt)
+    entry = CreditLedgerEntry(
+        customer_id=customer_id, kind=RECYCLABLE_CREDIT, amount=amount, balance_after=balance,
+        submission_id=submission_id, created_at=now,
+    )
+    session.add(entry)
+    return entry
+
+
+async def redeem_credit(session: AsyncSession, customer_id: int, charge, order_id: int) -> Decimal:
+    """Spend as much of the balance as covers `charge` on an order. Returns the amount applied."""
+    balance = await session.scalar(
+        select(CustomerBalance.balance).where(CustomerBalance.customer_id == customer_id).with_for_update()
+    )
+    if not balance or balance <= 0:
+        return ZERO
+    applied = min(balance, Decimal(charge))
+    now = datetime.utcnow()
+    remaining = await session.scalar(
+        update(CustomerBalance)
+        .where(CustomerBalance.customer_id == customer_id)
+        .values(balance=CustomerBalance.balance - applied, updated_at=now)
+        .returning(CustomerBalance.balance)
+    )
+    session.add(CreditLedgerEntry(
+        customer_id=customer_id, kind=ORDER_REDEMPTION, amount=-applied, balance_after=remaining,
+        order_id=order_id, created_at=now,
+    ))
+    return applied
+
+
+async def get_ledger(session: AsyncSession, customer_id: int, before_id: Optional[int] = None,
+                     limit: int = 50) -> List[CreditLedgerEntry]:
+    """Newest entries first; pass the last id seen as `before_id` for the next page."""
+    query = select(CreditLedgerEntry).where(CreditLedgerEntry.customer_id == customer_id)
+    if before_id is not None:
+        query = query.where(CreditLedgerEntry.id < before_id)
+    result = await session.execute(query.order_by(CreditLedgerEntry.id.desc()).limit(limit))
+    return result.scalars().all()
+
+
+async def backfill_credits(session: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Ledger up to `batch_size` submissions credited before the ledger existed,
+    adding them to their customers' balances. Submissions that already have an
+    entry are skipped, so a rerun picks up where the last one stopped.
+    Returns how many were ledgered; commit and repeat until it returns 0.
+    """
+    result = await session.execute(
+        select(RecyclableSubmission.id, RecyclableSubmission.customer_id, RecyclableSubmission.credited_amount)
+        .outerjoin(CreditLedgerEntry, CreditLedgerEntry.submission_id == RecyclableSubmission.id)
+        .where(
+            RecyclableSubmission.status == RecyclableStatus.CREDITED,
+            RecyclableSubmission.credited_amount > 0,
+            CreditLedgerEntry.id.is_(None),
+        )
+        .order_by(RecyclableSubmission.id)
+        .limit(batch_size)
+    )
+    rows = result.all()
+    for submission_id, customer_id, amount in rows:
+        await grant_credit(session, customer_id, amount, submission_id)
+    return len(rows)
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from customer.schemas import CustomerRead
 from db.models import RecyclableStatus, PickupOption
 
@@ -16,16 +16,65 @@ class RecyclableSubmissionBase(BaseSchema):
     status: RecyclableStatus = RecyclableStatus.PENDING_REVIEW
 
 class RecyclableSubmissionCreate(RecyclableSubmissionBase):
-    image_url: str
+    image_url: Optional[str] = None
+    image_hash: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_image(self):
+        if not self.image_url and not self.image_hash:
+            raise ValueError("Either image_url or image_hash is required")
+        return self
 
 class RecyclableSubmissionRead(RecyclableSubmissionBase):
     id: int
     customer: CustomerRead
     submission_date: datetime
+    image_url: str
+    image_hash: Optional[str]
     estimated_value: Optional[float]
     credited_amount: Optional[float]
+    claimed_by_id: Optional[int] = None
+    claim_expires_at: Optional[datetime] = None
+
+class RecyclableImageRead(BaseModel):
+    image_hash: str
+    image_url: str
+    thumbnail_url: str
+    size: int
 
 class RecyclableSubmissionUpdate(BaseSchema):
     status: RecyclableStatus
     estimated_value: Optional[float]
     credited_amount: Optional[float]
+
+
+class RecyclableReviewComplete(BaseModel):
+    status: Literal[RecyclableStatus.PICKUP_SCHEDULED, RecyclableStatus.CREDITED]
+    estimated_value: Optional[float] = None
+    credited_amount: Optional[float] = Field(None, gt=0)
+
+    @model_validator(mode="after")
+    def check_credit(self):
+        if self.status == RecyclableStatus.CREDITED and self.credited_amount is None:
+            raise ValueError("credited_amount is required to credit a submission")
+        return self
+
+class RecyclableTariffBase(BaseSchema):
+    recyclable_type: str
+    unit_value: float
+    pickup_fee: float = 0
+
+class RecyclableTariffRead(RecyclableTariffBase):
+    updated_at: datetime
+
+class CreditBalanceRead(BaseModel):
+    balance: float
+
+class CreditLedgerEntryRead(BaseSchema):
+    id: int
+    kind: str
+    amount: float
+    balance_after: float
+    submission_id: Optional[int]
+    order_id: Optional[int]
+    created_at: datetime
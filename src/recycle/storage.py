@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from config import Config
+
+IMAGE_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+class StoredImage(NamedTuple):
+    image_hash: str
+    size: int
+    created: bool
+
+
+class _FilePartReader:
+    """
+    Callbacks for python-multipart that keep only the bytes of one file field.
+    The parser is fed straight from the request stream, so nothing but the
+    current network chunk is ever held in memory.
+    """
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name.encode()
+        self.found = False
+        self.pending: List[bytes] = []
+        self._capture = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._capture = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._capture = (
+            not self.found
+            and options.get(b"name") == self.field_name
+            and b"filename" in options
+        )
+        self.found = self.found or self._capture
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._capture:
+            self.pending.append(data[start:end])
+
+
+async def iter_multipart_file(request: Request, field_name: str = "file") -> AsyncIterator[bytes]:
+    """Yield the contents of a single multipart file field as it arrives."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidUpload("Expected a multipart/form-data body")
+    reader = _FilePartReader(field_name)
+    parser = MultipartParser(params[b"boundary"], reader.callbacks())
+    async for chunk in request.stream():
+        parser.write(chunk)
+        if reader.pending:
+            yield b"".join(reader.pending)
+            reader.pending.clear()
+    parser.finalize()
+    if reader.pending:
+        yield b"".join(reader.pending)
+    if not reader.found:
+        raise InvalidUpload(f"Missing file field '{field_name}'")
+
+
+def make_thumbnail(source: str, target: str, max_size: int):
+    """Runs in a worker process. Raises if `source` is not a readable image."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.thumbnail((max_size, max_size))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                image.convert("RGB").save(fh, "JPEG", quality=85)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+class ContentStore:
+    """
+    Local filesystem store for recyclable images, addressed by SHA-256 of the
+    content so identical uploads are stored once.
+    """
+
+    def __init__(self, root: str, chunk_size: int, max_bytes: int, thumbnail_size: int, thumbnail_workers: int):
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_workers = thumbnail_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def image_path(self, image_hash: str) -> Path:
+        return self.root / "objects" / image_hash[:2] / image_hash[2:4] / image_hash
+
+    def thumbnail_path(self, image_hash: str) -> Path:
+        return self.root / "thumbnails" / image_hash[:2] / image_hash[2:4] / f"{image_hash}.jpg"
+
+    def exists(self, image_hash: str) -> bool:
+        return bool(IMAGE_HASH_PATTERN.match(image_hash)) and self.image_path(image_hash).is_file()
+
+    async def save(self, chunks: AsyncIterator[bytes]) -> StoredImage:
+        tmp_dir = self.root / "tmp"
+        await run_in_threadpool(tmp_dir.mkdir, parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    buffer += chunk
+                    if len(buffer) >= self.chunk_size:
+                        await run_in_threadpool(fh.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await run_in_threadpool(fh.write, bytes(buffer))
+            if size == 0:
+                raise InvalidUpload("Empty upload")
+            image_hash = digest.hexdigest()
+            created = await run_in_threadpool(self._commit, tmp_path, image_hash)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return StoredImage(image_hash, size, created)
+
+    def _commit(self, tmp_path: str, image_hash: str) -> bool:
+        target = self.image_path(image_hash)
+        if target.exists():
+            os.unlink(tmp_path)
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+        return True
+
+    def delete(self, image_hash: str):
+        for path in (self.image_path(image_hash), self.thumbnail_path(image_hash)):
+            if path.exists():
+                path.unlink()
+
+    async def ensure_thumbnail(self, image_hash: str):
+        target = self.thumbnail_path(image_hash)
+        if await run_in_threadpool(target.exists):
+            return
+        await run_in_threadpool(target.parent.mkdir, parents=True, exist_ok=True)
+        if self._pool is None:
+            # Not fork: this process runs threads (thread pool, asyncpg, mail and log writers) whose locks a forked child could inherit held
+            self._pool = ProcessPoolExecutor(max_workers=self.thumbnail_workers, mp_context=get_context("forkserver"))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self._pool, make_thumbnail, str(self.image_path(image_hash)), str(target), self.thumbnail_size
+        )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+image_store = ContentStore(
+    Config.UPLOAD_DIR,
+    chunk_size=Config.UPLOAD_CHUNK_BYTES,
+    max_bytes=Config.UPLOAD_MAX_BYTES,
+    thumbnail_size=Config.THUMBNAIL_MAX_SIZE,
+    thumbnail_workers=Config.THUMBNAIL_WORKERS,
+)
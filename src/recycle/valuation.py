@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import Integer, Numeric, case, column, func, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.main import SHARD_REGIONS, shard_session
+from db.models import RecyclableSubmission, RecyclableTariff, RecyclableStatus, PickupOption
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_type(recyclable_type: str) -> str:
+    return recyclable_type.strip().lower()
+
+
+class _TariffSnapshot:
+    __slots__ = ("index", "unit_values", "pickup_fees", "version")
+
+    def __init__(self, index: Dict[str, int], unit_values: np.ndarray, pickup_fees: np.ndarray,
+                 version: Optional[Tuple[datetime, int]]):
+        self.index = index
+        self.unit_values = unit_values
+        self.pickup_fees = pickup_fees
+        self.version = version
+
+
+class TariffTable:
+    """
+    In-memory copy of `recyclable_tariffs`. A reload builds a new snapshot and
+    swaps it in with a single assignment, so pricing never sees a half-loaded table.
+    """
+
+    def __init__(self):
+        self._snapshot = _TariffSnapshot({}, np.zeros(0), np.zeros(0), None)
+
+    def load(self, tariffs: Sequence[Tuple[str, float, float]], version=None):
+        index = {normalize_type(name): i for i, (name, _, _) in enumerate(tariffs)}
+        self._snapshot = _TariffSnapshot(
+            index,
+            np.array([float(unit) for _, unit, _ in tariffs], dtype=np.float64),
+            np.array([float(fee) for _, _, fee in tariffs], dtype=np.float64),
+            version,
+        )
+
+    async def reload(self, session: AsyncSession, force: bool = False) -> bool:
+        """Reload from the database if the tariff table changed since the last load."""
+        result = await session.execute(
+            select(func.max(RecyclableTariff.updated_at), func.count(RecyclableTariff.recyclable_type))
+        )
+        version = tuple(result.one())
+        if not force and version == self._snapshot.version:
+            return False
+        result = await session.execute(
+            select(RecyclableTariff.recyclable_type, RecyclableTariff.unit_value, RecyclableTariff.pickup_fee)
+        )
+        self.load(result.all(), version)
+        return True
+
+    def price(self, recyclable_types: Sequence[str], is_pickup: np.ndarray) -> np.ndarray:
+        """
+        Price a batch of submissions. Returns a float array with NaN where the
+        type has no tariff. Only the distinct type names go through Python; the
+        rest is array arithmetic.
+        """
+        snapshot = self._snapshot
+        if len(recyclable_types) == 0:
+            return np.zeros(0)
+        names, inverse = np.unique(np.asarray(recyclable_types, dtype=str), return_inverse=True)
+        codes = np.array([snapshot.index.get(normalize_type(name), -1) for name in names], dtype=np.int64)
+        idx = codes[inverse.reshape(-1)]
+        known = idx >= 0
+        safe_idx = np.where(known, idx, 0)
+        if len(snapshot.unit_values) == 0:
+            return np.full(len(idx), np.nan)
+        values = snapshot.unit_values[safe_idx] - snapshot.pickup_fees[safe_idx] * np.asarray(is_pickup, dtype=bool)
+        values = np.round(np.maximum(values, 0), 2)
+        return np.where(known, values, np.nan)
+
+
+tariff_table = TariffTable()
+
+
+async def price_pending_submissions(session: AsyncSession, batch_size: int = Config.VALUATION_BATCH_SIZE) -> int:
+    """Fill in `estimated_value` for unpriced pending submissions, one keyset page at a time."""
+    priced = 0
+    last_id = 0
+    while True:
+        result = await session.execute(
+            select(RecyclableSubmission.id, RecyclableSubmission.recyclable_type, RecyclableSubmission.pickup_option)
+            .where(
+                RecyclableSubmission.status == RecyclableStatus.PENDING_REVIEW,
+                RecyclableSubmission.estimated_value.is_(None),
+                RecyclableSubmission.id > last_id,
+            )
+            .order_by(RecyclableSubmission.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        ids, types, options = zip(*rows)
+        prices = tariff_table.price(types, np.array([option == PickupOption.PICKUP for option in options]))
+        updates = [(submission_id, float(value)) for submission_id, value in zip(ids, prices) if not np.isnan(value)]
+        if updates:
+            priced_rows = values(column("id", Integer), column("value", Numeric(10, 2)), name="priced").data(updates)
+            # Skip submissions reviewed or priced since the select
+            result = await session.execute(
+                update(RecyclableSubmission)
+                .where(
+                    RecyclableSubmission.id == priced_rows.c.id,
+                    RecyclableSubmission.status == RecyclableStatus.PENDING_REVIEW,
+                    RecyclableSubmission.estimated_value.is_(None),
+                )
+                .values(estimated_value=priced_rows.c.value),
+                execution_options={"synchronize_session": False},
+            )
+            await session.commit()
+            priced += result.rowcount
+        last_id = ids[-1]
+    return priced
+
+
+async def reprice_pending_submissions(session: AsyncSession) -> int:
+    """Re-price the whole pending queue against the current tariffs in one UPDATE ... FROM."""
+    pickup_fee = case(
+        (RecyclableSubmission.pickup_option == PickupOption.PICKUP, RecyclableTariff.pickup_fee),
+        else_=0,
+    )
+    result = await session.execute(
+        update(RecyclableSubmission)
+        .where(
+            RecyclableSubmission.status == RecyclableStatus.PENDING_REVIEW,
+            func.lower(func.trim(RecyclableSubmission.recyclable_type)) == RecyclableTariff.recyclable_type,
+        )
+        .values(estimated_value=func.greatest(RecyclableTariff.unit_value - pickup_fee, 0))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def run_valuation_worker(interval: int = Config.VALUATION_INTERVAL_SECONDS):
+    """Background loop: pick up tariff changes made by other workers, then price new submissions."""
+    while True:
+        try:
+            # Tariffs are written to every shard together, so any one of them
+            # is authoritative; submissions are priced where they live.
+            for index, region in enumerate(SHARD_REGIONS):
+                async with shard_session(region) as session:
+                    if index == 0:
+                        await tariff_table.reload(session)
+                    await price_pending_submissions(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Valuation pass failed")
+        await asyncio.sleep(interval)
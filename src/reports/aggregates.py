@@ -0,0 +1,86 @@
+"""
+Chunk aggregation for the offline reports, run in worker processes.
+
+Every report is a group-by with summed measures. A chunk of source rows
+arrives as columns, is reduced to {key: [measure sums]} here, and the
+parent process merges the partial results, so only aggregates cross the
+process boundary back.
+"""
+from typing import Any, Dict, List, NamedTuple, Sequence
+import numpy as np
+from db.models import OrderStatus
+from order.pricing import nearest_zones
+
+UNASSIGNED = -1
+
+
+class ReportSpec(NamedTuple):
+    title: str
+    key: str
+    measures: List[str]
+
+
+REPORTS = {
+    "revenue_by_driver": ReportSpec("Revenue by driver", "driver", ["orders", "litres", "revenue"]),
+    "litres_by_area": ReportSpec("Litres delivered by area", "area", ["orders", "litres"]),
+    "recycling_credits_by_type": ReportSpec("Recycling credits by type", "recyclable_type", ["submissions", "credited"]),
+    "staff_productivity": ReportSpec(
+        "Staff productivity", "staff", ["orders", "delivered", "cancelled", "litres_delivered"]
+    ),
+}
+
+
+def _floats(values: Sequence) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _ids(values: Sequence) -> np.ndarray:
+    return np.array([UNASSIGNED if value is None else value for value in values], dtype=np.int64)
+
+
+def group_sums(keys: np.ndarray, measures: List[np.ndarray]) -> Dict[Any, List[float]]:
+    """{key: [sum of each measure]} over the rows, missing measure values counting as 0."""
+    if not len(keys):
+        return {}
+    groups, inverse = np.unique(keys, return_inverse=True)
+    sums = np.stack([
+        np.bincount(inverse, weights=np.nan_to_num(measure), minlength=len(groups)) for measure in measures
+    ], axis=1)
+    return {key: row for key, row in zip(groups.tolist(), sums.tolist())}
+
+
+def aggregate_chunk(kind: str, columns: Sequence[Sequence], context: Dict[str, Any]) -> Dict[Any, List[float]]:
+    """Partial aggregate of one chunk of `kind`'s source rows, given column-wise."""
+    if kind == "revenue_by_driver":
+        driver_id, litres, charge = columns
+        return group_sums(_ids(driver_id), [np.ones(len(driver_id)), _floats(litres), _floats(charge)])
+    if kind == "litres_by_area":
+        lat, lon, litres = columns
+        lat, lon = _floats(lat), _floats(lon)
+        zones = np.full(len(lat), UNASSIGNED, dtype=np.int64)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        if len(context["zone_vectors"]) and located.any():
+            zones[located] = nearest_zones(lat[located], lon[located], context["zone_vectors"])
+        return group_sums(zones, [np.ones(len(lat)), _floats(litres)])
+    if kind == "recycling_credits_by_type":
+        recyclable_type, credited = columns
+        return group_sums(np.array(recyclable_type, dtype=object), [np.ones(len(credited)), _floats(credited)])
+    if kind == "staff_productivity":
+        staff_id, status, litres = columns
+        status = np.array(status, dtype=object)
+        delivered = status == OrderStatus.DELIVERED.value
+        return group_sums(_ids(staff_id), [
+            np.ones(len(staff_id)), delivered.astype(np.float64), (status == OrderStatus.CANCELLED.value).astype(np.float64),
+            np.where(delivered, _floats(litres), 0.0),
+        ])
+    raise ValueError(f"Unknown report {kind}")
+
+
+def merge(total: Dict[Any, List[float]], partial: Dict[Any, List[float]]):
+    for key, sums in partial.items():
+        current = total.get(key)
+        if current is None:
+            total[key] = sums
+        else:
+            for i, value in enumerate(sums):
+                current[i] += value
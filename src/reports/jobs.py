@@ -0,0 +1,260 @@
+import asyncio
+import csv
+import io
+import logging
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from db.main import SHARD_REGIONS, async_session, fan_out, id_in, shard_session
+from db.models import (Order, OrderArchive, OrderStatus, PaymentStatus, RecyclableSubmission, RecyclableStatus,
+                       DeliveryZone, ReportArtifact, ReportJob, ReportStatus, Staff)
+from driver.roster import driver_roster
+from order.pricing import unit_vectors
+from reports.aggregates import REPORTS, UNASSIGNED, aggregate_chunk, merge
+from utils.work_queue import claim_rows, held_by, renew_claim
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def source_queries(kind: str, start: datetime, end: datetime) -> list:
+    """Plain range scans feeding `kind`, run on every shard. All grouping happens in the pool."""
+    if kind == "recycling_credits_by_type":
+        return [
+            select(RecyclableSubmission.recyclable_type, RecyclableSubmission.credited_amount)
+            .where(
+                RecyclableSubmission.submission_date >= start,
+                RecyclableSubmission.submission_date < end,
+                RecyclableSubmission.status == RecyclableStatus.CREDITED,
+            )
+        ]
+    queries = []
+    for model in (Order, OrderArchive):
+        period = (model.created_at >= start, model.created_at < end)
+        if kind == "revenue_by_driver":
+            query = select(model.driver_id, model.water_amount, model.driver_charge).where(
+                *period, model.payment_status == PaymentStatus.PAID
+            )
+        elif kind == "litres_by_area":
+            query = select(model.destination_lat, model.destination_lon, model.water_amount).where(
+                *period, model.status == OrderStatus.DELIVERED
+            )
+        elif kind == "staff_productivity":
+            query = select(model.staff_assigned_id, model.status, model.water_amount).where(
+                *period, model.staff_assigned_id.is_not(None)
+            )
+        else:
+            raise ValueError(f"Unknown report {kind}")
+        queries.append(query)
+    return queries
+
+
+async def report_context(kind: str) -> Dict[str, Any]:
+    """Small read-only inputs the chunk aggregation needs, sent along with every chunk."""
+    if kind != "litres_by_area":
+        return {}
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        result = await session.execute(select(DeliveryZone.name, DeliveryZone.lat, DeliveryZone.lon).order_by(DeliveryZone.name))
+        zones = result.all()
+    return {
+        "zone_names": [name for name, _, _ in zones],
+        "zone_vectors": unit_vectors([lat for _, lat, _ in zones], [lon for _, _, lon in zones]),
+    }
+
+
+async def key_names(kind: str, keys: List[Any], context: Dict[str, Any]) -> Dict[Any, str]:
+    """Display name per group key: driver/staff names, zone names; raw ids and types are kept as is."""
+    names: Dict[Any, str] = {UNASSIGNED: "unassigned"}
+    if kind == "revenue_by_driver":
+        drivers = await driver_roster.get_many([key for key in keys if key != UNASSIGNED])
+        names.update({key: f"{driver.first_name} {driver.last_name}" for key, driver in drivers.items()})
+    elif kind == "staff_productivity":
+        async with async_session() as session:
+            result = await session.execute(
+                select(Staff.id, Staff.first_name, Staff.last_name).where(id_in(Staff.id, [key for key in keys if key != UNASSIGNED]))
+            )
+            names.update({staff_id: f"{first} {last}" for staff_id, first, last in result.all()})
+    elif kind == "litres_by_area":
+        names.update(enumerate(context["zone_names"]))
+    return names
+
+
+def _cell(value: float):
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+class ReportRunner:
+    """
+    Runs queued ReportJobs off the request path. Source rows are streamed from
+    every shard in chunks of `chunk_size` and each chunk is aggregated in a
+    process pool, with at most two chunks per pool worker in flight so a slow
+    pool holds back the database cursors rather than buffering rows. The
+    merged aggregate is stored as a CSV ReportArtifact, so any node can serve
+    it. The job's lease is renewed every third of `lease_seconds` while it
+    is being built, so a long report is never picked up a second time.
+    """
+
+    def __init__(self, workers: int, chunk_size: int, lease_seconds: int):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        # Lease claimant; pids are only unique per node
+        self.worker_id = secrets.randbits(31)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._wake = asyncio.Event()
+
+    def wake(self):
+        """Start on a newly queued job now instead of at the next poll."""
+        self._wake.set()
+
+    async def aggregate(self, kind: str, start: datetime, end: datetime, context: Dict[str, Any]) -> Tuple[dict, int]:
+        if self._pool is None:
+            # Not fork: this process runs threads (thread pool, asyncpg) whose locks a forked child could inherit held
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("forkserver"))
+        loop = asyncio.get_running_loop()
+        totals: Dict[Any, List[float]] = {}
+        in_flight = set()
+        scanned = 0
+
+        def collect(done):
+            for future in done:
+                # Shards wait on the same futures; merge each exactly once
+                if future in in_flight:
+                    in_flight.remove(future)
+                    merge(totals, future.result())
+
+        async def stream(session) -> list:
+            nonlocal scanned
+            for query in source_queries(kind, start, end):
+                result = await session.stream(query.execution_options(yield_per=self.chunk_size))
+                async for rows in result.partitions():
+                    scanned += len(rows)
+                    while len(in_flight) >= 2 * self.workers:
+                        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(loop.run_in_executor(self._pool, aggregate_chunk, kind, list(zip(*rows)), context))
+            return []
+
+        await fan_out(stream)
+        if in_flight:
+            done, _ = await asyncio.wait(in_flight)
+            collect(done)
+        return totals, scanned
+
+    async def build(self, job: ReportJob) -> Tuple[str, str, int, int]:
+        """Aggregate `job`'s period into a CSV. Returns (file name, CSV, rows written, source rows scanned)."""
+        spec = REPORTS[job.kind]
+        start = datetime.combine(job.period_start, time.min)
+        end = datetime.combine(job.period_end, time.min)
+        context = await report_context(job.kind)
+        totals, scanned = await self.aggregate(job.kind, start, end, context)
+        names = await key_names(job.kind, list(totals), context)
+        with_names = job.kind in ("revenue_by_driver", "staff_productivity")
+        header = [spec.key] + (["name"] if with_names else []) + spec.measures
+        rows = []
+        # Largest last measure (revenue, litres, credit) first
+        for key, sums in sorted(totals.items(), key=lambda item: -item[1][-1]):
+            if with_names:
+                row = ["" if key == UNASSIGNED else key, names.get(key, "")]
+            else:
+                row = [names.get(key, key)]
+            rows.append(row + [_cell(value) for value in sums])
+        file_name = f"{job.id}-{job.kind}-{job.period_start}-{job.period_end}.csv"
+        # One row per driver, staff member, zone or type: small enough to render in memory
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return file_name, buffer.getvalue(), len(rows), scanned
+
+    async def _renew_lease(self, job_id: int):
+        """Keep extending the lease on `job_id` until cancelled, or until it turns out lost."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with async_session() as session:
+                    renewed = await renew_claim(session, ReportJob, job_id, self.worker_id, self.lease_seconds)
+            except Exception:
+                logger.exception("Renewing the lease on report %d failed", job_id)
+                continue
+            if not renewed:
+                logger.warning("Lost the lease on report %d", job_id)
+                return
+
+    async def run_next(self) -> bool:
+        """Claim and run one queued job. Returns False when there was none."""
+        worker_id = self.worker_id
+        async with async_session() as session:
+            claimed = await claim_rows(
+                session, ReportJob,
+                ready=[ReportJob.status.in_([ReportStatus.PENDING, ReportStatus.RUNNING])],
+                order_by=[ReportJob.id],
+                claimant_id=worker_id,
+                lease_seconds=self.lease_seconds,
+            )
+            if not claimed:
+                return False
+            job = await session.get(ReportJob, claimed[0])
+            job.status = ReportStatus.RUNNING
+            job.started_at = datetime.utcnow()
+            await session.commit()
+
+        values = {"claimed_by_id": None, "claim_expires_at": None}
+        content = None
+        renewal = asyncio.create_task(self._renew_lease(job.id))
+        try:
+            file_name, content, row_count, scanned = await self.build(job)
+            values.update(status=ReportStatus.DONE, file_name=file_name, row_count=row_count, rows_scanned=scanned)
+            logger.info("Report %d (%s) done: %d rows from %d scanned", job.id, job.kind, row_count, scanned)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Report %d (%s) failed", job.id, job.kind)
+            values.update(status=ReportStatus.FAILED, error=str(exc)[:500])
+        finally:
+            renewal.cancel()
+        values["finished_at"] = datetime.utcnow()
+        async with async_session() as session:
+            # Only if the lease was not lost to another worker in the meantime
+            result = await session.execute(
+                update(ReportJob).where(ReportJob.id == job.id, held_by(ReportJob, worker_id)).values(**values)
+            )
+            if result.rowcount and content is not None:
+                session.add(ReportArtifact(job_id=job.id, content=content))
+            await session.commit()
+        return True
+
+    async def run_forever(self, poll_seconds: int):
+        while True:
+            try:
+                while await self.run_next():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Report job poll failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+report_runner = ReportRunner(
+    workers=Config.REPORT_WORKERS,
+    chunk_size=Config.REPORT_CHUNK_SIZE,
+    lease_seconds=Config.REPORT_LEASE_SECONDS,
+)
+
+
+async def run_report_worker(poll_seconds: int = Config.REPORT_POLL_SECONDS):
+    """Background loop running queued report jobs one at a time."""
+    await report_runner.run_forever(poll_seconds)
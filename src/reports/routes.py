@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from db.main import get_session
+from db.models import ReportArtifact, ReportJob, ReportStatus, Staff, SuperAdmin
+from reports.jobs import report_runner
+from reports.schemas import ReportCreate, ReportJobRead
+from utils.helper_func import raise_http_exception, get_current_user, is_staff_or_superadmin
+
+reports_router = APIRouter()
+
+@reports_router.post("/api/admin/reports/", response_model=ReportJobRead, status_code=status.HTTP_202_ACCEPTED)
+async def request_report(report: ReportCreate, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    """Queue a report; poll the job until it is `done`, then download it."""
+    is_staff_or_superadmin(current_user)
+    job = ReportJob(
+        kind=report.kind,
+        period_start=report.period_start,
+        period_end=report.period_end,
+        requested_by_type="superadmin" if isinstance(current_user, SuperAdmin) else "staff",
+        requested_by_id=current_user.id,
+    )
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    report_runner.wake()
+    return job
+
+@reports_router.get("/api/admin/reports/", response_model=List[ReportJobRead])
+async def get_reports(limit: int = 50, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    is_staff_or_superadmin(current_user)
+    result = await session.execute(select(ReportJob).order_by(ReportJob.id.desc()).limit(min(max(limit, 1), 500)))
+    return result.scalars().all()
+
+@reports_router.get("/api/admin/reports/{job_id}/", response_model=ReportJobRead)
+async def get_report(job_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    is_staff_or_superadmin(current_user)
+    job = await session.get(ReportJob, job_id)
+    if not job:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Report not found")
+    return job
+
+@reports_router.get("/api/admin/reports/{job_id}/download/")
+async def download_report(job_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    is_staff_or_superadmin(current_user)
+    job = await session.get(ReportJob, job_id)
+    if not job:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Report not found")
+    if job.status != ReportStatus.DONE:
+        raise_http_exception(status.HTTP_409_CONFLICT, f"Report is {job.status.value}, not ready for download")
+    artifact = await session.get(ReportArtifact, job_id)
+    if not artifact:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Report file is not available")
+    return Response(
+        artifact.content,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{job.file_name}"'},
+    )
@@ -0,0 +1,38 @@
+from typing import Literal, Optional
+from datetime import date, datetime
+from pydantic import BaseModel, model_validator
+from config import Config
+from db.models import ReportStatus
+
+class BaseSchema(BaseModel):
+    class Config:
+        from_attributes = True
+
+ReportKind = Literal["revenue_by_driver", "litres_by_area", "recycling_credits_by_type", "staff_productivity"]
+
+class ReportCreate(BaseModel):
+    kind: ReportKind
+    # Days from period_start up to, not including, period_end (UTC)
+    period_start: date
+    period_end: date
+
+    @model_validator(mode="after")
+    def check_period(self):
+        if self.period_end <= self.period_start:
+            raise ValueError("period_end must be after period_start")
+        if (self.period_end - self.period_start).days > Config.REPORT_MAX_DAYS:
+            raise ValueError(f"A report covers at most {Config.REPORT_MAX_DAYS} days")
+        return self
+
+class ReportJobRead(BaseSchema):
+    id: int
+    kind: ReportKind
+    period_start: date
+    period_end: date
+    status: ReportStatus
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    rows_scanned: Optional[int]
+    row_count: Optional[int]
+    error: Optional[str]
@@ -0,0 +1,20 @@
+import uvicorn
+from config import Config
+from db.main import database_count, pool_settings
+
+if __name__ == "__main__":
+    pool = pool_settings()
+    print(
+        f"Starting {Config.WEB_CONCURRENCY} worker(s); each gets pool_size={pool['pool_size']} "
+        f"max_overflow={pool['max_overflow']} for each of {database_count()} database(s) "
+        f"(budget {Config.DB_CONNECTION_BUDGET} across {Config.DB_NODE_COUNT} node(s))"
+    )
+    uvicorn.run(
+        "main:app",
+        host=Config.SERVER_HOST,
+        port=Config.SERVER_PORT,
+        workers=Config.WEB_CONCURRENCY,
+        proxy_headers=True,
+        # RequestIdMiddleware logs each request with its id and duration instead
+        access_log=False,
+    )
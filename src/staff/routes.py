@@ -1,20 +1,47 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import EmailStr
 from sqlalchemy.orm import joinedload
-from typing import List
-from db.main import get_session
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Literal, Optional
+from datetime import datetime
+from db.main import (get_session, shard_session, fan_out, is_region, SHARD_REGIONS, id_in,
+                     get_order_shard_session, get_driver_shard_session, get_submission_shard_session,
+                     locate, locate_many, new_row_id)
 from jose import JWTError, jwt
 from config import Config
-from db.models import Staff, SuperAdmin, Order, Driver, OrderStatus, Customer
-from order.schemas import OrderRead, OrderUpdate
-from customer.schemas import CustomerRead
+from db.models import (Staff, SuperAdmin, Order, Driver, OrderStatus, Customer, RecyclableTariff,
+                       RecyclableSubmission, RecyclableStatus, DeliveryZone, DeliveryRate)
+from order.schemas import (OrderRead, OrderUpdate, OrderSearchHit, OrderEventRead, DeliveryZoneBase,
+                           DeliveryZoneRead, DeliveryRateBase, DeliveryRateRead, DemandForecastRead)
+from customer.schemas import CustomerRead, CustomerSearchHit
 from driver.schemas import DriverUpdate
 from driver.schemas import DriverRead, DriverCreate
+from recycle.schemas import (RecyclableTariffBase, RecyclableTariffRead, RecyclableSubmissionRead,
+                             RecyclableReviewComplete)
+from order.archive import get_order_or_archived, get_orders_or_archived
+from driver.roster import driver_roster
+from order.events import record_order_event, snapshot, diff, get_order_events
+from recycle.valuation import tariff_table, normalize_type, reprice_pending_submissions
+from recycle.credits import grant_credit
+from order.pricing import quote_engine, quote_pending_orders
+from order.forecast import demand_forecaster
 from utils.helper_func import (raise_http_exception, get_password_hash, verify_password, 
-                                   create_access_token, get_current_user, is_staff_or_superadmin)
+                                   create_access_token, get_current_user, is_staff_or_superadmin,
+                                   create_password_reset_token, create_driver_token, get_token_payload,
+                                   PASSWORD_RESET_PURPOSE)
+from utils.revocation import revoke_token, revoke_subject
+from utils.mailer import mail_queue, build_password_reset_email
+from staff.schemas import SearchResults, BatchGet, BatchRead
+from staff.search import search_customers, search_orders
+from utils.work_queue import claim_rows, held_by, held_by_other, release_claim
+from utils.encoding import list_response, rows_response, serialize_list, LIST_RESPONSES
+from utils.cache import admin_cache
+from utils.fieldsets import FieldSet, fieldset
+from utils.preconditions import if_match, check_version, versioned_update, etag
 
 staff_router = APIRouter()
 
@@ -40,6 +67,17 @@ async def login_staff(form_data: OAuth2PasswordRequestForm = Depends(), session:
     access_token = create_access_token(access_token_data)
     return {"access_token": access_token, "token_type": "bearer", "user_type": "staff"}
 
+@staff_router.post("/api/admin/logout/")
+async def logout_staff(
+    payload: dict = Depends(get_token_payload),
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Revoke the bearer token; other tokens of the staff member stay valid."""
+    is_staff_or_superadmin(current_user)
+    await revoke_token(session, payload)
+    return {"message": "Logged out"}
+
 @staff_router.post("/api/admin/password/reset/request/")
 async def request_staff_password_reset(email: EmailStr, session: AsyncSession = Depends(get_session)):
     result = await session.execute(select(Staff).where(Staff.email == email))
@@ -50,13 +88,13 @@ async def request_staff_password_reset(email: EmailStr, session: AsyncSession =
         db_superadmin = result.scalars().first()
         if not db_superadmin:
             raise_http_exception(status.HTTP_404_NOT_FOUND, "Email not found")
-        else:
-             # Send email with reset link
-             print(f"Super Admin Reset link sent to {email}")
-             return {"message": "Password reset link sent to your email"}
-    
-    # Send email with reset link
-    print(f"Staff Reset link sent to {email}")
+        token = create_password_reset_token(db_superadmin.id, "superadmin")
+    else:
+        token = create_password_reset_token(db_staff.id, "staff")
+
+    # Delivery happens on the mail worker; just hand the message over
+    if not mail_queue.enqueue(build_password_reset_email(email, token)):
+        raise_http_exception(status.HTTP_503_SERVICE_UNAVAILABLE, "Unable to send email right now, please retry")
     return {"message": "Password reset link sent to your email"}
 
 @staff_router.post("/api/admin/password/reset/confirm/")
@@ -67,7 +105,7 @@ async def confirm_staff_password_reset(new_password: str, confirm_new_password:
         payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
         user_id = payload.get("sub")
         user_type = payload.get("user_type")
-        if user_type not in ('staff', 'superadmin'):
+        if user_type not in ('staff', 'superadmin') or payload.get("purpose") != PASSWORD_RESET_PURPOSE:
             raise_http_exception(status.HTTP_400_BAD_REQUEST, "Invalid Token")
     except JWTError:
         raise_http_exception(status.HTTP_400_BAD_REQUEST, "Invalid token")
@@ -91,34 +129,69 @@ async def confirm_staff_password_reset(new_password: str, confirm_new_password:
 
     return {"message": "Password reset successfully"}
 
-@staff_router.get("/api/admin/orders/", response_model=List[OrderRead])
-async def get_orders(current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@staff_router.get("/api/admin/orders/", response_model=List[OrderRead], responses=LIST_RESPONSES)
+async def get_orders(
+    request: Request,
+    fields: FieldSet = Depends(fieldset(OrderRead)),
+    current_user: Staff = Depends(get_current_user),
+):
     is_staff_or_superadmin(current_user)
-    result = await session.execute(
-        select(Order).options(joinedload(Order.customer))
+
+    async def query(session):
+        result = await session.execute(select(Order).options(*fields.options(Order)))
+        return result.scalars().all()
+
+    orders = await fan_out(query)
+    return list_response(request, sorted(orders, key=lambda order: order.id), fields.model)
+
+def batch_result(fields: FieldSet, ids: List[int], found: dict):
+    """Found records in request order plus the missing ids, trimmed to `fields` like a single read."""
+    result = BatchRead[fields.model](
+        items=[fields.model.model_validate(found[record_id]) for record_id in ids if record_id in found],
+        missing=[record_id for record_id in ids if record_id not in found],
     )
-    orders = result.scalars().all()
-    return orders
+    if fields.fields is None:
+        return result
+    return JSONResponse(result.model_dump(mode="json"))
+
+@staff_router.post("/api/admin/orders/batch/", response_model=BatchRead[OrderRead])
+async def get_orders_batch(
+    batch: BatchGet,
+    fields: FieldSet = Depends(fieldset(OrderRead)),
+    current_user: Staff = Depends(get_current_user),
+):
+    """Up to BATCH_GET_MAX_IDS orders in one round trip: one `id = ANY(...)` query per shard involved."""
+    is_staff_or_superadmin(current_user)
+    ids = list(dict.fromkeys(batch.ids))
+    regions = set((await locate_many("orders", ids)).values())
+    # An empty region set would mean every shard to fan_out
+    orders = await fan_out(lambda session: get_orders_or_archived(session, ids, fields), regions) if regions else []
+    return batch_result(fields, ids, {order.id: order for order in orders})
 
 @staff_router.get("/api/admin/orders/{order_id}/", response_model=OrderRead)
-async def get_order(order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def get_order(
+    order_id: int,
+    fields: FieldSet = Depends(fieldset(OrderRead)),
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_order_shard_session),
+):
     is_staff_or_superadmin(current_user)
-    result = await session.execute(
-        select(Order)
-        .where(Order.id == order_id)
-        .options(joinedload(Order.customer))
-    )
-    order = result.scalars().first()
+    order = await get_order_or_archived(session, order_id, fields=fields)
     if not order:
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
-    return order
+    return fields.render(order)
+
+@staff_router.get("/api/admin/orders/{order_id}/events/", response_model=List[OrderEventRead])
+async def get_order_history(order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_order_shard_session)):
+    is_staff_or_superadmin(current_user)
+    return await get_order_events(session, order_id)
 
 @staff_router.patch("/api/admin/orders/{order_id}/assign-driver/", response_model=OrderRead)
 async def assign_driver_to_order(
     order_id: int,
     driver_id: int,
     current_user: Staff = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_order_shard_session),
 ):
     is_staff_or_superadmin(current_user)
     result = await session.execute(
@@ -127,20 +200,28 @@ async def assign_driver_to_order(
         .options(joinedload(Order.customer))
         .options(joinedload(Order.driver))
         .options(joinedload(Order.staff_assigned))
+        .with_for_update(of=Order)
     )
     db_order = result.scalars().first()
     if not db_order:
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
+    if held_by_other(db_order, current_user.id):
+        raise_http_exception(status.HTTP_409_CONFLICT, "Order is claimed by another staff member")
     
-    result = await session.execute(select(Driver).where(Driver.id == driver_id))
-    db_driver = result.scalars().first()
-    if not db_driver:
-        raise_http_exception(status.HTTP_400_BAD_REQUEST, "Driver not found")
+    # Drivers live on their region's shard, so this also keeps assignments in-region
+    db_driver = await driver_roster.get(driver_id)
+    if not db_driver or await locate("drivers", driver_id) != await locate("orders", order_id):
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "Driver not found in the order's region")
     
+    before = snapshot(db_order, ["driver_id", "staff_assigned_id"])
     db_order.driver_id = driver_id
     db_order.staff_assigned_id = current_user.id
+    # Paired: off the dispatch queue for good, not just until the lease runs out
+    db_order.claimed_by_id = None
+    db_order.claim_expires_at = None
     await session.commit()
     await session.refresh(db_order)
+    record_order_event(db_order.id, "driver_assigned", current_user, diff(before, db_order))
     return db_order
 
 @staff_router.patch("/api/admin/orders/{order_id}/set-charge/", response_model=OrderRead)
@@ -148,7 +229,7 @@ async def set_driver_charge(
     order_id: int,
     driver_charge: float,
     current_user: Staff = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_order_shard_session),
 ):
     is_staff_or_superadmin(current_user)
     result = await session.execute(
@@ -157,55 +238,56 @@ async def set_driver_charge(
         .options(joinedload(Order.customer))
         .options(joinedload(Order.driver))
         .options(joinedload(Order.staff_assigned))
+        .with_for_update(of=Order)
     )
     db_order = result.scalars().first()
     if not db_order:
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Order not found")
+    if held_by_other(db_order, current_user.id):
+        raise_http_exception(status.HTTP_409_CONFLICT, "Order is claimed by another staff member")
     if db_order.status != OrderStatus.PAIRING:
         raise_http_exception(
             status.HTTP_400_BAD_REQUEST, "Charge can only be set for orders in 'pairing' status"
         )
+    before = snapshot(db_order, ["driver_charge", "staff_assigned_id"])
     db_order.driver_charge = driver_charge
     db_order.staff_assigned_id = current_user.id
     await session.commit()
     await session.refresh(db_order)
+    record_order_event(db_order.id, "charge_set", current_user, diff(before, db_order))
     return db_order
 
 @staff_router.patch("/api/admin/orders/{order_id}/update/", response_model=OrderRead)
 async def update_order(
     order_id: int,
     order_update: OrderUpdate,
+    response: Response,
+    expected: Optional[List[int]] = Depends(if_match),
     current_user: Staff = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_order_shard_session),
 ):
+    """Send the order's `version` as If-Match to fail with 412 rather than overwrite someone else's change."""
     is_staff_or_superadmin(current_user)
-    result = await session.execute(
-        select(Order)
-        .where(Order.id == order_id)
-        .options(joinedload(Order.customer))
-        .options(joinedload(Order.driver))
-        .options(joinedload(Order.staff_assigned))
-    )
-    db_order = result.scalars().first()
-    if not db_order:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
-
     update_data = order_update.model_dump(exclude_unset=True)
 
-    if update_data:
-        await session.execute(
-            update(Order)
-            .where(Order.id == order_id)
-            .values(update_data)
+    if not update_data:
+        result = await session.execute(select(Order).where(Order.id == order_id).options(joinedload(Order.customer)))
+        db_order = result.scalars().first()
+        if not db_order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        check_version(db_order, expected)
+    else:
+        db_order, before = await versioned_update(
+            session, Order, order_id, update_data, expected, "Order not found", previous=list(update_data)
         )
         await session.commit()
-        await session.refresh(db_order)
-        return db_order
-    else:
-        return db_order
+        await session.refresh(db_order, ["customer"])
+        record_order_event(db_order.id, "updated", current_user, diff(before, db_order))
+    response.headers["ETag"] = etag(db_order.version)
+    return db_order
 
 @staff_router.patch("/api/admin/orders/{order_id}/dispatch/", response_model=OrderRead)
-async def dispatch_order(order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def dispatch_order(order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_order_shard_session)):
     is_staff_or_superadmin(current_user)
     result = await session.execute(
         select(Order)
@@ -221,14 +303,16 @@ async def dispatch_order(order_id: int, current_user: Staff = Depends(get_curren
         raise_http_exception(
             status.HTTP_400_BAD_REQUEST, "Order must be in 'pending_payment' status to be dispatched"
         )
+    before = snapshot(db_order, ["status"])
     db_order.status = OrderStatus.EN_ROUTE
     await session.commit()
     await session.refresh(db_order)
+    record_order_event(db_order.id, "dispatched", current_user, diff(before, db_order))
     return db_order
 
 @staff_router.patch("/api/admin/orders/{order_id}/delivered/", response_model=OrderRead)
 async def mark_order_as_delivered(
-    order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)
+    order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_order_shard_session)
 ):
     is_staff_or_superadmin(current_user)
     result = await session.execute(
@@ -245,81 +329,475 @@ async def mark_order_as_delivered(
         raise_http_exception(
             status.HTTP_400_BAD_REQUEST, "Order must be 'en-route' to be marked as delivered"
         )
+    before = snapshot(db_order, ["status"])
     db_order.status = OrderStatus.DELIVERED
     await session.commit()
     await session.refresh(db_order)
+    record_order_event(db_order.id, "delivered", current_user, diff(before, db_order))
     return db_order
 
-@staff_router.get("/api/admin/customers/", response_model=List[CustomerRead])
-async def get_customers(current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@staff_router.get("/api/admin/customers/", response_model=List[CustomerRead], responses=LIST_RESPONSES)
+async def get_customers(
+    request: Request,
+    fields: FieldSet = Depends(fieldset(CustomerRead)),
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
     is_staff_or_superadmin(current_user)
-    result = await session.execute(select(Customer))
-    customers = result.scalars().all()
-    return customers
+
+    async def load():
+        result = await session.execute(select(Customer).options(*fields.options(Customer)))
+        return serialize_list(result.scalars().all(), fields.model)
+
+    rows = await admin_cache.get_or_load(session, Customer.__tablename__, fields.fields, load)
+    return rows_response(request, rows)
+
+@staff_router.post("/api/admin/customers/batch/", response_model=BatchRead[CustomerRead])
+async def get_customers_batch(
+    batch: BatchGet,
+    fields: FieldSet = Depends(fieldset(CustomerRead)),
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    is_staff_or_superadmin(current_user)
+    ids = list(dict.fromkeys(batch.ids))
+    result = await session.execute(select(Customer).where(id_in(Customer.id, ids)).options(*fields.options(Customer)))
+    return batch_result(fields, ids, {customer.id: customer for customer in result.scalars().all()})
 
 @staff_router.get("/api/admin/customers/{customer_id}/", response_model=CustomerRead)
-async def get_customer(customer_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def get_customer(
+    customer_id: int,
+    fields: FieldSet = Depends(fieldset(CustomerRead)),
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
     is_staff_or_superadmin(current_user)
-    result = await session.execute(select(Customer).where(Customer.id == customer_id))
+    result = await session.execute(select(Customer).where(Customer.id == customer_id).options(*fields.options(Customer)))
     customer = result.scalars().first()
     if not customer:
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Customer not found")
-    return customer
+    return fields.render(customer)
+
+@staff_router.post("/api/admin/customers/{customer_id}/revoke-tokens/")
+async def revoke_customer_tokens(customer_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    """Sign the customer out everywhere: every token issued to them so far stops working."""
+    is_staff_or_superadmin(current_user)
+    result = await session.execute(select(Customer.id).where(Customer.id == customer_id))
+    if result.scalar() is None:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Customer not found")
+    await revoke_subject(session, "customer", customer_id)
+    return {"message": "Customer tokens revoked"}
+
+@staff_router.get("/api/admin/search/", response_model=SearchResults)
+async def search(
+    q: str,
+    scope: Literal["all", "customers", "orders"] = "all",
+    limit: int = 20,
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Prefix and fuzzy (trigram) search over customer name/email and order
+    destination address. Prefix matches rank first, then by similarity.
+    """
+    is_staff_or_superadmin(current_user)
+    if len(q.strip()) < Config.SEARCH_MIN_QUERY_LENGTH:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, f"q must be at least {Config.SEARCH_MIN_QUERY_LENGTH} characters")
+    if not 1 <= limit <= Config.SEARCH_MAX_LIMIT:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, f"limit must be between 1 and {Config.SEARCH_MAX_LIMIT}")
+    results = SearchResults()
+    if scope in ("all", "customers"):
+        results.customers = [
+            CustomerSearchHit(**CustomerRead.model_validate(customer).model_dump(), score=score)
+            for customer, score in await search_customers(session, q, limit)
+        ]
+    if scope in ("all", "orders"):
+        hits = await fan_out(lambda shard: search_orders(shard, q, limit))
+        hits.sort(key=lambda row: (-row.score, -row.id))
+        results.orders = [OrderSearchHit.model_validate(row._mapping) for row in hits[:limit]]
+    return results
 
 @staff_router.post("/api/admin/drivers/", response_model=DriverRead, status_code=status.HTTP_201_CREATED)
-async def create_driver(driver: DriverCreate, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def create_driver(driver: DriverCreate, current_user: Staff = Depends(get_current_user)):
     is_staff_or_superadmin(current_user)
+    region = driver.region or Config.DEFAULT_REGION
+    if not is_region(region):
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "Unknown service region")
     db_driver = Driver(
+        id=await new_row_id("drivers", region),
         first_name=driver.first_name,
         last_name=driver.last_name,
         phone_number=driver.phone_number,
         vehicle_details=driver.vehicle_details,
-        is_active=driver.is_active
+        vehicle_type=driver.vehicle_type,
+        is_active=driver.is_active,
+        region=region,
     )
-    session.add(db_driver)
-    await session.commit()
-    await session.refresh(db_driver)
+    async with shard_session(region) as session:
+        session.add(db_driver)
+        await session.commit()
+        await session.refresh(db_driver)
+    driver_roster.put(db_driver)
     return db_driver
 
-@staff_router.get("/api/admin/drivers/", response_model=List[DriverRead])
-async def get_drivers(current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+@staff_router.get("/api/admin/drivers/", response_model=List[DriverRead], responses=LIST_RESPONSES)
+async def get_drivers(
+    request: Request,
+    active: Optional[bool] = None,
+    vehicle_type: Optional[str] = None,
+    fields: FieldSet = Depends(fieldset(DriverRead)),
+    current_user: Staff = Depends(get_current_user),
+):
+    """Served from the in-memory roster (see driver/roster.py), so `fields` only trims the response."""
+    is_staff_or_superadmin(current_user)
+    drivers = await driver_roster.list(active=active, vehicle_type=vehicle_type)
+    return list_response(request, drivers, fields.model)
+
+@staff_router.post("/api/admin/drivers/batch/", response_model=BatchRead[DriverRead])
+async def get_drivers_batch(
+    batch: BatchGet,
+    fields: FieldSet = Depends(fieldset(DriverRead)),
+    current_user: Staff = Depends(get_current_user),
+):
+    """Served from the in-memory roster, with at most one refresh for ids it has not seen."""
     is_staff_or_superadmin(current_user)
-    result = await session.execute(select(Driver))
-    drivers = result.scalars().all()
-    return drivers
+    ids = list(dict.fromkeys(batch.ids))
+    return batch_result(fields, ids, await driver_roster.get_many(ids))
 
 @staff_router.get("/api/admin/drivers/{driver_id}/", response_model=DriverRead)
-async def get_driver(driver_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+async def get_driver(
+    driver_id: int,
+    fields: FieldSet = Depends(fieldset(DriverRead)),
+    current_user: Staff = Depends(get_current_user),
+):
     is_staff_or_superadmin(current_user)
-    result = await session.execute(select(Driver).where(Driver.id == driver_id))
-    driver = result.scalars().first()
+    driver = await driver_roster.get(driver_id)
     if not driver:
         raise_http_exception(status.HTTP_404_NOT_FOUND, "Driver not found")
-    return driver
+    return fields.render(driver)
+
+@staff_router.post("/api/admin/drivers/{driver_id}/token/")
+async def issue_driver_token(driver_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_driver_shard_session)):
+    """Token for the driver app, used to report GPS pings."""
+    is_staff_or_superadmin(current_user)
+    result = await session.execute(select(Driver.id).where(Driver.id == driver_id, Driver.is_active.is_(True)))
+    if result.scalar() is None:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Active driver not found")
+    return {"access_token": create_driver_token(driver_id), "token_type": "bearer", "user_type": "driver"}
+
+@staff_router.post("/api/admin/drivers/{driver_id}/revoke-tokens/")
+async def revoke_driver_tokens(driver_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    """Every driver app token issued so far stops working, e.g. for a lost phone."""
+    is_staff_or_superadmin(current_user)
+    if await driver_roster.get(driver_id) is None:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "Driver not found")
+    await revoke_subject(session, "driver", driver_id)
+    return {"message": "Driver tokens revoked"}
 
 @staff_router.patch("/api/admin/drivers/{driver_id}/update/", response_model=DriverRead)
 async def update_driver(
     driver_id: int,
     driver_update: DriverUpdate,
+    response: Response,
+    expected: Optional[List[int]] = Depends(if_match),
     current_user: Staff = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_driver_shard_session),
 ):
+    """Send the driver's `version` as If-Match to fail with 412 rather than overwrite someone else's change."""
     is_staff_or_superadmin(current_user)
-    result = await session.execute(select(Driver).where(Driver.id == driver_id))
-    db_driver = result.scalars().first()
-    if not db_driver:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver not found")
-
     update_data = driver_update.model_dump(exclude_unset=True)
 
-    if update_data:
-        await session.execute(
-            update(Driver)
-            .where(Driver.id == driver_id)
-            .values(update_data)
-        )
-        await session.commit()
-        await session.refresh(db_driver)
-        return db_driver
+    if not update_data:
+        db_driver = await driver_roster.get(driver_id)
+        if not db_driver:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Driver not found")
+        check_version(db_driver, expected)
     else:
-        return db_driver
+        db_driver, _ = await versioned_update(session, Driver, driver_id, update_data, expected, "Driver not found")
+        await session.commit()
+        driver_roster.put(db_driver)
+    response.headers["ETag"] = etag(db_driver.version)
+    return db_driver
+
+@staff_router.get("/api/admin/recyclables/tariffs/", response_model=List[RecyclableTariffRead])
+async def get_recyclable_tariffs(current_user: Staff = Depends(get_current_user)):
+    is_staff_or_superadmin(current_user)
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        result = await session.execute(select(RecyclableTariff).order_by(RecyclableTariff.recyclable_type))
+        return result.scalars().all()
+
+@staff_router.put("/api/admin/recyclables/tariffs/")
+async def set_recyclable_tariffs(
+    tariffs: List[RecyclableTariffBase],
+    current_user: Staff = Depends(get_current_user),
+):
+    """
+    Upsert tariffs, then re-price every pending submission against the new
+    table in a single statement. Each shard keeps its own copy of the table
+    so the re-pricing join stays local.
+    """
+    is_staff_or_superadmin(current_user)
+    if not tariffs:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "No tariffs given")
+    rows = {
+        normalize_type(tariff.recyclable_type): {
+            "recyclable_type": normalize_type(tariff.recyclable_type),
+            "unit_value": tariff.unit_value,
+            "pickup_fee": tariff.pickup_fee,
+            "updated_at": datetime.utcnow(),
+        }
+        for tariff in tariffs
+    }
+    stmt = insert(RecyclableTariff).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RecyclableTariff.recyclable_type],
+        set_={
+            "unit_value": stmt.excluded.unit_value,
+            "pickup_fee": stmt.excluded.pickup_fee,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+    async def upsert_and_reprice(session):
+        await session.execute(stmt)
+        repriced = await reprice_pending_submissions(session)
+        await session.commit()
+        return [repriced]
+
+    repriced = await fan_out(upsert_and_reprice)
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        await tariff_table.reload(session, force=True)
+    return {"tariffs": len(rows), "repriced_submissions": sum(repriced)}
+
+@staff_router.get("/api/admin/pricing/zones/", response_model=List[DeliveryZoneRead])
+async def get_delivery_zones(current_user: Staff = Depends(get_current_user)):
+    is_staff_or_superadmin(current_user)
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        result = await session.execute(select(DeliveryZone).order_by(DeliveryZone.name))
+        return result.scalars().all()
+
+@staff_router.get("/api/admin/pricing/rates/", response_model=List[DeliveryRateRead])
+async def get_delivery_rates(current_user: Staff = Depends(get_current_user)):
+    is_staff_or_superadmin(current_user)
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        result = await session.execute(select(DeliveryRate).order_by(DeliveryRate.min_litres))
+        return result.scalars().all()
+
+async def apply_pricing_change(stmt) -> int:
+    """Upsert pricing rows on every shard, reload the quote engine, then quote orders still waiting on a charge."""
+    async def upsert(session):
+        await session.execute(stmt)
+        await session.commit()
+        return []
+
+    async def quote(session):
+        return [await quote_pending_orders(session)]
+
+    await fan_out(upsert)
+    async with shard_session(SHARD_REGIONS[0]) as session:
+        await quote_engine.reload(session, force=True)
+    return sum(await fan_out(quote))
+
+@staff_router.put("/api/admin/pricing/zones/")
+async def set_delivery_zones(
+    zones: List[DeliveryZoneBase],
+    current_user: Staff = Depends(get_current_user),
+):
+    is_staff_or_superadmin(current_user)
+    if not zones:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "No zones given")
+    rows = {
+        zone.name.strip(): {**zone.model_dump(), "name": zone.name.strip(), "updated_at": datetime.utcnow()}
+        for zone in zones
+    }
+    stmt = insert(DeliveryZone).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DeliveryZone.name],
+        set_={
+            "lat": stmt.excluded.lat,
+            "lon": stmt.excluded.lon,
+            "is_depot": stmt.excluded.is_depot,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    quoted = await apply_pricing_change(stmt)
+    return {"zones": len(rows), "quoted_orders": quoted}
+
+@staff_router.put("/api/admin/pricing/rates/")
+async def set_delivery_rates(
+    rates: List[DeliveryRateBase],
+    current_user: Staff = Depends(get_current_user),
+):
+    is_staff_or_superadmin(current_user)
+    if not rates:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, "No rates given")
+    rows = {rate.min_litres: {**rate.model_dump(), "updated_at": datetime.utcnow()} for rate in rates}
+    stmt = insert(DeliveryRate).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DeliveryRate.min_litres],
+        set_={
+            "base_fee": stmt.excluded.base_fee,
+            "per_litre": stmt.excluded.per_litre,
+            "per_km": stmt.excluded.per_km,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    quoted = await apply_pricing_change(stmt)
+    return {"rates": len(rows), "quoted_orders": quoted}
+
+@staff_router.get("/api/admin/forecast/", response_model=DemandForecastRead)
+async def get_demand_forecast(refresh: bool = False, current_user: Staff = Depends(get_current_user)):
+    """
+    Expected orders and litres per delivery zone for each hour of the next
+    local day, as last built by the background worker. `refresh` asks for a
+    rebuild; the response is still the stored forecast.
+    """
+    is_staff_or_superadmin(current_user)
+    if refresh:
+        demand_forecaster.request_refresh()
+    forecast = await demand_forecaster.get()
+    if forecast is None:
+        raise_http_exception(status.HTTP_503_SERVICE_UNAVAILABLE, "The demand forecast is still being built")
+    return forecast
+
+def is_staff_member(current_user):
+    if not isinstance(current_user, Staff):
+        raise_http_exception(status.HTTP_403_FORBIDDEN, "Only staff members can claim work")
+    return current_user
+
+def shards_from(staff_id: int):
+    """Every shard once, starting at a different one per staff member so claimers spread out."""
+    start = staff_id % len(SHARD_REGIONS)
+    return SHARD_REGIONS[start:] + SHARD_REGIONS[:start]
+
+async def claim_recyclable_submissions(staff_id: int, limit: int):
+    submissions = []
+    for region in shards_from(staff_id):
+        async with shard_session(region) as session:
+            claimed_ids = await claim_rows(
+                session,
+                RecyclableSubmission,
+                ready=[RecyclableSubmission.status == RecyclableStatus.PENDING_REVIEW],
+                order_by=[RecyclableSubmission.submission_date, RecyclableSubmission.id],
+                claimant_id=staff_id,
+                lease_seconds=Config.REVIEW_LEASE_SECONDS,
+                limit=limit - len(submissions),
+            )
+            if not claimed_ids:
+                continue
+            result = await session.execute(
+                select(RecyclableSubmission)
+                .where(RecyclableSubmission.id.in_(claimed_ids))
+                .options(joinedload(RecyclableSubmission.customer))
+                .order_by(RecyclableSubmission.submission_date, RecyclableSubmission.id)
+            )
+            submissions.extend(result.scalars().all())
+        if len(submissions) >= limit:
+            break
+    return submissions
+
+@staff_router.post("/api/admin/recyclables/claim/", response_model=RecyclableSubmissionRead)
+async def claim_next_recyclable_submission(current_user: Staff = Depends(get_current_user)):
+    is_staff_member(current_user)
+    submissions = await claim_recyclable_submissions(current_user.id, 1)
+    if not submissions:
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "No submissions awaiting review")
+    return submissions[0]
+
+@staff_router.post("/api/admin/recyclables/claim-batch/", response_model=List[RecyclableSubmissionRead])
+async def claim_recyclable_submission_batch(
+    limit: int = 10,
+    current_user: Staff = Depends(get_current_user),
+):
+    is_staff_member(current_user)
+    if not 1 <= limit <= Config.CLAIM_BATCH_MAX:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, f"limit must be between 1 and {Config.CLAIM_BATCH_MAX}")
+    return await claim_recyclable_submissions(current_user.id, limit)
+
+@staff_router.patch("/api/admin/recyclables/{submission_id}/complete/", response_model=RecyclableSubmissionRead)
+async def complete_recyclable_review(
+    submission_id: int,
+    review: RecyclableReviewComplete,
+    current_user: Staff = Depends(get_current_user),
+    session: AsyncSession = Depends(get_submission_shard_session),
+):
+    is_staff_member(current_user)
+    values = review.model_dump(exclude_unset=True)
+    values.update(claimed_by_id=None, claim_expires_at=None)
+    customer_id = await session.scalar(
+        update(RecyclableSubmission)
+        .where(
+            RecyclableSubmission.id == submission_id,
+            RecyclableSubmission.status == RecyclableStatus.PENDING_REVIEW,
+            held_by(RecyclableSubmission, current_user.id),
+        )
+        .values(values)
+        .returning(RecyclableSubmission.customer_id)
+        .execution_options(synchronize_session=False)
+    )
+    if customer_id is None:
+        await session.rollback()
+        raise_http_exception(status.HTTP_409_CONFLICT, "You do not hold a live claim on this submission")
+    if review.status == RecyclableStatus.CREDITED:
+        # Same transaction as the review, so a credited submission always has its ledger entry
+        await grant_credit(session, customer_id, review.credited_amount, submission_id)
+    await session.commit()
+    result = await session.execute(
+        select(RecyclableSubmission)
+        .where(RecyclableSubmission.id == submission_id)
+        .options(joinedload(RecyclableSubmission.customer))
+    )
+    return result.scalars().first()
+
+@staff_router.post("/api/admin/recyclables/{submission_id}/release/")
+async def release_recyclable_claim(submission_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_submission_shard_session)):
+    is_staff_member(current_user)
+    if not await release_claim(session, RecyclableSubmission, submission_id, current_user.id):
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "No claim to release")
+    return {"message": "Claim released"}
+
+@staff_router.post("/api/admin/orders/claim/", response_model=List[OrderRead])
+async def claim_pairing_orders(
+    limit: int = 10,
+    current_user: Staff = Depends(get_current_user),
+):
+    """
+    Lease a batch of orders in 'pairing' status that still have no driver to
+    the calling staff member. Concurrent callers get disjoint batches; while
+    the lease is live, nobody else can assign a driver to or set the charge
+    on those orders. Assigning the driver completes the work and ends the lease.
+    """
+    is_staff_member(current_user)
+    if not 1 <= limit <= Config.CLAIM_BATCH_MAX:
+        raise_http_exception(status.HTTP_400_BAD_REQUEST, f"limit must be between 1 and {Config.CLAIM_BATCH_MAX}")
+    orders = []
+    for region in shards_from(current_user.id):
+        async with shard_session(region) as session:
+            claimed_ids = await claim_rows(
+                session,
+                Order,
+                ready=[Order.status == OrderStatus.PAIRING, Order.driver_id.is_(None)],
+                order_by=[Order.created_at, Order.id],
+                claimant_id=current_user.id,
+                lease_seconds=Config.DISPATCH_LEASE_SECONDS,
+                limit=limit - len(orders),
+            )
+            if not claimed_ids:
+                continue
+            result = await session.execute(
+                select(Order)
+                .where(Order.id.in_(claimed_ids))
+                .options(joinedload(Order.customer))
+                .order_by(Order.created_at, Order.id)
+            )
+            orders.extend(result.scalars().all())
+        if len(orders) >= limit:
+            break
+    return orders
+
+@staff_router.post("/api/admin/orders/{order_id}/release/")
+async def release_order_claim(order_id: int, current_user: Staff = Depends(get_current_user), session: AsyncSession = Depends(get_order_shard_session)):
+    is_staff_member(current_user)
+    if not await release_claim(session, Order, order_id, current_user.id):
+        raise_http_exception(status.HTTP_404_NOT_FOUND, "No claim to release")
+    return {"message": "Claim released"}
@@ -1,6 +1,9 @@
-from typing import Optional
+from typing import Generic, List, Optional, TypeVar
 from datetime import datetime
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
+from config import Config
+from customer.schemas import CustomerSearchHit
+from order.schemas import OrderSearchHit
 
 class BaseSchema(BaseModel):
     class Config:
@@ -17,4 +20,19 @@ class StaffCreate(StaffBase):
 class StaffRead(StaffBase):
     id: int
     created_at: datetime
-    created_by_id: Optional[int]
\ No newline at end of file
+    created_by_id: Optional[int]
+    version: int
+
+class SearchResults(BaseModel):
+    customers: List[CustomerSearchHit] = []
+    orders: List[OrderSearchHit] = []
+
+class BatchGet(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=Config.BATCH_GET_MAX_IDS)
+
+T = TypeVar("T")
+
+class BatchRead(BaseModel, Generic[T]):
+    # Found records in the order their ids were asked for, then the ids that matched nothing
+    items: List[T]
+    missing: List[int]
@@ -0,0 +1,62 @@
+from sqlalchemy import select, func, case, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.models import Customer, Order
+
+# These must match the indexed expressions in db/models.py exactly, or the
+# planner will not use the trigram/prefix indexes.
+customer_full_name = func.lower(Customer.first_name + literal_column("' '") + Customer.last_name)
+customer_email = func.lower(Customer.email)
+order_address = func.lower(Order.destination_address)
+
+PREFIX_BONUS = 1.0
+
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
+
+
+def _prefix_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def _match(expr, term: str):
+    """Prefix match or trigram similarity above pg_trgm.similarity_threshold, plus a rank."""
+    prefix = expr.like(_prefix_pattern(term), escape="\\")
+    condition = or_(prefix, expr.op("%")(term))
+    score = case((prefix, PREFIX_BONUS), else_=0.0) + func.similarity(expr, term)
+    return condition, score
+
+
+async def search_customers(session: AsyncSession, q: str, limit: int):
+    term = normalize_query(q)
+    name_match, name_score = _match(customer_full_name, term)
+    email_match, email_score = _match(customer_email, term)
+    score = func.greatest(name_score, email_score).label("score")
+    result = await session.execute(
+        select(Customer, score)
+        .where(or_(name_match, email_match))
+        .order_by(score.desc(), Customer.id)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def search_orders(session: AsyncSession, q: str, limit: int):
+    term = normalize_query(q)
+    address_match, address_score = _match(order_address, term)
+    score = address_score.label("score")
+    result = await session.execute(
+        select(
+            Order.id,
+            Order.customer_id,
+            Order.destination_address,
+            Order.status,
+            Order.created_at,
+            score,
+        )
+        .where(address_match)
+        .order_by(score.desc(), Order.id.desc())
+        .limit(limit)
+    )
+    return result.all()
@@ -0,0 +1,111 @@
+import json
+import os
+import pytest
+from sqlalchemy.engine import make_url
+
+# Settings the app refuses to start without; a real .env or environment wins.
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://localhost/wta_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("ADMIN_EMAIL", "admin@wta.test")
+os.environ.setdefault("ADMIN_PASSWORD", "admin")
+
+# Tests that need Postgres run against TEST_DATABASE_URL, as a directory plus
+# two region shards next to it (<name>_north, <name>_south). All three are
+# dropped and recreated, so never point this at a database you care about.
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SHARD_NAMES = ("north", "south")
+
+
+def database_url(suffix: str = "") -> str:
+    url = make_url(TEST_DATABASE_URL)
+    return url.set(database=f"{url.database}{suffix}").render_as_string(hide_password=False)
+
+
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = database_url()
+    os.environ["SHARD_DATABASE_URLS"] = json.dumps({name: database_url(f"_{name}") for name in SHARD_NAMES})
+    os.environ["DEFAULT_REGION"] = SHARD_NAMES[0]
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+async def _recreate_databases():
+    import asyncpg
+    url = make_url(TEST_DATABASE_URL)
+    server = url.set(drivername="postgresql", database="postgres").render_as_string(hide_password=False)
+    conn = await asyncpg.connect(server)
+    try:
+        for name in [url.database] + [f"{url.database}_{shard}" for shard in SHARD_NAMES]:
+            await conn.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+            await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its lifespan running, on fresh sharded databases. Skips without TEST_DATABASE_URL."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import asyncio
+    from fastapi.testclient import TestClient
+    asyncio.run(_recreate_databases())
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def superadmin_headers(client):
+    from db.main import async_session
+    from db.models import SuperAdmin
+    from utils.helper_func import create_access_token
+
+    async def create():
+        async with async_session() as session:
+            superadmin = SuperAdmin(email="root@example.com", hashed_password="-")
+            session.add(superadmin)
+            await session.commit()
+            return superadmin.id
+
+    superadmin_id = client.portal.call(create)
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(superadmin_id), 'user_type': 'superadmin'})}"}
+
+
+@pytest.fixture
+def register_customer(client):
+    """Register a customer in `region` and return (customer id, auth headers)."""
+    from uuid import uuid4
+    from utils.helper_func import create_access_token
+
+    def register(region: str):
+        response = client.post("/api/customers/register/", json={
+            "first_name": "Test", "last_name": region, "email": f"{uuid4().hex}@example.com",
+            "password": "secret123", "region": region,
+        })
+        assert response.status_code == 201, response.text
+        customer_id = response.json()["id"]
+        token = create_access_token({"sub": str(customer_id), "user_type": "customer"})
+        return customer_id, {"Authorization": f"Bearer {token}"}
+    return register
+
+
+@pytest.fixture
+def create_staff(client, superadmin_headers):
+    """Create a staff member and return (staff id, auth headers)."""
+    from uuid import uuid4
+    from utils.helper_func import create_access_token
+
+    def create():
+        response = client.post("/api/superadmin/staff/", headers=superadmin_headers, json={
+            "first_name": "Test", "last_name": "Staff", "email": f"{uuid4().hex}@example.com", "password": "secret123",
+        })
+        assert response.status_code == 201, response.text
+        staff_id = response.json()["id"]
+        token = create_access_token({"sub": str(staff_id), "user_type": "staff"})
+        return staff_id, {"Authorization": f"Bearer {token}"}
+    return create
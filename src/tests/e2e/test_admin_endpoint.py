@@ -0,0 +1,141 @@
+from uuid import uuid4
+import pytest
+from utils.helper_func import create_access_token
+from config import Config
+
+
+def test_staff_update_with_a_matching_if_match_returns_the_new_etag(client, superadmin_headers, create_staff):
+    staff_id, _ = create_staff()
+    url = f"/api/superadmin/staff/{staff_id}/update/"
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"first_name": "Ada"})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["first_name"] == "Ada"
+
+
+def test_staff_update_with_a_stale_if_match_fails(client, superadmin_headers, create_staff):
+    staff_id, _ = create_staff()
+    url = f"/api/superadmin/staff/{staff_id}/update/"
+    client.patch(url, headers=superadmin_headers, json={"first_name": "Ada"})
+
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"first_name": "Grace"})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == '"2"'
+    assert client.get(f"/api/superadmin/staff/{staff_id}/", headers=superadmin_headers).json()["first_name"] == "Ada"
+
+
+def test_empty_staff_update_only_checks_the_version(client, superadmin_headers, create_staff):
+    staff_id, _ = create_staff()
+    url = f"/api/superadmin/staff/{staff_id}/update/"
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"1"'
+
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": 'W/"1"'}, json={})
+    assert response.status_code == 412
+
+
+def test_update_of_a_missing_staff_member_is_not_found(client, superadmin_headers):
+    response = client.patch("/api/superadmin/staff/999999/update/", headers={**superadmin_headers, "If-Match": '"1"'},
+                            json={"first_name": "Ada"})
+    assert response.status_code == 404
+
+
+def test_driver_update_honours_if_match(client, superadmin_headers):
+    response = client.post("/api/admin/drivers/", headers=superadmin_headers, json={
+        "first_name": "Test", "last_name": "Driver", "phone_number": "0800", "vehicle_details": "Tanker",
+        "is_active": True, "region": "south",
+    })
+    driver_id = response.json()["id"]
+    url = f"/api/admin/drivers/{driver_id}/update/"
+
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"phone_number": "0801"})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == '"2"'
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"phone_number": "0802"})
+    assert response.status_code == 412
+    assert client.get(f"/api/admin/drivers/{driver_id}/", headers=superadmin_headers).json()["phone_number"] == "0801"
+
+
+def test_customer_batch_get(client, superadmin_headers, register_customer):
+    customer_ids = [register_customer(region)[0] for region in ("south", "north")]
+    response = client.post("/api/admin/customers/batch/?fields=id,region", headers=superadmin_headers,
+                           json={"ids": customer_ids + [10 ** 9] + customer_ids[:1]})
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        "items": [{"id": customer_ids[0], "region": "south"}, {"id": customer_ids[1], "region": "north"}],
+        "missing": [10 ** 9],
+    }
+
+
+def test_driver_batch_get_spans_shards(client, superadmin_headers):
+    driver_ids = []
+    for region in ("north", "south"):
+        response = client.post("/api/admin/drivers/", headers=superadmin_headers, json={
+            "first_name": "Test", "last_name": region, "phone_number": "0800", "vehicle_details": "Tanker",
+            "is_active": True, "region": region,
+        })
+        driver_ids.append(response.json()["id"])
+
+    response = client.post("/api/admin/drivers/batch/", headers=superadmin_headers,
+                           json={"ids": [10 ** 9] + driver_ids[::-1]})
+    assert response.status_code == 200, response.text
+    assert [(driver["id"], driver["region"]) for driver in response.json()["items"]] == \
+        [(driver_ids[1], "south"), (driver_ids[0], "north")]
+    assert response.json()["missing"] == [10 ** 9]
+
+    response = client.post("/api/admin/drivers/batch/", headers=superadmin_headers,
+                           json={"ids": list(range(1, Config.BATCH_GET_MAX_IDS + 2))})
+    assert response.status_code == 422
+
+
+def register(client, first_name, last_name, region="north"):
+    response = client.post("/api/customers/register/", json={
+        "first_name": first_name, "last_name": last_name, "email": f"{uuid4().hex}@example.com",
+        "password": "secret123", "region": region,
+    })
+    assert response.status_code == 201, response.text
+    customer_id = response.json()["id"]
+    return customer_id, {"Authorization": f"Bearer {create_access_token({'sub': str(customer_id), 'user_type': 'customer'})}"}
+
+
+def search(client, headers, **params):
+    return client.get("/api/admin/search/", headers=headers, params=params)
+
+
+@pytest.mark.parametrize("params", [{"q": "q"}, {"q": "  q  "}, {"q": "quillon", "limit": 0},
+                                    {"q": "quillon", "limit": Config.SEARCH_MAX_LIMIT + 1}])
+def test_search_rejects_short_queries_and_out_of_range_limits(client, superadmin_headers, params):
+    assert search(client, superadmin_headers, **params).status_code == 400
+
+
+def test_search_ranks_prefix_matches_before_fuzzy_ones(client, superadmin_headers):
+    prefix, _ = register(client, "Quillon", "Brastow")
+    word, _ = register(client, "Brastow", "Quillon")
+    typo, _ = register(client, "Quillom", "Brastow", region="south")
+    register(client, "Unrelated", "Person")
+
+    response = search(client, superadmin_headers, q="  QUILLON ", scope="customers")
+    assert response.status_code == 200, response.text
+    hits = response.json()["customers"]
+    assert [hit["id"] for hit in hits] == [prefix, word, typo]
+    assert hits[0]["score"] > 1 > hits[1]["score"] > hits[2]["score"]
+    assert response.json()["orders"] == []
+
+    response = search(client, superadmin_headers, q="quillon", scope="customers", limit=2)
+    assert [hit["id"] for hit in response.json()["customers"]] == [prefix, word]
+
+
+def test_order_search_merges_shards_by_rank(client, superadmin_headers):
+    _, north = register(client, "Order", "North")
+    _, south = register(client, "Order", "South", region="south")
+    ids = {}
+    for name, headers, address in [("fuzzy", north, "12 Old Varnwick Lane"), ("prefix", south, "Varnwick Lane 4")]:
+        response = client.post("/api/customers/orders/", headers=headers,
+                               json={"destination_address": address, "water_amount": 1000})
+        ids[name] = response.json()["id"]
+
+    response = search(client, superadmin_headers, q="varnwick lane", scope="orders")
+    assert response.status_code == 200, response.text
+    assert [hit["id"] for hit in response.json()["orders"]] == [ids["prefix"], ids["fuzzy"]]
+    assert response.json()["customers"] == []
@@ -0,0 +1,123 @@
+import asyncio
+from decimal import Decimal
+import httpx
+import pytest
+from sqlalchemy import select, update
+from db.main import shard_session
+from db.models import CreditLedgerEntry, Order, RecyclableStatus, RecyclableSubmission
+from recycle.credits import get_balance, grant_credit
+from recycle.valuation import price_pending_submissions, tariff_table
+from config import Config
+
+REGION = "south"
+
+
+def test_concurrent_accepts_redeem_credit_once(client, register_customer):
+    customer_id, headers = register_customer(REGION)
+    response = client.post("/api/customers/orders/", headers=headers,
+                           json={"destination_address": "1 Test Street", "water_amount": 1000})
+    order_id = response.json()["id"]
+
+    async def seed():
+        async with shard_session(REGION) as session:
+            await session.execute(update(Order).where(Order.id == order_id).values(driver_charge=Decimal("30.00")))
+            await grant_credit(session, customer_id, Decimal("50.00"), None)
+            await session.commit()
+    client.portal.call(seed)
+
+    async def accept_twice():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+            url = f"/api/customers/orders/{order_id}/accept-charge/?use_credit=true"
+            return await asyncio.gather(http.post(url, headers=headers), http.post(url, headers=headers))
+    responses = client.portal.call(accept_twice)
+    assert sorted(response.status_code for response in responses) == [200, 400]
+
+    async def redemptions():
+        async with shard_session(REGION) as session:
+            entries = await session.scalars(select(CreditLedgerEntry.amount).where(CreditLedgerEntry.order_id == order_id))
+            return list(entries), await get_balance(session, customer_id)
+    assert client.portal.call(redemptions) == ([Decimal("-30.00")], Decimal("20.00"))
+
+
+def test_order_creation_is_rate_limited_per_customer(client, register_customer):
+    limit, _ = Config.RATE_LIMITS["create_order"]
+    _, spammer = register_customer(REGION)
+    _, neighbour = register_customer(REGION)
+    order = {"destination_address": "1 Test Street", "water_amount": 1000}
+
+    for _ in range(limit):
+        assert client.post("/api/customers/orders/", headers=spammer, json=order).status_code == 201
+    response = client.post("/api/customers/orders/", headers=spammer, json=order)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+    assert client.post("/api/customers/orders/", headers=neighbour, json=order).status_code == 201
+
+
+def test_pricing_skips_a_submission_reviewed_since_it_was_read(client, register_customer):
+    _, headers = register_customer(REGION)
+    submission = {"recyclable_type": "Race Test Bottles", "pickup_option": "dropoff", "pickup_address": None,
+                  "dropoff_location": "Depot 1", "image_url": "https://example.com/bottles.jpg"}
+    reviewed_id, pending_id = [
+        client.post("/api/customers/recyclables/", headers=headers, json=submission).json()["id"] for _ in range(2)
+    ]
+
+    class ReviewedMeanwhile:
+        """A session whose first query is followed by a reviewer crediting `reviewed_id`."""
+
+        def __init__(self, session):
+            self.session = session
+            self.reviewed = False
+
+        async def execute(self, *args, **kwargs):
+            result = await self.session.execute(*args, **kwargs)
+            if not self.reviewed:
+                self.reviewed = True
+                async with shard_session(REGION) as reviewer:
+                    await reviewer.execute(
+                        update(RecyclableSubmission).where(RecyclableSubmission.id == reviewed_id)
+                        .values(status=RecyclableStatus.CREDITED, estimated_value=Decimal("1.00"))
+                    )
+                    await reviewer.commit()
+            return result
+
+        async def commit(self):
+            await self.session.commit()
+
+    async def price():
+        tariff_table.load([("race test bottles", 2.5, 0.5)])
+        async with shard_session(REGION) as session:
+            priced = await price_pending_submissions(ReviewedMeanwhile(session))
+        async with shard_session(REGION) as session:
+            rows = await session.execute(
+                select(RecyclableSubmission.id, RecyclableSubmission.estimated_value)
+                .where(RecyclableSubmission.id.in_([reviewed_id, pending_id]))
+            )
+            return priced, dict(rows.all())
+    priced, estimates = client.portal.call(price)
+    assert estimates == {reviewed_id: Decimal("1.00"), pending_id: Decimal("2.50")}
+    assert priced == 1
+
+
+@pytest.mark.parametrize("amount", [0, -5])
+def test_a_review_cannot_credit_nothing_or_less(client, register_customer, create_staff, amount):
+    customer_id, headers = register_customer(REGION)
+    _, staff_headers = create_staff()
+    submission = {"recyclable_type": "Glass", "pickup_option": "dropoff", "pickup_address": None,
+                  "dropoff_location": "Depot 1", "image_url": "https://example.com/glass.jpg"}
+    submission_id = client.post("/api/customers/recyclables/", headers=headers, json=submission).json()["id"]
+    claimed = client.post("/api/admin/recyclables/claim-batch/?limit=50", headers=staff_headers).json()
+    assert submission_id in [claim["id"] for claim in claimed]
+
+    url = f"/api/admin/recyclables/{submission_id}/complete/"
+    response = client.patch(url, headers=staff_headers, json={"status": "credited", "credited_amount": amount})
+    assert response.status_code == 422
+    response = client.patch(url, headers=staff_headers, json={"status": "credited", "credited_amount": 4})
+    assert response.status_code == 200, response.text
+    assert response.json()["credited_amount"] == 4
+
+    async def balance():
+        async with shard_session(REGION) as session:
+            return await get_balance(session, customer_id)
+    assert client.portal.call(balance) == Decimal("4.00")
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from db.main import shard_session
+from db.models import Order, OrderStatus
+from driver.roster import driver_roster
+from feedback.ratings import feedback_writer
+
+REGION = "north"
+
+
+@pytest.fixture
+def driver_id(client, superadmin_headers):
+    response = client.post("/api/admin/drivers/", headers=superadmin_headers, json={
+        "first_name": "Test", "last_name": "Driver", "phone_number": "0800", "vehicle_details": "Tanker",
+        "is_active": True, "region": REGION,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+@pytest.fixture
+def delivered_order(client, register_customer):
+    """Create an order for a new customer and mark it delivered by `driver_id`; returns (order id, headers)."""
+    def create(driver_id):
+        _, headers = register_customer(REGION)
+        response = client.post("/api/customers/orders/", headers=headers,
+                               json={"destination_address": "1 Test Street", "water_amount": 1000})
+        assert response.status_code == 201, response.text
+        order_id = response.json()["id"]
+
+        async def deliver():
+            async with shard_session(REGION) as session:
+                await session.execute(
+                    update(Order).where(Order.id == order_id)
+                    .values(status=OrderStatus.DELIVERED, driver_id=driver_id)
+                )
+                await session.commit()
+        client.portal.call(deliver)
+        return order_id, headers
+    return create
+
+
+def rate(client, order_id, headers, stars):
+    return client.post(f"/api/customers/orders/{order_id}/feedback/", headers=headers, json={"rating": stars})
+
+
+def roster_entry(client, superadmin_headers, driver_id):
+    driver_roster.invalidate()
+    response = client.get(f"/api/admin/drivers/{driver_id}/", headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_aggregates_show_up_in_the_roster(client, superadmin_headers, driver_id, delivered_order):
+    for stars in (5, 4, 3):
+        order_id, headers = delivered_order(driver_id)
+        assert rate(client, order_id, headers, stars).status_code == 202
+    client.portal.call(feedback_writer.flush)
+
+    driver = roster_entry(client, superadmin_headers, driver_id)
+    assert driver["rating_count"] == 3
+    assert driver["rating_mean"] == 4.0
+    assert driver["rating_recent"] == pytest.approx(4.0, abs=0.01)
+
+    response = client.get(f"/api/admin/drivers/{driver_id}/feedback/", headers=superadmin_headers)
+    assert [feedback["rating"] for feedback in response.json()] == [3, 4, 5]
+
+
+def test_an_order_is_rated_once(client, superadmin_headers, driver_id, delivered_order):
+    order_id, headers = delivered_order(driver_id)
+    assert rate(client, order_id, headers, 5).status_code == 202
+    # Still buffered: accepted here, dropped by the insert
+    assert rate(client, order_id, headers, 1).status_code == 202
+    client.portal.call(feedback_writer.flush)
+    assert rate(client, order_id, headers, 1).status_code == 409
+
+    driver = roster_entry(client, superadmin_headers, driver_id)
+    assert driver["rating_count"] == 1
+    assert driver["rating_mean"] == 5.0
+
+
+def test_recent_mean_decays_older_ratings(client, superadmin_headers, driver_id, delivered_order):
+    half_life = timedelta(days=feedback_writer.half_life_seconds / 86400)
+    old_order, _ = delivered_order(driver_id)
+    new_order, _ = delivered_order(driver_id)
+    # Two batches, the first rated two half-lives ago
+    for order_id, stars, age in [(old_order, 1, 2 * half_life), (new_order, 5, timedelta(0))]:
+        feedback_writer.add({"order_id": order_id, "driver_id": driver_id, "customer_id": 0, "rating": stars,
+                             "comment": None, "created_at": datetime.utcnow() - age})
+        client.portal.call(feedback_writer.flush)
+
+    driver = roster_entry(client, superadmin_headers, driver_id)
+    assert driver["rating_mean"] == 3.0
+    # (1 x 0.25 + 5 x 1) / (0.25 + 1)
+    assert driver["rating_recent"] == pytest.approx(4.2, abs=0.01)
+
+
+def test_rating_of_a_deleted_driver_does_not_block_the_shard(client, superadmin_headers, driver_id, delivered_order):
+    gone_order, _ = delivered_order(driver_id)
+    order_id, headers = delivered_order(driver_id)
+    # Fails the drivers foreign key, in the same shard batch as a good rating
+    feedback_writer.add({"order_id": gone_order, "driver_id": 10 ** 6 + 1, "customer_id": 0, "rating": 1,
+                         "comment": None, "created_at": datetime.utcnow()})
+    assert rate(client, order_id, headers, 4).status_code == 202
+    client.portal.call(feedback_writer.flush)
+
+    assert feedback_writer.pending == 0
+    driver = roster_entry(client, superadmin_headers, driver_id)
+    assert driver["rating_count"] == 1
+    assert driver["rating_mean"] == 4.0
@@ -0,0 +1,208 @@
+import asyncio
+from datetime import datetime
+import pytest
+from sqlalchemy import event, func, select, text, update
+from sqlalchemy.orm import Session
+from db.main import engine, shard_session
+from db.models import Order, OrderStatus
+from order.archive import archive_orders_batch
+from order.forecast import FORECAST_LOCK_KEY, demand_forecaster
+from config import Config
+
+REGION = "north"
+
+
+@pytest.fixture
+def order_id(client, register_customer):
+    _, headers = register_customer(REGION)
+    response = client.post("/api/customers/orders/", headers=headers,
+                           json={"destination_address": "1 Test Street", "water_amount": 1000})
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+async def build_forecast():
+    # The app's own worker may be building one right now
+    for _ in range(100):
+        built = await demand_forecaster.refresh(force=True)
+        if built is not None:
+            return built
+        await asyncio.sleep(0.1)
+    raise AssertionError("The forecast lock was never free")
+
+
+def test_forecast_is_served_from_the_stored_build(client, superadmin_headers):
+    built = client.portal.call(build_forecast)
+
+    response = client.get("/api/admin/forecast/", headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["generated_at"] == built.model_dump(mode="json")["generated_at"]
+
+    # Only queues a rebuild for the worker; the request itself serves what is stored
+    response = client.get("/api/admin/forecast/?refresh=true", headers=superadmin_headers)
+    assert response.status_code == 200
+    assert response.json()["generated_at"] == built.model_dump(mode="json")["generated_at"]
+
+
+def test_a_fresh_forecast_is_not_rebuilt(client):
+    client.portal.call(build_forecast)
+    assert client.portal.call(demand_forecaster.refresh) is None
+
+
+def test_one_worker_builds_at_a_time(client):
+    async def refresh_while_locked():
+        async with engine.connect() as conn:
+            await conn.scalar(select(func.pg_advisory_lock(FORECAST_LOCK_KEY)))
+            try:
+                return await demand_forecaster.refresh(force=True)
+            finally:
+                await conn.scalar(select(func.pg_advisory_unlock(FORECAST_LOCK_KEY)))
+
+    assert client.portal.call(refresh_while_locked) is None
+
+
+def test_the_lock_is_released_with_the_transaction(client):
+    async def lock_after_refresh():
+        await build_forecast()
+        async with engine.connect() as conn:
+            locked = await conn.scalar(select(func.pg_try_advisory_lock(FORECAST_LOCK_KEY)))
+            await conn.scalar(select(func.pg_advisory_unlock(FORECAST_LOCK_KEY)))
+            return locked
+
+    assert client.portal.call(lock_after_refresh)
+
+
+def test_update_with_a_matching_if_match_returns_the_new_etag(client, superadmin_headers, order_id):
+    url = f"/api/admin/orders/{order_id}/update/"
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"water_amount": 2000})
+    assert response.status_code == 200, response.text
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["version"] == 2
+    assert response.json()["water_amount"] == 2000
+
+    # The returned ETag is good for the next change
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": response.headers["ETag"]},
+                            json={"water_amount": 3000})
+    assert response.headers["ETag"] == '"3"'
+
+
+def test_update_with_a_stale_if_match_fails(client, superadmin_headers, order_id):
+    url = f"/api/admin/orders/{order_id}/update/"
+    client.patch(url, headers=superadmin_headers, json={"water_amount": 2000})
+
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={"water_amount": 5})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == '"2"'
+    response = client.get(f"/api/admin/orders/{order_id}/", headers=superadmin_headers)
+    assert response.json()["water_amount"] == 2000
+
+
+def test_empty_update_only_checks_the_version(client, superadmin_headers, order_id):
+    url = f"/api/admin/orders/{order_id}/update/"
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"1"'}, json={})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"1"'
+
+    response = client.patch(url, headers={**superadmin_headers, "If-Match": '"7"'}, json={})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_write_that_loses_a_race_is_a_conflict(client, superadmin_headers, order_id):
+    client.patch(f"/api/admin/orders/{order_id}/update/", headers=superadmin_headers,
+                 json={"status": "pending_payment"})
+
+    def changed_meanwhile(session, flush_context, instances):
+        # Another request commits a change between this one's read and its write
+        if any(isinstance(obj, Order) and obj.id == order_id for obj in session.dirty):
+            session.execute(text("UPDATE orders SET version = version + 1 WHERE id = :id"), {"id": order_id})
+
+    event.listen(Session, "before_flush", changed_meanwhile)
+    try:
+        response = client.patch(f"/api/admin/orders/{order_id}/dispatch/", headers=superadmin_headers)
+    finally:
+        event.remove(Session, "before_flush", changed_meanwhile)
+    assert response.status_code == 409
+    response = client.get(f"/api/admin/orders/{order_id}/", headers=superadmin_headers)
+    assert response.json()["status"] == "pending_payment"
+
+
+def test_unknown_field_is_rejected(client, superadmin_headers, order_id):
+    response = client.get("/api/admin/orders/?fields=id,colour", headers=superadmin_headers)
+    assert response.status_code == 400
+    assert "colour" in response.json()["detail"]
+    response = client.get(f"/api/admin/orders/{order_id}/?fields=colour", headers=superadmin_headers)
+    assert response.status_code == 400
+
+
+def test_fields_trim_the_list_and_the_detail(client, superadmin_headers, order_id):
+    response = client.get("/api/admin/orders/?fields=id,status", headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()
+    assert all(set(order) == {"id", "status"} for order in response.json())
+
+    response = client.get(f"/api/admin/orders/{order_id}/?fields=water_amount,customer", headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    order = response.json()
+    assert set(order) == {"water_amount", "customer"}
+    assert order["water_amount"] == 1000
+    assert "hashed_password" not in order["customer"]
+
+
+@pytest.mark.parametrize("ids", [[], list(range(1, Config.BATCH_GET_MAX_IDS + 2))])
+def test_batch_get_takes_one_to_max_ids(client, superadmin_headers, ids):
+    response = client.post("/api/admin/orders/batch/", json={"ids": ids}, headers=superadmin_headers)
+    assert response.status_code == 422
+
+
+def test_batch_get_keeps_request_order_and_lists_missing_ids(client, superadmin_headers, register_customer):
+    _, north = register_customer("north")
+    _, south = register_customer("south")
+    order = {"destination_address": "1 Test Street", "water_amount": 1000}
+    first, second = [client.post("/api/customers/orders/", headers=headers, json=order).json()["id"]
+                     for headers in (north, south)]
+
+    ids = [second, 10 ** 9, first, second] + list(range(10 ** 9 + 1, 10 ** 9 + Config.BATCH_GET_MAX_IDS - 3))
+    assert len(ids) == Config.BATCH_GET_MAX_IDS
+    response = client.post("/api/admin/orders/batch/?fields=id,water_amount", json={"ids": ids},
+                           headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["items"] == [{"id": second, "water_amount": 1000}, {"id": first, "water_amount": 1000}]
+    assert response.json()["missing"] == [10 ** 9] + ids[4:]
+
+
+async def archive_delivered(order_id):
+    async with shard_session(REGION) as session:
+        await session.execute(update(Order).where(Order.id == order_id).values(
+            status=OrderStatus.DELIVERED, created_at=datetime(2025, 3, 10), updated_at=datetime(2025, 3, 20),
+        ))
+        await session.commit()
+        # The app's own archive worker may hold the lock, or move the row first
+        for _ in range(100):
+            await archive_orders_batch(session, datetime(2025, 4, 1), 1000)
+            partition = await session.scalar(
+                text("SELECT tableoid::regclass::text FROM orders_archive WHERE id = :id"), {"id": order_id}
+            )
+            if partition is not None:
+                live = await session.scalar(select(func.count()).select_from(Order).where(Order.id == order_id))
+                return partition, live
+            await asyncio.sleep(0.1)
+    raise AssertionError(f"Order {order_id} was never archived")
+
+
+def test_archived_order_is_still_served(client, superadmin_headers, register_customer):
+    _, headers = register_customer(REGION)
+    response = client.post("/api/customers/orders/", headers=headers,
+                           json={"destination_address": "1 Test Street", "water_amount": 1000})
+    order_id = response.json()["id"]
+
+    partition, live = client.portal.call(archive_delivered, order_id)
+    assert partition == "orders_archive_2025_03"
+    assert live == 0
+
+    response = client.get(f"/api/admin/orders/{order_id}/", headers=superadmin_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "delivered"
+    response = client.get(f"/api/customers/orders/{order_id}/", headers=headers)
+    assert response.status_code == 200, response.text
+    assert order_id in [order["id"] for order in client.get("/api/customers/orders/", headers=headers).json()]
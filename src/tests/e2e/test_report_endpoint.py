@@ -0,0 +1,74 @@
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete
+from db.main import async_session
+from db.models import ReportArtifact, ReportJob, ReportStatus
+from reports.jobs import ReportRunner
+
+
+def wait_until_finished(client, headers, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/admin/reports/{job_id}/", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Report {job_id} did not finish")
+
+
+def test_download_is_served_from_the_database(client, superadmin_headers):
+    response = client.post("/api/admin/reports/", headers=superadmin_headers, json={
+        "kind": "revenue_by_driver", "period_start": "2026-01-01", "period_end": "2026-02-01",
+    })
+    assert response.status_code == 202, response.text
+    job = wait_until_finished(client, superadmin_headers, response.json()["id"])
+    assert job["status"] == "done", job["error"]
+
+    response = client.get(f"/api/admin/reports/{job['id']}/download/", headers=superadmin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert f'filename="{job["id"]}-revenue_by_driver-2026-01-01-2026-02-01.csv"' in \
+        response.headers["content-disposition"]
+    assert response.text.splitlines()[0] == "driver,name,orders,litres,revenue"
+
+    # No file on any server's disk: losing the artifact row loses the download
+    async def drop_artifact():
+        async with async_session() as session:
+            await session.execute(delete(ReportArtifact).where(ReportArtifact.job_id == job["id"]))
+            await session.commit()
+    client.portal.call(drop_artifact)
+    response = client.get(f"/api/admin/reports/{job['id']}/download/", headers=superadmin_headers)
+    assert response.status_code == 404
+
+
+def test_lease_is_renewed_while_held_and_given_up_once_lost(client):
+    runner = ReportRunner(workers=1, chunk_size=100, lease_seconds=3)
+
+    async def add_job(claimed_by_id):
+        async with async_session() as session:
+            # Not queued, so the app's own worker leaves it alone
+            job = ReportJob(kind="revenue_by_driver", period_start=date(2026, 1, 1), period_end=date(2026, 2, 1),
+                            status=ReportStatus.DONE, requested_by_type="superadmin", requested_by_id=0,
+                            claimed_by_id=claimed_by_id, claim_expires_at=datetime.utcnow() + timedelta(seconds=3))
+            session.add(job)
+            await session.commit()
+            return job.id, job.claim_expires_at
+
+    async def renew_for(job_id, seconds):
+        renewal = asyncio.create_task(runner._renew_lease(job_id))
+        await asyncio.sleep(seconds)
+        lost = renewal.done()
+        renewal.cancel()
+        async with async_session() as session:
+            return lost, (await session.get(ReportJob, job_id)).claim_expires_at
+
+    job_id, expires_at = client.portal.call(add_job, runner.worker_id)
+    lost, renewed_until = client.portal.call(renew_for, job_id, 1.5)
+    assert not lost
+    assert renewed_until > expires_at
+
+    job_id, expires_at = client.portal.call(add_job, runner.worker_id + 1)
+    lost, renewed_until = client.portal.call(renew_for, job_id, 1.5)
+    assert lost
+    assert renewed_until == expires_at
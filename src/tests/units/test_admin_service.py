@@ -0,0 +1,124 @@
+from uuid import uuid4
+import msgpack
+import pytest
+from sqlalchemy import event, insert, select
+from db.main import async_session, engine, shard_session
+from db.models import Customer, TableVersion
+from utils import cache
+from utils.cache import VersionedCache
+
+
+def rows(name):
+    return [{"id": 1, "name": name * 100}]
+
+
+@pytest.mark.anyio
+async def test_least_recently_used_entries_are_evicted_past_the_byte_cap(monkeypatch):
+    async def unchanged(session, table_name):
+        return 1
+    monkeypatch.setattr(cache, "table_version", unchanged)
+    entry_size = len(msgpack.packb(rows("a")))
+    store = VersionedCache(max_bytes=2 * entry_size)
+    loads = []
+
+    async def get(key):
+        async def load():
+            loads.append(key)
+            return rows(key)
+        return await store.get_or_load(None, "staff", key, load)
+
+    await get("a")
+    await get("b")
+    await get("a")
+    await get("c")
+    assert len(store) == 2
+    assert store.size == 2 * entry_size
+    # b was least recently used, so it went and has to be loaded again
+    await get("a")
+    await get("b")
+    assert loads == ["a", "b", "c", "b"]
+
+    # Never kept at all if it alone is over the cap
+    async def load():
+        return rows("a")
+    too_big = VersionedCache(max_bytes=entry_size - 1)
+    await too_big.get_or_load(None, "staff", "a", load)
+    assert len(too_big) == 0 and too_big.size == 0
+
+
+def versions(client, region=None):
+    async def read():
+        async with (shard_session(region) if region else async_session()) as session:
+            return dict((await session.execute(select(TableVersion.table_name, TableVersion.version))).all())
+    return client.portal.call(read)
+
+
+def test_a_hit_costs_one_version_query(client):
+    store = VersionedCache(max_bytes=10 ** 6)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def load():
+        return rows("a")
+
+    async def get_twice():
+        async with async_session() as session:
+            await store.get_or_load(session, "staff", "all", load)
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                return await store.get_or_load(session, "staff", "all", load)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    assert client.portal.call(get_twice) == rows("a")
+    assert store.hits == 1
+    assert len(statements) == 1 and "table_versions" in statements[0]
+
+
+def test_staff_writes_bump_the_staff_version(client, superadmin_headers, create_staff):
+    staff_id, _ = create_staff()
+    before = versions(client)["staff"]
+    # Core UPDATE ... RETURNING
+    response = client.patch(f"/api/superadmin/staff/{staff_id}/update/", headers=superadmin_headers,
+                            json={"last_name": "Renamed"})
+    assert response.status_code == 200
+    assert versions(client)["staff"] == before + 1
+    # ORM insert
+    create_staff()
+    assert versions(client)["staff"] == before + 2
+
+    listed = client.get("/api/superadmin/staff/", headers=superadmin_headers).json()
+    assert "Renamed" in [staff["last_name"] for staff in listed]
+
+
+def test_driver_writes_bump_the_drivers_version_on_their_shard(client, superadmin_headers):
+    before = versions(client, "south").get("drivers", 0)
+    # ORM insert
+    response = client.post("/api/admin/drivers/", headers=superadmin_headers, json={
+        "first_name": "Test", "last_name": "Driver", "phone_number": "0800", "vehicle_details": "Tanker",
+        "is_active": True, "region": "south",
+    })
+    assert versions(client, "south")["drivers"] == before + 1
+    # Core UPDATE ... RETURNING
+    client.patch(f"/api/admin/drivers/{response.json()['id']}/update/", headers=superadmin_headers,
+                 json={"phone_number": "0801"})
+    assert versions(client, "south")["drivers"] == before + 2
+
+
+def test_customer_writes_bump_the_customers_version(client, register_customer):
+    before = versions(client).get("customers", 0)
+    # ORM insert through the route
+    register_customer("north")
+    assert versions(client)["customers"] == before + 1
+
+    async def core_insert():
+        async with async_session() as session:
+            await session.execute(insert(Customer).values(
+                first_name="Core", last_name="Insert", email=f"{uuid4().hex}@example.com", hashed_password="-",
+                region="north",
+            ))
+            await session.commit()
+    client.portal.call(core_insert)
+    assert versions(client)["customers"] == before + 2
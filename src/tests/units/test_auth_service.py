@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+import pytest
+from jose import jwt
+from config import Config
+from utils.helper_func import create_access_token
+from utils.mailer import MailQueue, SMTPPool, build_password_reset_email
+from utils.revocation import TokenDenylist, epoch_us
+from utils.smtp_stub import LocalSMTPServer
+
+pytestmark = pytest.mark.anyio
+
+
+def message(to: str) -> EmailMessage:
+    return build_password_reset_email(to, f"token-for-{to}")
+
+
+def mail_queue(server: LocalSMTPServer, pool_size: int = 2) -> MailQueue:
+    return MailQueue(SMTPPool(server.host, server.port, pool_size), batch_size=10, batch_interval_ms=20, max_size=100)
+
+
+async def test_queued_mail_reaches_the_relay():
+    async with LocalSMTPServer(port=0) as server:
+        queue = mail_queue(server)
+        await queue.start()
+        for i in range(5):
+            assert queue.enqueue(message(f"user{i}@wta.test"))
+        await queue.stop()
+    assert sorted(received["To"] for received in server.messages) == [f"user{i}@wta.test" for i in range(5)]
+    assert all(f"token={'token-for-' + received['To']}" in received.get_payload() for received in server.messages)
+
+
+async def test_pooled_connections_are_reused():
+    async with LocalSMTPServer(port=0) as server:
+        queue = mail_queue(server, pool_size=1)
+        await queue._send_lane([message("a@wta.test"), message("b@wta.test")])
+        await queue._send_lane([message("c@wta.test")])
+        assert queue.pool._open == 1
+        await queue.pool.close()
+    assert len(server.messages) == 3
+
+
+async def test_a_bad_message_does_not_drop_the_rest_of_its_lane():
+    unaddressed = EmailMessage()
+    unaddressed["Subject"] = "No recipients"
+    unaddressed.set_content("nobody")
+    async with LocalSMTPServer(port=0) as server:
+        queue = mail_queue(server, pool_size=1)
+        await queue._send_lane([message("a@wta.test"), unaddressed, message("b@wta.test")])
+        await queue.pool.close()
+    assert [received["To"] for received in server.messages] == ["a@wta.test", "b@wta.test"]
+
+
+async def test_dropped_connection_is_replaced():
+    async with LocalSMTPServer(port=0) as server:
+        queue = mail_queue(server, pool_size=1)
+        await queue._send_lane([message("a@wta.test")])
+        server.drop_connections()
+        await asyncio.sleep(0.05)
+        await queue._send_lane([message("b@wta.test")])
+        await queue.pool.close()
+    assert [received["To"] for received in server.messages] == ["a@wta.test", "b@wta.test"]
+
+
+async def test_failed_retry_logs_every_message_and_recovers(caplog):
+    server = LocalSMTPServer(port=0)
+    await server.start()
+    queue = mail_queue(server, pool_size=1)
+    await queue._send_lane([message("a@wta.test")])
+    # Relay goes away: the pooled connection is dead and reconnecting fails too
+    await server.stop()
+    with caplog.at_level(logging.ERROR, logger="utils.mailer"):
+        await queue._send_lane([message("b@wta.test"), message("c@wta.test")])
+    failed = [record.getMessage() for record in caplog.records if record.name == "utils.mailer"]
+    assert failed == ["Failed to send mail to b@wta.test", "Failed to send mail to c@wta.test"]
+    assert queue.pool._open == 0
+
+    restarted = LocalSMTPServer(port=server.port)
+    async with restarted:
+        await queue._send_lane([message("d@wta.test")])
+        await queue.pool.close()
+    assert [received["To"] for received in restarted.messages] == ["d@wta.test"]
+
+
+def denylist_revoking(user_id: int, revoked_at: datetime) -> TokenDenylist:
+    denylist = TokenDenylist(capacity=100, error_rate=0.01, rebuild_seconds=60, lookback_seconds=5)
+    denylist.add_subject("customer", user_id, revoked_at)
+    return denylist
+
+
+def claims(user_id: int, issued_at: datetime) -> dict:
+    return {"sub": user_id, "user_type": "customer", "iat": epoch_us(issued_at) // 1_000_000,
+            "iat_us": epoch_us(issued_at)}
+
+
+async def test_revocation_splits_tokens_within_the_same_second():
+    revoked_at = datetime(2026, 3, 1, 12, 0, 0, 500_000)
+    denylist = denylist_revoking(7, revoked_at)
+    assert await denylist.is_revoked(claims(7, revoked_at - timedelta(milliseconds=300)))
+    assert await denylist.is_revoked(claims(7, revoked_at))
+    assert not await denylist.is_revoked(claims(7, revoked_at + timedelta(milliseconds=300)))
+    assert not await denylist.is_revoked(claims(8, revoked_at - timedelta(days=1)))
+
+
+async def test_tokens_without_iat_us_are_placed_by_whole_seconds():
+    revoked_at = datetime(2026, 3, 1, 12, 0, 0, 500_000)
+    denylist = denylist_revoking(7, revoked_at)
+    same_second = claims(7, revoked_at + timedelta(milliseconds=300))
+    del same_second["iat_us"]
+    earlier_second = claims(7, revoked_at - timedelta(seconds=1))
+    del earlier_second["iat_us"]
+    assert not await denylist.is_revoked(same_second)
+    assert await denylist.is_revoked(earlier_second)
+    assert await denylist.is_revoked({"sub": 7, "user_type": "customer"})
+
+
+async def test_login_right_after_revoking_everything_stays_valid():
+    denylist = denylist_revoking(7, datetime.utcnow() - timedelta(microseconds=1))
+    token = create_access_token({"sub": "7", "user_type": "customer"})
+    payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
+    payload["sub"] = int(payload["sub"])
+    assert not await denylist.is_revoked(payload)
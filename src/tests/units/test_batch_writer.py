@@ -0,0 +1,103 @@
+import os
+import pickle
+from datetime import datetime
+import pytest
+from sqlalchemy import select
+from db.main import shard_session
+from db.models import OrderEvent
+from utils.batch_writer import BufferedBatchWriter
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingWriter(BufferedBatchWriter):
+    """Writes into a list instead of a shard, or fails every write while `down`."""
+
+    def __init__(self, tmp_path, **kwargs):
+        super().__init__(OrderEvent.__table__, shard_key=("orders", "order_id"), flush_interval_ms=10,
+                         batch_size=10, spill_path=str(tmp_path / "events.spill"), **kwargs)
+        self.written = []
+        self.down = False
+
+    async def _write(self, rows):
+        if self.down:
+            return rows
+        self.written.extend(rows)
+        return []
+
+
+def rows(start, count):
+    return [{"order_id": order_id, "event": "created"} for order_id in range(start, start + count)]
+
+
+async def test_spill_files_are_per_process(tmp_path):
+    writer = RecordingWriter(tmp_path)
+    await writer.start()
+    writer.down = True
+    for row in rows(1, 3):
+        writer.add(row)
+    await writer.stop()
+    assert os.listdir(tmp_path) == [f"events.spill.{os.getpid()}"]
+
+
+async def test_start_replays_every_spill_file_once(tmp_path):
+    # Left behind by two workers that have since exited, plus one from before files were per process
+    for name, batch in [("events.spill.101", rows(1, 2)), ("events.spill.102", rows(3, 2)), ("events.spill", rows(5, 1))]:
+        with open(tmp_path / name, "wb") as spill:
+            pickle.dump(batch, spill)
+
+    first, second = RecordingWriter(tmp_path), RecordingWriter(tmp_path)
+    await first.start()
+    await second.start()
+    await first.stop()
+    await second.stop()
+    assert sorted(row["order_id"] for row in first.written) == [1, 2, 3, 4, 5]
+    assert second.written == []
+    assert os.listdir(tmp_path) == []
+
+
+async def test_corrupt_spill_tail_is_skipped(tmp_path):
+    with open(tmp_path / "events.spill.101", "wb") as spill:
+        pickle.dump(rows(1, 2), spill)
+        spill.write(pickle.dumps(rows(3, 2))[:-7])
+
+    writer = RecordingWriter(tmp_path)
+    await writer.start()
+    await writer.stop()
+    assert [row["order_id"] for row in writer.written] == [1, 2]
+
+
+async def test_buffer_is_capped_by_spilling_the_oldest_rows(tmp_path):
+    writer = RecordingWriter(tmp_path, max_pending=20)
+    writer.down = True
+    for row in rows(1, 50):
+        writer.add(row)
+    await writer.flush()
+    assert writer.pending == 20
+    assert [row["order_id"] for row in writer._rows] == list(range(31, 51))
+    assert [row["order_id"] for row in writer._read_spill(str(tmp_path / f"events.spill.{os.getpid()}"))] == \
+        list(range(1, 31))
+
+
+def test_rejected_rows_do_not_hold_up_the_shard(client, register_customer, tmp_path):
+    _, headers = register_customer("south")
+    order_ids = [
+        client.post("/api/customers/orders/", json={"destination_address": "1 Test Street", "water_amount": 1000},
+                    headers=headers).json()["id"]
+        for _ in range(5)
+    ]
+    writer = BufferedBatchWriter(OrderEvent.__table__, shard_key=("orders", "order_id"), flush_interval_ms=10,
+                                 batch_size=10, spill_path=str(tmp_path / "events.spill"))
+    now = datetime.utcnow()
+    for index, order_id in enumerate(order_ids):
+        # event is NOT NULL, so the third row can never be written
+        writer.add({"order_id": order_id, "event": None if index == 2 else "poison-test", "actor_type": "customer",
+                    "changes": {}, "created_at": now})
+
+    client.portal.call(writer.flush)
+    assert writer.pending == 0
+
+    async def written():
+        async with shard_session("south") as session:
+            return set(await session.scalars(select(OrderEvent.order_id).where(OrderEvent.event == "poison-test")))
+    assert client.portal.call(written) == set(order_ids) - {order_ids[2]}
@@ -0,0 +1,40 @@
+import io
+import pytest
+from recycle.storage import ContentStore
+from utils.rate_limit import SlidingWindowLimiter, rate_limit
+
+
+def test_sliding_window_weights_the_previous_window():
+    limiter = SlidingWindowLimiter(4, 60)
+    assert [limiter.hit("customer", now=60 + second) for second in range(4)] == [0, 0, 0, 0]
+    assert limiter.hit("customer", now=64) > 0
+    # A quarter into the next window, three quarters of the previous four still count
+    assert limiter.hit("customer", now=135) == 0
+    assert limiter.hit("customer", now=135) > 0
+
+
+def test_unconfigured_route_is_refused():
+    with pytest.raises(ValueError, match="create_ordr"):
+        rate_limit("create_ordr")
+
+
+@pytest.mark.anyio
+async def test_upload_is_stored_once_with_a_thumbnail(tmp_path):
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new("RGB", (640, 480), "green").save(image, "PNG")
+
+    async def chunks():
+        yield image.getvalue()
+
+    store = ContentStore(str(tmp_path), chunk_size=1024, max_bytes=10 ** 6, thumbnail_size=64, thumbnail_workers=1)
+    try:
+        stored = await store.save(chunks())
+        assert stored.created
+        assert not (await store.save(chunks())).created
+        await store.ensure_thumbnail(stored.image_hash)
+    finally:
+        store.shutdown()
+    with Image.open(store.thumbnail_path(stored.image_hash)) as thumbnail:
+        assert thumbnail.size == (64, 48)
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime
+import numpy as np
+import pytest
+from sqlalchemy import event, insert
+from db.main import shard_engines, shard_session
+from db.models import DriverLocation
+from driver import tracking
+from driver.roster import DriverRoster
+from driver.tracking import DriverPositions, latest_position, parse_pings
+from config import Config
+
+
+def pings(*rows):
+    return np.asarray(rows, dtype=np.float64)
+
+
+def test_track_keeps_one_ping_per_sample_interval():
+    store = DriverPositions(sample_seconds=30)
+    assert store.update(1, pings((100, 6.5, 3.3), (110, 6.6, 3.4), (130, 6.7, 3.5), (140, 6.8, 3.6))) == \
+        [(100, 6.5, 3.3), (130, 6.7, 3.5)]
+    # The interval carries over between batches
+    assert store.update(1, pings((150, 6.9, 3.7))) == []
+    assert store.update(1, pings((160, 7.0, 3.8))) == [(160, 7.0, 3.8)]
+    assert store.get(1) == (7.0, 3.8, 160)
+    # Drivers are sampled independently
+    assert store.update(2, pings((150, 1.0, 2.0))) == [(150, 1.0, 2.0)]
+    assert store.get(3) is None
+
+
+def test_late_batch_does_not_move_the_live_position_back():
+    store = DriverPositions(sample_seconds=30)
+    store.update(1, pings((200, 6.5, 3.3)))
+    store.update(1, pings((100, 1.0, 1.0)))
+    assert store.get(1) == (6.5, 3.3, 200)
+
+
+def test_store_grows_past_its_capacity():
+    store = DriverPositions(sample_seconds=30, capacity=2)
+    for driver_id in range(5):
+        store.update(driver_id, pings((100 + driver_id, driver_id, driver_id)))
+    assert len(store) == 5
+    assert [store.get(driver_id) for driver_id in range(5)] == \
+        [(float(i), float(i), 100.0 + i) for i in range(5)]
+
+
+def test_invalid_pings_are_dropped_and_the_rest_sorted():
+    now = time.time()
+    parsed = parse_pings([[now - 10, 6.5, 3.3], [now - 20, 91, 3.3], [now - 30, 6.4, 3.2],
+                          [now + 3600, 6.5, 3.3], [0, 6.5, 3.3], [now - 5, 6.5, 181]])
+    assert parsed[:, 0].tolist() == [now - 30, now - 10]
+
+
+@pytest.fixture
+def positions(monkeypatch):
+    store = DriverPositions(sample_seconds=30)
+    monkeypatch.setattr(tracking, "driver_positions", store)
+    return store
+
+
+def latest(client, driver_id, track_point_age=None):
+    async def read():
+        async with shard_session("north") as session:
+            if track_point_age is not None:
+                await session.execute(insert(DriverLocation).values(
+                    driver_id=driver_id, lat=1.0, lon=2.0,
+                    recorded_at=datetime.utcfromtimestamp(time.time() - track_point_age),
+                ))
+                await session.commit()
+            return await latest_position(session, driver_id)
+    return client.portal.call(read)
+
+
+def test_fresh_live_position_is_used(client, positions):
+    now = time.time()
+    positions.update(900001, pings((now - 5, 6.5, 3.3)))
+    assert latest(client, 900001, track_point_age=1)[:2] == (6.5, 3.3)
+
+
+def test_stale_live_position_falls_back_to_a_newer_track_point(client, positions):
+    now = time.time()
+    positions.update(900002, pings((now - Config.GPS_STALE_SECONDS - 60, 6.5, 3.3)))
+    assert latest(client, 900002, track_point_age=10)[:2] == (1.0, 2.0)
+    # Another worker's pings are all that exist for this driver
+    assert latest(client, 900003, track_point_age=10)[:2] == (1.0, 2.0)
+
+
+def test_stale_positions_are_not_shown(client, positions):
+    now = time.time()
+    positions.update(900004, pings((now - Config.GPS_STALE_SECONDS - 60, 6.5, 3.3)))
+    assert latest(client, 900004) is None
+    assert latest(client, 900004, track_point_age=Config.GPS_STALE_SECONDS + 30) is None
+    assert latest(client, 900005) is None
+
+
+def add_driver(client, headers, region="south"):
+    response = client.post("/api/admin/drivers/", headers=headers, json={
+        "first_name": "Roster", "last_name": "Driver", "phone_number": "0800", "vehicle_details": "Tanker",
+        "vehicle_type": "tanker", "is_active": True, "region": region,
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def refresh_statements(client, roster):
+    """SQL sent to the south shard by one forced refresh."""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_engine = shard_engines["south"].sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count)
+    try:
+        client.portal.call(lambda: roster.refresh(force=True))
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count)
+    return statements
+
+
+def test_refresh_reads_only_rows_past_the_watermark(client, superadmin_headers):
+    roster = DriverRoster(refresh_seconds=3600, lookback_seconds=0)
+    driver_id = add_driver(client, superadmin_headers)
+    client.portal.call(roster.refresh)
+    watermark = roster._watermarks["south"]
+
+    # Nothing written: one version lookup and no driver query
+    statements = refresh_statements(client, roster)
+    assert len(statements) == 1 and "table_versions" in statements[0]
+
+    client.patch(f"/api/admin/drivers/{driver_id}/update/", headers=superadmin_headers, json={"phone_number": "0801"})
+    statements = refresh_statements(client, roster)
+    assert "drivers.updated_at >=" in statements[-1]
+    assert roster._watermarks["south"] > watermark
+    assert client.portal.call(roster.get, driver_id).phone_number == "0801"
+
+
+def test_a_miss_forces_a_refresh(client, superadmin_headers):
+    roster = DriverRoster(refresh_seconds=3600, lookback_seconds=0)
+    client.portal.call(roster.refresh)
+    # Created after the last refresh, as if through another worker
+    driver_id = add_driver(client, superadmin_headers)
+    assert driver_id not in [driver.id for driver in client.portal.call(roster.list)]
+
+    driver = client.portal.call(roster.get, driver_id)
+    assert driver is not None and driver.vehicle_type == "tanker"
+    assert driver_id in [driver.id for driver in client.portal.call(lambda: roster.list(vehicle_type="TANKER"))]
+
+    other_id = add_driver(client, superadmin_headers, region="north")
+    found = client.portal.call(roster.get_many, [driver_id, other_id, 10 ** 9])
+    assert list(found) == [driver_id, other_id]
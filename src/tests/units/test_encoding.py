@@ -0,0 +1,67 @@
+import json
+import msgpack
+import pytest
+from starlette.requests import Request
+from utils.encoding import (COLUMNAR_JSON, COLUMNAR_MSGPACK, JSON, MSGPACK, columnar, preferred_media_type,
+                            rows_response)
+
+ROWS = [
+    {"id": 1, "water_amount": 1000.0, "customer": {"id": 7, "first_name": "Ada"}},
+    {"id": 2, "water_amount": 500.0, "customer": {"id": 8, "first_name": "Grace"}},
+    {"id": 3, "water_amount": 750.0, "customer": {"id": 7, "first_name": "Ada"}},
+]
+
+
+def expand(table):
+    """The JSON rows back from a columnar table."""
+    refs = {field: [dict(zip(ref, values)) for values in zip(*ref.values())] for field, ref in table["refs"].items()}
+    columns = table["columns"]
+    return [
+        {field: refs[field][values[i]] if field in refs else values[i] for field, values in columns.items()}
+        for i in range(table["count"])
+    ]
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON),
+    ("", JSON),
+    ("*/*", JSON),
+    ("application/msgpack", MSGPACK),
+    ("application/x-msgpack", MSGPACK),
+    ("application/json;q=0.5, application/msgpack", MSGPACK),
+    ("application/msgpack;q=0.4, application/json;q=0.9", JSON),
+    ("application/msgpack;q=0, application/*;q=0.1", JSON),
+    # Equal quality: the first one listed wins
+    (f"{COLUMNAR_MSGPACK}, {COLUMNAR_JSON}", COLUMNAR_MSGPACK),
+    (f"text/html, {COLUMNAR_JSON};q=0.8", COLUMNAR_JSON),
+    ("text/html, image/png", JSON),
+    ("application/msgpack;q=high", JSON),
+])
+def test_accept_negotiation(accept, expected):
+    assert preferred_media_type(accept) == expected
+
+
+def test_columnar_sends_each_embedded_object_once():
+    table = columnar(ROWS)
+    assert table["count"] == 3
+    assert table["columns"]["customer"] == [0, 1, 0]
+    assert table["refs"]["customer"] == {"id": [7, 8], "first_name": ["Ada", "Grace"]}
+    assert expand(table) == ROWS
+    assert expand(columnar([])) == []
+
+
+def response_for(accept):
+    return rows_response(Request({"type": "http", "headers": [(b"accept", accept.encode())]}), ROWS)
+
+
+@pytest.mark.parametrize("accept, decode", [
+    (JSON, json.loads),
+    (MSGPACK, msgpack.unpackb),
+    (COLUMNAR_JSON, lambda body: expand(json.loads(body))),
+    (COLUMNAR_MSGPACK, lambda body: expand(msgpack.unpackb(body))),
+])
+def test_every_encoding_round_trips_to_the_json_rows(accept, decode):
+    response = response_for(accept)
+    assert response.media_type == accept
+    assert response.headers["Vary"] == "Accept"
+    assert decode(response.body) == ROWS
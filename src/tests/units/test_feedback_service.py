@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+import pytest
+from feedback.ratings import decay, rating_deltas
+
+DAY = 86400
+NOW = datetime(2026, 1, 31, 12, 0)
+
+
+def rating(driver_id, stars, days_ago=0):
+    return {"driver_id": driver_id, "rating": stars, "created_at": NOW - timedelta(days=days_ago)}
+
+
+def test_decay_halves_every_half_life():
+    assert decay(0, 30 * DAY) == 1.0
+    assert decay(30 * DAY, 30 * DAY) == pytest.approx(0.5)
+    assert decay(60 * DAY, 30 * DAY) == pytest.approx(0.25)
+    # Clock skew never makes a rating count more than a fresh one
+    assert decay(-DAY, 30 * DAY) == 1.0
+
+
+def test_deltas_are_per_driver_in_id_order():
+    deltas = rating_deltas([rating(7, 5), rating(3, 2), rating(7, 4)], NOW, 30 * DAY)
+    assert [delta["b_driver_id"] for delta in deltas] == [3, 7]
+    assert deltas[1]["b_count"] == 2
+    assert deltas[1]["b_sum"] == 9
+    assert all(delta["b_now"] == NOW for delta in deltas)
+
+
+def test_recent_mean_favours_newer_ratings():
+    [delta] = rating_deltas([rating(1, 5), rating(1, 1, days_ago=60)], NOW, 30 * DAY)
+    assert delta["b_sum"] / delta["b_count"] == 3
+    assert delta["b_recent_weight"] == pytest.approx(1.25)
+    assert delta["b_recent_sum"] / delta["b_recent_weight"] == pytest.approx(4.2)
@@ -0,0 +1,88 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from utils.log import ContextQueueHandler, JsonFormatter, RequestIdMiddleware, request_id_var
+
+
+def record(msg="%s litres", args=(1000,), **extra):
+    return logging.makeLogRecord({"name": "orders", "levelno": logging.INFO, "levelname": "INFO",
+                                  "msg": msg, "args": args, **extra})
+
+
+def test_json_lines_carry_the_request_id_and_extra_fields():
+    line = JsonFormatter().format(record(request_id="abc", order_id=7, region="north"))
+    entry = json.loads(line)
+    assert "\n" not in line
+    assert entry["level"] == "INFO" and entry["logger"] == "orders"
+    assert entry["msg"] == "1000 litres"
+    assert entry["request_id"] == "abc"
+    assert entry["order_id"] == 7 and entry["region"] == "north"
+    # Standard LogRecord attributes are not repeated
+    assert not {"args", "lineno", "pathname", "thread"} & set(entry)
+
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        failed = logging.makeLogRecord({"msg": "failed", "exc_info": sys.exc_info()})
+    entry = json.loads(JsonFormatter().format(failed))
+    assert "request_id" not in entry
+    assert "ValueError: boom" in entry["exc"]
+
+
+def test_queued_records_keep_the_request_id_of_the_caller():
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    items = ["a"]
+    token = request_id_var.set("req-1")
+    try:
+        handler.emit(record("items=%s", (items,)))
+    finally:
+        request_id_var.reset(token)
+    # Changed after the call, and read back on another thread with no request context
+    items.append("b")
+    lines = []
+    writer = threading.Thread(target=lambda: lines.append(JsonFormatter().format(records.get())))
+    writer.start()
+    writer.join()
+    entry = json.loads(lines[0])
+    assert entry["request_id"] == "req-1"
+    assert entry["msg"] == "items=['a']"
+
+
+@pytest.fixture
+def app_client():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"request_id": request_id_var.get()}
+
+    return TestClient(RequestIdMiddleware(app))
+
+
+@pytest.mark.parametrize("sent, echoed", [("trace-1.a_B", True), ("has space", False), ("x" * 65, False),
+                                          ("<script>", False), ("", False)])
+def test_request_id_header_is_echoed_only_when_well_formed(app_client, sent, echoed):
+    response = app_client.get("/ping", headers={"X-Request-ID": sent})
+    request_id = response.headers["X-Request-ID"]
+    assert response.json() == {"request_id": request_id}
+    if echoed:
+        assert request_id == sent
+    else:
+        assert request_id != sent and len(request_id) == 32
+
+
+def test_request_id_is_generated_per_request(app_client, caplog):
+    with caplog.at_level(logging.INFO, logger="access"):
+        first = app_client.get("/ping").headers["X-Request-ID"]
+        second = app_client.get("/ping").headers["X-Request-ID"]
+    assert first != second
+    assert request_id_var.get() is None
+    access = [entry for entry in caplog.records if entry.name == "access"]
+    assert [entry.getMessage() for entry in access] == ["GET /ping 200", "GET /ping 200"]
+    assert access[0].status == 200 and access[0].duration_ms >= 0
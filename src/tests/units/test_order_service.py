@@ -0,0 +1,103 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from db.models import Order
+from order.pricing import QuoteEngine, haversine_pairs_km, surge_table
+from order.schemas import OrderRead
+from utils.fieldsets import FieldSet
+from config import Config
+
+
+def compiled(fields):
+    stmt = select(Order).options(*FieldSet(OrderRead, fields).options(Order))
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_only_requested_columns_are_selected():
+    sql = compiled(["id", "water_amount"])
+    assert "orders.water_amount" in sql
+    assert "orders.destination_address" not in sql
+    assert "customers" not in sql
+
+
+def test_an_unrequested_relationship_is_not_joined():
+    assert "JOIN customers" not in compiled(["status"])
+    sql = compiled(["status", "customer"])
+    assert "JOIN customers" in sql
+    assert "customers_1.email" in sql
+    # Only what CustomerRead shows
+    assert "hashed_password" not in sql
+
+
+def test_every_field_joins_every_relationship_in_the_schema():
+    sql = compiled(None)
+    assert "JOIN customers" in sql
+    assert "orders.destination_address" in sql
+
+
+DEPOT = ("Depot", 6.45, 3.40, True)
+ISLAND = ("Island", 6.45, 3.50, False)
+# (min_litres, base_fee, per_litre, per_km)
+RATES = [(2000, 800, 0.5, 80), (500, 500, 1, 100)]
+NOON = datetime(2026, 3, 2, 12)
+
+
+@pytest.fixture
+def engine():
+    engine = QuoteEngine()
+    engine.load([DEPOT, ISLAND], RATES)
+    return engine
+
+
+def road_km(a, b):
+    return float(haversine_pairs_km([a[1]], [a[2]], [b[1]], [b[2]])[0]) * Config.ETA_ROAD_FACTOR
+
+
+def test_quote_prices_the_depot_leg_and_the_last_stretch(engine):
+    depot_km = road_km(DEPOT, ISLAND)
+    assert engine.quote_one(1000, ISLAND[1], ISLAND[2], NOON) == round(500 + 1000 + 100 * depot_km, 2)
+    # Volume picks the band
+    assert engine.quote_one(3000, ISLAND[1], ISLAND[2], NOON) == round(800 + 1500 + 80 * depot_km, 2)
+
+    door = ("Door", 6.46, 3.49, False)
+    expected = 500 + 1000 + 100 * (depot_km + road_km(ISLAND, door))
+    assert engine.quote_one(1000, door[1], door[2], NOON) == pytest.approx(expected, abs=0.01)
+
+
+def test_no_quote_without_coordinates_band_or_depot(engine):
+    assert engine.quote_one(1000, None, 3.5, NOON) is None
+    assert engine.quote_one(100, ISLAND[1], ISLAND[2], NOON) is None
+    no_depot = QuoteEngine()
+    no_depot.load([ISLAND], RATES)
+    assert not no_depot.ready
+    assert no_depot.quote_one(1000, ISLAND[1], ISLAND[2], NOON) is None
+    assert QuoteEngine().quote_one(1000, ISLAND[1], ISLAND[2], NOON) is None
+
+
+def test_surge_multipliers_apply_by_local_hour(engine, monkeypatch):
+    base = engine.quote_one(1000, ISLAND[1], ISLAND[2], NOON)
+    for hour, multiplier in Config.QUOTE_SURGE_MULTIPLIERS.items():
+        at = NOON.replace(hour=hour)
+        assert engine.quote_one(1000, ISLAND[1], ISLAND[2], at) == pytest.approx(base * multiplier, abs=0.01)
+
+    monkeypatch.setattr(Config, "QUOTE_UTC_OFFSET_HOURS", 1)
+    # 07:00 UTC is 08:00 local
+    assert engine.quote_one(1000, ISLAND[1], ISLAND[2], NOON.replace(hour=7)) == \
+        pytest.approx(base * Config.QUOTE_SURGE_MULTIPLIERS[8], abs=0.01)
+
+
+def test_surge_table_fills_unlisted_hours_with_one(monkeypatch):
+    monkeypatch.setattr(Config, "QUOTE_SURGE_MULTIPLIERS", {"7": 1.5, 25: 2.0})
+    table = surge_table()
+    assert table[7] == 1.5 and table[1] == 2.0
+    assert (table[[hour for hour in range(24) if hour not in (1, 7)]] == 1).all()
+
+
+def test_batch_quote_matches_single_quotes(engine):
+    amounts, lats, lons = [1000, 3000, 1000], [ISLAND[1], 6.46, float("nan")], [ISLAND[2], 3.49, 3.5]
+    at = [NOON, NOON.replace(hour=17), NOON]
+    quotes = engine.quote(amounts, lats, lons, at)
+    assert quotes[:2].tolist() == [engine.quote_one(*args) for args in zip(amounts[:2], lats[:2], lons[:2], at[:2])]
+    assert np.isnan(quotes[2])
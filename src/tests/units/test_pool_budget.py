@@ -0,0 +1,61 @@
+import pytest
+from config import Settings
+from db.main import check_regions, pool_settings
+
+
+@pytest.fixture(autouse=True)
+def without_test_shards(monkeypatch):
+    # Settings would merge in the shards the test run itself is configured with
+    monkeypatch.delenv("SHARD_DATABASE_URLS", raising=False)
+    monkeypatch.delenv("DEFAULT_REGION", raising=False)
+
+
+def settings(**values) -> Settings:
+    return Settings(DATABASE_URL="postgresql+asyncpg://localhost/wta", JWT_SECRET_KEY="x", JWT_ALGORITHM="HS256",
+                    ADMIN_EMAIL="a@wta.test", ADMIN_PASSWORD="x", **values)
+
+
+def test_budget_is_split_across_every_process():
+    pool = pool_settings(settings(DB_CONNECTION_BUDGET=200, WEB_CONCURRENCY=8, DB_NODE_COUNT=4))
+    assert pool["pool_size"] + pool["max_overflow"] == 6
+    assert pool["pool_size"] == 3
+
+
+def test_budget_never_overrun():
+    for budget in range(4, 60):
+        pool = pool_settings(settings(DB_CONNECTION_BUDGET=budget, WEB_CONCURRENCY=2, DB_NODE_COUNT=2))
+        assert (pool["pool_size"] + pool["max_overflow"]) * 4 <= budget
+
+
+def test_budget_below_process_count_is_refused():
+    with pytest.raises(ValueError, match="at least 12"):
+        pool_settings(settings(DB_CONNECTION_BUDGET=10, WEB_CONCURRENCY=4, DB_NODE_COUNT=3))
+
+
+SHARDS = {"north": "postgresql+asyncpg://localhost/wta_north", "south": "postgresql+asyncpg://localhost/wta_south"}
+
+
+def test_budget_is_split_across_directory_and_shards():
+    pool = pool_settings(settings(DB_CONNECTION_BUDGET=216, WEB_CONCURRENCY=8, DB_NODE_COUNT=3,
+                                  SHARD_DATABASE_URLS=SHARDS))
+    # 24 processes x (directory + 2 shards)
+    assert (pool["pool_size"] + pool["max_overflow"]) * 24 * 3 <= 216
+    assert pool["pool_size"] + pool["max_overflow"] == 3
+
+
+def test_shard_reusing_the_directory_shares_its_pool():
+    shards = {**SHARDS, "north": "postgresql+asyncpg://localhost/wta"}
+    pool = pool_settings(settings(DB_CONNECTION_BUDGET=40, SHARD_DATABASE_URLS=shards))
+    assert pool["pool_size"] + pool["max_overflow"] == 20
+
+
+def test_budget_below_pool_count_is_refused():
+    with pytest.raises(ValueError, match="at least 36"):
+        pool_settings(settings(DB_CONNECTION_BUDGET=30, WEB_CONCURRENCY=4, DB_NODE_COUNT=3, SHARD_DATABASE_URLS=SHARDS))
+
+
+def test_default_region_must_be_a_shard():
+    check_regions(settings(SHARD_DATABASE_URLS=SHARDS, DEFAULT_REGION="south"))
+    check_regions(settings())
+    with pytest.raises(ValueError, match="DEFAULT_REGION='default'"):
+        check_regions(settings(SHARD_DATABASE_URLS=SHARDS))
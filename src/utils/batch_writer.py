@@ -0,0 +1,209 @@
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Table, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from db.main import locate_many, shard_engines
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedBatchWriter:
+    """
+    Write-behind buffer for append-only tables. `add` only appends to an
+    in-memory list; a background task writes the buffer as multi-row INSERTs
+    every `flush_interval_ms`, or sooner once `batch_size` rows are waiting.
+    `shard_key` is (sharded table, column), e.g. ("orders", "order_id"): each
+    row goes to the shard holding the row that column refers to.
+
+    Rows a flush could not write stay buffered and are retried on the next
+    tick. A batch the database rejects as such (a constraint or bad value) is
+    split in halves until the offending rows are alone, and those are dropped.
+    `stop` drains the buffer before returning; if the database is unreachable
+    at that point the rows are appended to this process's `<spill_path>.<pid>`,
+    as are the oldest rows once more than `max_pending` are waiting. `start`
+    replays the spill files of every process, so nothing accepted by `add` is
+    lost on a clean shutdown.
+    """
+
+    def __init__(self, table: Table, shard_key: Tuple[str, str], flush_interval_ms: int, batch_size: int,
+                 spill_path: str, max_pending: int = 100_000):
+        self.table = table
+        self.shard_key = shard_key
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self.spill_path = spill_path
+        self.max_pending = max(self.batch_size, max_pending)
+        self._rows: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._worker: Optional[asyncio.Task] = None
+
+    def add(self, row: dict):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    async def start(self):
+        if self._worker is None:
+            await self._replay_spill()
+            self._stopping = False
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker after a last flush, spilling to disk whatever it could not write."""
+        if self._worker is None:
+            return
+        # Let the worker finish its current INSERT rather than cancelling it halfway
+        self._stopping = True
+        self._wakeup.set()
+        await self._worker
+        self._worker = None
+        if self._rows:
+            self._spill(self._rows)
+            self._rows = []
+
+    async def flush(self) -> int:
+        """Write everything buffered so far and return how many rows made it."""
+        rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        unwritten = await self._write(rows)
+        # Rows added while we were writing stay behind the ones being retried
+        self._rows[:0] = unwritten
+        if len(self._rows) > self.max_pending:
+            # The database has been away for a while; park the oldest rows on disk rather than grow without bound
+            overflow = len(self._rows) - self.max_pending
+            self._spill(self._rows[:overflow])
+            del self._rows[:overflow]
+        return len(rows) - len(unwritten)
+
+    async def _write(self, rows: List[dict]) -> List[dict]:
+        """INSERT rows shard by shard; returns the rows of shards that failed."""
+        table_name, column = self.shard_key
+        try:
+            regions = await locate_many(table_name, {row[column] for row in rows})
+        except Exception:
+            logger.exception("Locating the shards of %d %s rows failed", len(rows), self.table.name)
+            return rows
+        by_shard: Dict[str, List[dict]] = {}
+        for row in rows:
+            by_shard.setdefault(regions.get(row[column]), []).append(row)
+        orphans = by_shard.pop(None, [])
+        if orphans:
+            # No shard holds what they refer to, no retry is going to change that
+            logger.error("Dropping %d %s rows for unknown %s", len(orphans), self.table.name, table_name)
+        unwritten = []
+        for region, shard_rows in by_shard.items():
+            unwritten.extend(await self._write_shard(region, shard_rows))
+        return unwritten
+
+    async def _write_shard(self, region: str, rows: List[dict]) -> List[dict]:
+        """Write one shard's rows, bisecting around rows it rejects; returns the rows to retry."""
+        try:
+            async with shard_engines[region].begin() as conn:
+                await self.write_rows(conn, rows)
+            return []
+        except (IntegrityError, DataError) as exc:
+            if len(rows) == 1:
+                # Retrying will not make this row acceptable, and it would hold up the rest of the shard
+                logger.error("Dropping %s row the database rejects: %r (%s)", self.table.name, rows[0], exc.orig)
+                return []
+            middle = len(rows) // 2
+            return await self._write_shard(region, rows[:middle]) + await self._write_shard(region, rows[middle:])
+        except Exception:
+            logger.exception("Writing %d rows into %s on shard %s failed", len(rows), self.table.name, region)
+            return rows
+
+    async def write_rows(self, conn: AsyncConnection, rows: List[dict]):
+        """Write one shard's rows inside its transaction. Override to do more in the same transaction."""
+        await conn.execute(insert(self.table), rows)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            written = await self.flush()
+            if self._rows and not written:
+                # Nothing got through, back off instead of hammering a down database
+                await asyncio.sleep(max(self.flush_interval, 1))
+        await self.flush()
+
+    def _spill(self, rows: List[dict]):
+        # One file per process, so concurrent workers never interleave their appends
+        path = f"{self.spill_path}.{os.getpid()}"
+        logger.error("Spilling %d unwritten %s rows to %s", len(rows), self.table.name, path)
+        with open(path, "ab") as spill:
+            fcntl.flock(spill, fcntl.LOCK_EX)
+            pickle.dump(rows, spill)
+            spill.flush()
+            os.fsync(spill.fileno())
+
+    def _read_spill(self, path: str) -> List[dict]:
+        rows = []
+        with open(path, "rb") as spill:
+            # Wait out a process that opened the file before we claimed it and is still appending
+            fcntl.flock(spill, fcntl.LOCK_SH)
+            while True:
+                try:
+                    rows.extend(pickle.load(spill))
+                except EOFError:
+                    break
+                except Exception:
+                    # A write cut short by a crash; everything before it is intact
+                    logger.error("Ignoring corrupt tail of %s after %d rows", path, len(rows))
+                    break
+        return rows
+
+    def _replaying_elsewhere(self, path: str) -> bool:
+        """Whether `path` was claimed by another worker that is still running; a dead one's claim is ours to take."""
+        suffix = path[len(self.spill_path) + 1:]
+        if not suffix.startswith("replay-"):
+            return False
+        pid = int(suffix.split("-")[1])
+        if pid == os.getpid():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    async def _replay_spill(self):
+        """Replay every process's spill file (and one from before they were per process)."""
+        paths = sorted(glob.glob(f"{glob.escape(self.spill_path)}.*"))
+        if os.path.exists(self.spill_path):
+            paths.append(self.spill_path)
+        for index, path in enumerate(paths):
+            if self._replaying_elsewhere(path):
+                continue
+            # Renaming claims the file; a worker starting alongside us gets FileNotFoundError and moves on
+            claimed = f"{self.spill_path}.replay-{os.getpid()}-{index}"
+            try:
+                os.rename(path, claimed)
+                rows = self._read_spill(claimed)
+            except FileNotFoundError:
+                continue
+            os.remove(claimed)
+            if not rows:
+                continue
+            unwritten = await self._write(rows)
+            if unwritten:
+                # Still failing, put them back on disk for the next start
+                self._spill(unwritten)
+            logger.info("Replayed %d of %d spilled %s rows from %s",
+                        len(rows) - len(unwritten), len(rows), self.table.name, path)
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List
+import msgpack
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.versions import VERSIONED_TABLES, table_version
+from config import Config
+
+
+class VersionedCache:
+    """
+    Read-through cache of serialized query results for rarely written tables.
+    Entries are keyed by table and query shape and remember the table's
+    version (db/versions.py) at the time they were read, so a hit costs one
+    version lookup and any write to the table invalidates every shape of it.
+    Least recently used entries are evicted once the cached rows exceed
+    `max_bytes`, measured as their MessagePack size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # (table, key) -> (version, rows, size)
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get_or_load(self, session: AsyncSession, table_name: str, key: Hashable,
+                          load: Callable[[], Awaitable[List[Any]]]) -> List[Any]:
+        """Rows for `key`, from the cache if `table_name` has not been written since, else from `load()`."""
+        if table_name not in VERSIONED_TABLES:
+            raise ValueError(f"{table_name} has no version counter")
+        # Read the version first: a write landing during load() leaves the entry already stale
+        version = await table_version(session, table_name)
+        entry_key = (table_name, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        rows = await load()
+        self._store(entry_key, version, rows)
+        return rows
+
+    def _store(self, entry_key, version: int, rows: List[Any]):
+        size = len(msgpack.packb(rows, default=str))
+        previous = self._entries.pop(entry_key, None)
+        if previous is not None:
+            self.size -= previous[2]
+        if size > self.max_bytes:
+            return
+        self._entries[entry_key] = (version, rows, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+admin_cache = VersionedCache(Config.ADMIN_CACHE_MAX_BYTES)
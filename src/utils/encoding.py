@@ -0,0 +1,99 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Type
+import msgpack
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.wta.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.wta.columnar+msgpack"
+
+MEDIA_ALIASES = {"application/x-msgpack": MSGPACK, "*/*": JSON, "application/*": JSON}
+
+# For `responses=` on list routes, so the alternatives show up in the OpenAPI docs
+LIST_RESPONSES = {200: {"content": {MSGPACK: {}, COLUMNAR_JSON: {}, COLUMNAR_MSGPACK: {}}}}
+
+
+def columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Column-oriented layout of a list of objects: field names are sent once,
+    as keys of `columns`. Fields holding an object with an `id` (the embedded
+    customer, typically) become indexes into `refs[field]`, a columnar table
+    of the distinct objects, so each one is sent only once.
+    """
+    fields = list(rows[0]) if rows else []
+    columns: Dict[str, list] = {field: [] for field in fields}
+    refs: Dict[str, Dict[str, Any]] = {}
+    positions: Dict[str, Dict[Any, int]] = {}
+    for row in rows:
+        for field in fields:
+            value = row[field]
+            if isinstance(value, dict) and "id" in value:
+                seen = positions.setdefault(field, {})
+                index = seen.get(value["id"])
+                if index is None:
+                    index = seen[value["id"]] = len(seen)
+                    table = refs.setdefault(field, {name: [] for name in value})
+                    for name, column in table.items():
+                        column.append(value.get(name))
+                value = index
+            columns[field].append(value)
+    return {"count": len(rows), "columns": columns, "refs": refs}
+
+
+def encode_json(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+ENCODERS = {
+    JSON: encode_json,
+    MSGPACK: msgpack.packb,
+    COLUMNAR_JSON: lambda rows: encode_json(columnar(rows)),
+    COLUMNAR_MSGPACK: lambda rows: msgpack.packb(columnar(rows)),
+}
+
+
+def preferred_media_type(accept: Optional[str]) -> str:
+    """Best supported type in an Accept header, honouring q-values; JSON if nothing matches."""
+    if not accept:
+        return JSON
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        media_type = MEDIA_ALIASES.get(media_type, media_type)
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in ENCODERS and quality > 0:
+            candidates.append((-quality, position, media_type))
+    return min(candidates)[2] if candidates else JSON
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+def serialize_list(items: Sequence, schema: Type[BaseModel]) -> List[Dict[str, Any]]:
+    """ORM objects to JSON-safe dicts, exactly as response_model=List[schema] would."""
+    adapter = _list_adapter(schema)
+    return adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json")
+
+
+def rows_response(request: Request, rows: List[Dict[str, Any]]) -> Response:
+    """Encode already serialized rows in the format the client's Accept header asks for."""
+    media_type = preferred_media_type(request.headers.get("accept"))
+    return Response(content=ENCODERS[media_type](rows), media_type=media_type, headers={"Vary": "Accept"})
+
+
+def list_response(request: Request, items: Sequence, schema: Type[BaseModel]) -> Response:
+    """Encode a list endpoint's result in the format the client's Accept header asks for."""
+    return rows_response(request, serialize_list(items, schema))
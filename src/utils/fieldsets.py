@@ -0,0 +1,90 @@
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple, Type
+from fastapi import Query, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only
+from utils.helper_func import raise_http_exception
+
+
+@lru_cache(maxsize=None)
+def trimmed_schema(schema: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """`schema` reduced to `fields`, cached so each combination is only built once."""
+    return create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in fields},
+    )
+
+
+class FieldSet:
+    """
+    A validated `?fields=` selection for one response schema. `options(model)`
+    turns it into loader options, so only the requested columns are selected
+    and relationships nobody asked for are not joined at all. `fields` is None
+    when the client did not ask for a subset.
+    """
+
+    def __init__(self, schema: Type[BaseModel], fields: Optional[Sequence[str]] = None):
+        self.schema = schema
+        self.fields = tuple(dict.fromkeys(fields)) if fields else None
+        self.model = trimmed_schema(schema, self.fields) if self.fields else schema
+
+    def wants(self, name: str) -> bool:
+        return self.fields is None or name in self.fields
+
+    def options(self, model) -> list:
+        """load_only/joinedload options for querying `model` into this fieldset."""
+        mapper = inspect(model)
+        names = self.fields or tuple(self.schema.model_fields)
+        options = []
+        for name in names:
+            if name not in mapper.relationships:
+                continue
+            relationship = mapper.relationships[name]
+            loader = joinedload(relationship.class_attribute)
+            nested = self.schema.model_fields[name].annotation
+            if self.fields is not None and isinstance(nested, type) and issubclass(nested, BaseModel):
+                # Only the columns the nested schema shows, e.g. no hashed_password on a joined customer
+                target = relationship.mapper
+                loader = loader.load_only(*(
+                    target.column_attrs[field].class_attribute for field in nested.model_fields
+                    if field in target.column_attrs
+                ))
+            options.append(loader)
+        if self.fields is not None:
+            columns = [mapper.get_property_by_column(column).class_attribute for column in mapper.primary_key]
+            columns += [mapper.column_attrs[name].class_attribute for name in names if name in mapper.column_attrs]
+            # Deferred columns raise if touched instead of costing a query per row
+            options.append(load_only(*columns, raiseload=True))
+        return options
+
+    def render(self, obj):
+        """Response for a single object: the object itself when untrimmed, so response_model applies as usual."""
+        if self.fields is None:
+            return obj
+        return JSONResponse(self.model.model_validate(obj).model_dump(mode="json"))
+
+
+def fieldset(schema: Type[BaseModel]):
+    """Dependency parsing `?fields=a,b,c` against the fields of `schema`."""
+    allowed = list(schema.model_fields)
+
+    async def parse(
+        fields: Optional[str] = Query(
+            None, description=f"Comma-separated subset of: {', '.join(allowed)}. Omit for every field."
+        ),
+    ) -> FieldSet:
+        if not fields:
+            return FieldSet(schema)
+        names: List[str] = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in schema.model_fields]
+        if unknown:
+            raise_http_exception(
+                status.HTTP_400_BAD_REQUEST,
+                f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}",
+            )
+        return FieldSet(schema, names)
+
+    return parse
@@ -4,12 +4,15 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from db.main import get_session
+from db.main import get_session, is_region, shard_session
 from datetime import timedelta, datetime
+from uuid import uuid4
 from config import Config
 from db.models import Customer, Staff, SuperAdmin
+from utils.revocation import epoch_us, token_denylist
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 3600
+PASSWORD_RESET_PURPOSE = "password_reset"
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
@@ -27,17 +30,39 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode["exp"] = expire
+    issued_at = datetime.utcnow()
+    to_encode["iat"] = issued_at
+    # iat is whole seconds; revocation needs to tell apart tokens issued in the same second
+    to_encode["iat_us"] = epoch_us(issued_at)
+    # Identifies this token for logout / revocation
+    to_encode["jti"] = uuid4().hex
     encoded_jwt = jwt.encode(to_encode, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
     return encoded_jwt
 
+def create_password_reset_token(user_id: int, user_type: str):
+    """
+    Short-lived token embedded in reset emails. The purpose claim keeps it from
+    being accepted as an access token and vice versa.
+    """
+    return create_access_token(
+        {"sub": str(user_id), "user_type": user_type, "purpose": PASSWORD_RESET_PURPOSE},
+        expires_delta=timedelta(minutes=Config.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES),
+    )
+
+def create_driver_token(driver_id: int):
+    """Long-lived token for the driver app; only accepted by the driver endpoints."""
+    return create_access_token(
+        {"sub": str(driver_id), "user_type": "driver"},
+        expires_delta=timedelta(days=Config.DRIVER_TOKEN_EXPIRE_DAYS),
+    )
+
 # Error Handling
 def raise_http_exception(status_code: int, detail: str):
     raise HTTPException(status_code=status_code, detail=detail)
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
-):
+def decode_access_token_payload(token: str) -> dict:
+    """Claims of a valid access token (not a reset token), without touching the database."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,14 +72,41 @@ async def get_current_user(
         payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
         user_id = payload.get("sub")
         user_type = payload.get("user_type")
-        if user_id is None or user_type is None:
+        if user_id is None or user_type is None or payload.get("purpose") is not None:
             raise credentials_exception
         try:
-            user_id = int(user_id)
+            payload["sub"] = int(user_id)
         except ValueError:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    return payload
+
+def decode_access_token(token: str):
+    """(user_id, user_type) from an access token, without touching the database."""
+    payload = decode_access_token_payload(token)
+    return payload["sub"], payload["user_type"]
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    """Claims of the bearer token, rejected if it has been revoked."""
+    payload = decode_access_token_payload(token)
+    if await token_denylist.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload), session: AsyncSession = Depends(get_session)
+):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user_id, user_type = payload["sub"], payload["user_type"]
 
     user = None
     if user_type == "customer":
@@ -73,6 +125,32 @@ async def get_current_user(
         raise credentials_exception
     return user
 
+async def get_current_driver_id(payload: dict = Depends(get_token_payload)) -> int:
+    """
+    Driver id from a driver token. Deliberately does not touch the database,
+    this sits in front of the GPS ingestion hot path; the revocation check is
+    in memory unless the token is (probably) revoked.
+    """
+    if payload["user_type"] != "driver":
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload["sub"]
+
+def customer_region(current_user) -> str:
+    """Region of the shard holding the customer's orders and recyclables (the default one for staff)."""
+    region = getattr(current_user, "region", None) or Config.DEFAULT_REGION
+    if not is_region(region):
+        raise_http_exception(status.HTTP_503_SERVICE_UNAVAILABLE, f"Region {region} is not served by this deployment")
+    return region
+
+async def get_customer_shard_session(current_user = Depends(get_current_user)):
+    """Session on the shard holding the current customer's orders and recyclables."""
+    async with shard_session(customer_region(current_user)) as session:
+        yield session
+
 #  Authorization:  Check user type and permissions
 def is_staff_or_superadmin(current_user):
     if not isinstance(current_user, Staff) and not isinstance(current_user, SuperAdmin):
@@ -0,0 +1,159 @@
+import json
+import logging
+import queue
+import re
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from uuid import uuid4
+from config import Config
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Client-supplied ids are echoed into logs and headers, so only accept plain tokens
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+access_logger = logging.getLogger("access")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id, `extra=` fields and traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            entry["request_id"] = request_id
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread. Only what depends on the calling
+    context is resolved here: the message (its arguments may be mutated
+    later) and the request id. Formatting and I/O happen on the writer.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        record.request_id = request_id_var.get()
+        return record
+
+
+def skip_unused_record_fields():
+    """
+    Stop filling LogRecord fields the JSON lines do not show. Looking up the
+    calling function walks the stack and is the largest part of building a
+    record (see "Optimization" in the logging HOWTO).
+    """
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+
+_handler: Optional[ContextQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def start_logging(level: str = Config.LOG_LEVEL, levels: Optional[Dict[str, str]] = None, stream=None):
+    """
+    Route all logging, uvicorn's included, through a queue to a background
+    thread writing JSON lines to `stream` (stdout by default). Loggers below
+    their level return before building a record, so disabled debug calls cost
+    a level check; pass arguments %-style rather than pre-formatting them.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+    skip_unused_record_fields()
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(records, output, respect_handler_level=False)
+    _handler = ContextQueueHandler(records)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    for name, logger_level in (Config.LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    _listener.start()
+
+
+def stop_logging():
+    """Detach the queue handler and let the writer drain what is already queued."""
+    global _handler, _listener
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _handler, _listener = None, None
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving each request an id, taken from a well-formed
+    X-Request-ID header or generated. The id is attached to every record
+    logged while handling the request, echoed in the response header, and an
+    access line with status and duration is logged at INFO.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                access_logger.info(
+                    "%s %s %d", scope["method"], scope["path"], status_code,
+                    extra={"status": status_code, "duration_ms": round((time.perf_counter() - started) * 1000, 2)},
+                )
+            request_id_var.reset(token)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from email.message import EmailMessage
+from typing import List, Optional
+import aiosmtplib
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """
+    A small pool of persistent SMTP connections. Connections are opened lazily
+    and reused across batches so a send does not pay for a new TCP/TLS handshake.
+    """
+
+    def __init__(self, host: str, port: int, size: int, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = False):
+        self.host = host
+        self.port = port
+        self.size = max(1, size)
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self._idle: "asyncio.Queue[aiosmtplib.SMTP]" = asyncio.Queue()
+        self._open = 0
+
+    async def connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            use_tls=self.use_tls,
+        )
+        await client.connect()
+        return client
+
+    async def acquire(self) -> aiosmtplib.SMTP:
+        if self._idle.empty() and self._open < self.size:
+            self._open += 1
+            try:
+                return await self.connect()
+            except Exception:
+                self._open -= 1
+                raise
+        return await self._idle.get()
+
+    def release(self, client: aiosmtplib.SMTP, discard: bool = False):
+        if discard or not client.is_connected:
+            self._open -= 1
+            client.close()
+            return
+        self._idle.put_nowait(client)
+
+    async def close(self):
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+        self._open = 0
+
+
+class MailQueue:
+    """
+    In-process outbox for transactional email. Request handlers call `enqueue`
+    and return straight away; a background worker collects messages into
+    batches and fans each batch out over the pooled SMTP connections.
+    """
+
+    def __init__(self, pool: SMTPPool, batch_size: int, batch_interval_ms: int, max_size: int):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval_ms / 1000
+        self._queue: "asyncio.Queue[EmailMessage]" = asyncio.Queue(max_size)
+        self._worker: Optional[asyncio.Task] = None
+
+    def enqueue(self, message: EmailMessage) -> bool:
+        """Queue a message for delivery. Returns False if the outbox is full."""
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Mail queue full, dropping message to %s", message["To"])
+            return False
+        return True
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        """Flush whatever is still queued, then shut the worker and pool down."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Mail queue stopped with %d unsent messages", self._queue.qsize())
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self.pool.close()
+
+    async def _collect(self) -> List[EmailMessage]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._send_batch(batch)
+            except Exception:
+                logger.exception("Failed to send batch of %d messages", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send_batch(self, batch: List[EmailMessage]):
+        lanes = min(self.pool.size, len(batch))
+        await asyncio.gather(*(self._send_lane(batch[i::lanes]) for i in range(lanes)))
+
+    async def _send_lane(self, messages: List[EmailMessage]):
+        client = None
+        try:
+            for message in messages:
+                try:
+                    if client is None:
+                        client = await self.pool.acquire()
+                    try:
+                        await client.send_message(message)
+                    except aiosmtplib.SMTPServerDisconnected:
+                        # Idle pooled connections get dropped by the server; retry once on a fresh one.
+                        client.close()
+                        client = await self.pool.connect()
+                        await client.send_message(message)
+                except Exception:
+                    # Give up on this message only; the rest of the lane still gets its turn
+                    logger.exception("Failed to send mail to %s", message["To"])
+                    if client is not None and not client.is_connected:
+                        self.pool.release(client, discard=True)
+                        client = None
+        finally:
+            if client is not None:
+                self.pool.release(client)
+
+
+def build_password_reset_email(to: str, token: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = Config.MAIL_FROM
+    message["To"] = to
+    message["Subject"] = "Reset your password"
+    link = f"{Config.PASSWORD_RESET_URL}?token={token}"
+    message.set_content(
+        "We received a request to reset your password.\n\n"
+        f"Use the link below within {Config.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes:\n{link}\n\n"
+        "If you did not request this, you can ignore this email."
+    )
+    return message
+
+
+mail_queue = MailQueue(
+    SMTPPool(
+        Config.SMTP_HOST,
+        Config.SMTP_PORT,
+        Config.MAIL_POOL_SIZE,
+        username=Config.SMTP_USERNAME,
+        password=Config.SMTP_PASSWORD,
+        use_tls=Config.SMTP_USE_TLS,
+    ),
+    batch_size=Config.MAIL_BATCH_SIZE,
+    batch_interval_ms=Config.MAIL_BATCH_INTERVAL_MS,
+    max_size=Config.MAIL_QUEUE_MAX_SIZE,
+)
@@ -0,0 +1,87 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from fastapi import Header, HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def precondition_failed(current_version: Optional[int] = None):
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Modified by someone else since you read it; fetch it again and retry",
+        headers={"ETag": etag(current_version)} if current_version is not None else None,
+    )
+
+
+async def if_match(
+    if_match: Optional[str] = Header(
+        None, description='Version the change is based on, as returned in `version` or `ETag`, e.g. "3"'
+    ),
+) -> Optional[List[int]]:
+    """
+    Versions an If-Match header accepts, or None when there is no header or it
+    is `*`. Bare numbers are accepted as well as quoted ETags; weak ETags never
+    match, as If-Match requires a strong comparison.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and len(tag) > 1:
+            tag = tag[1:-1]
+        if tag.isdigit():
+            versions.append(int(tag))
+    if not versions:
+        precondition_failed()
+    return versions
+
+
+def check_version(obj, expected: Optional[List[int]]):
+    """Precondition check for a request that ends up not writing anything."""
+    if expected is not None and obj.version not in expected:
+        precondition_failed(obj.version)
+
+
+async def versioned_update(
+    session: AsyncSession,
+    model,
+    row_id: int,
+    values: Dict[str, Any],
+    expected: Optional[List[int]],
+    not_found: str,
+    previous: Sequence[str] = (),
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Apply `values` to one row of a model mapped with `version_id_col` in a
+    single UPDATE ... RETURNING, bumping its version, and only if the version
+    is one of `expected` (None: any). Returns the updated object and the
+    values the `previous` columns had before, read under a row lock in the
+    same statement. A lost race raises 412 with the current ETag; an extra
+    query is only made then, to tell it apart from a missing row.
+    """
+    stmt = update(model).where(model.id == row_id)
+    old_columns = []
+    if previous:
+        table = model.__table__
+        old = (
+            select(table.c.id, *(table.c[name] for name in previous))
+            .where(table.c.id == row_id)
+            .with_for_update()
+            .subquery("previous")
+        )
+        stmt = stmt.where(model.id == old.c.id)
+        old_columns = [old.c[name] for name in previous]
+    if expected is not None:
+        stmt = stmt.where(model.version.in_(expected))
+    stmt = stmt.values(**values, version=model.version + 1).returning(model, *old_columns)
+    row = (await session.execute(stmt, execution_options={"populate_existing": True})).first()
+    if row is None:
+        current_version = await session.scalar(select(model.version).where(model.id == row_id))
+        if current_version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found)
+        precondition_failed(current_version)
+    return row[0], dict(zip(previous, row[1:]))
@@ -0,0 +1,84 @@
+import math
+import time
+from typing import Dict, Hashable, Optional, Tuple
+from fastapi import Depends, HTTPException, status
+from utils.helper_func import oauth2_scheme, decode_access_token
+from config import Config
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding-window counter: each key keeps only the request counts of the
+    current and previous fixed window, and the previous count is weighted by
+    how much of it still overlaps the sliding window. That is three ints per
+    key instead of a timestamp per request. Keys idle for a full window are
+    swept once per window.
+    """
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window = float(window_seconds)
+        # key -> (window index, previous window count, current window count)
+        self._counters: Dict[Hashable, Tuple[int, int, int]] = {}
+        self._swept_window = 0
+
+    def __len__(self):
+        return len(self._counters)
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> int:
+        """Count a request for `key`. Returns 0 if allowed, otherwise the seconds to wait before retrying."""
+        now = time.monotonic() if now is None else now
+        window = int(now // self.window)
+        if window > self._swept_window:
+            self._sweep(window)
+        previous, current = 0, 0
+        counter = self._counters.get(key)
+        if counter is not None:
+            if counter[0] == window:
+                previous, current = counter[1], counter[2]
+            elif counter[0] == window - 1:
+                previous = counter[2]
+        elapsed = now - window * self.window
+        if previous * (1 - elapsed / self.window) + current + 1 > self.limit:
+            return self._retry_after(previous, current, elapsed)
+        self._counters[key] = (window, previous, current + 1)
+        return 0
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> int:
+        """Seconds until the weighted count leaves room for one more request."""
+        room = self.limit - 1
+        if current <= room and previous:
+            # The previous window's share decays enough before this window ends
+            wait = self.window * (1 - (room - current) / previous) - elapsed
+        else:
+            # Only in the next window, once this window's count has decayed enough
+            wait = (self.window - elapsed) + self.window * max(0.0, 1 - room / current if current else 0.0)
+        return max(1, math.ceil(wait))
+
+    def _sweep(self, window: int):
+        self._swept_window = window
+        self._counters = {key: counter for key, counter in self._counters.items() if counter[0] >= window - 1}
+
+
+def rate_limit(route: str):
+    """
+    Dependency enforcing Config.RATE_LIMITS[route] per authenticated user.
+    It only decodes the token, so a rejected request never reaches the
+    database. Limits are counted per worker process; a route without an
+    entry is refused at import rather than left unlimited.
+    """
+    if route not in Config.RATE_LIMITS:
+        raise ValueError(f"No rate limit configured for {route!r}; add it to RATE_LIMITS")
+    limit, window_seconds = Config.RATE_LIMITS[route]
+    limiter = SlidingWindowLimiter(limit, window_seconds)
+
+    async def check(token: str = Depends(oauth2_scheme)):
+        retry_after = limiter.hit(decode_access_token(token))
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    return check
@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from calendar import timegm
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.main import async_session
+from db.models import RevokedToken, RevokedSubject
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def epoch_us(moment: datetime) -> int:
+    """
+    Microseconds since the epoch of a naive UTC datetime. Access tokens carry
+    their issue time like this in `iat_us`, since `iat` is whole seconds.
+    """
+    return timegm(moment.utctimetuple()) * 1_000_000 + moment.microsecond
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. Sized for `capacity` items at
+    `error_rate` false positives; never gives a false negative. The `hashes`
+    bit positions are derived from one blake2b digest (double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenDenylist:
+    """
+    Per-worker view of revoked access tokens. Revoked jtis go into a Bloom
+    filter, so checking a valid token is a few hash lookups in memory; only a
+    filter hit is confirmed against `revoked_tokens`. Users whose tokens were
+    revoked wholesale are few and kept exactly, by the time of revocation.
+
+    `sync` pulls revocations made by other workers incrementally, and
+    periodically rebuilds the filter from the unexpired rows, dropping expired
+    ones and growing it when it filled past its capacity. Revocations made
+    through this worker apply at once.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, rebuild_seconds: int, lookback_seconds: int):
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self.lookback = timedelta(seconds=lookback_seconds)
+        self._filter = BloomFilter(capacity, error_rate)
+        # Confirmed revoked jtis, so a revoked token replayed repeatedly is not confirmed each time
+        self._confirmed: Set[str] = set()
+        # (user_type, user_id) -> epoch microseconds of the latest revocation
+        self._subjects: Dict[Tuple[str, int], int] = {}
+        self._watermark: Optional[datetime] = None
+        self._rebuilt_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def add(self, jti: str):
+        self._filter.add(jti)
+        self._confirmed.add(jti)
+
+    def add_subject(self, user_type: str, user_id: int, revoked_at: datetime):
+        key = (user_type, user_id)
+        self._subjects[key] = max(self._subjects.get(key, 0), epoch_us(revoked_at))
+
+    async def is_revoked(self, payload: dict) -> bool:
+        """Whether the decoded access token `payload` has been revoked."""
+        revoked_us = self._subjects.get((payload.get("user_type"), int(payload["sub"])))
+        if revoked_us is not None:
+            issued_us = payload.get("iat_us")
+            if issued_us is not None:
+                if issued_us <= revoked_us:
+                    return True
+            else:
+                # Older tokens only have whole-second iat: revoked if issued in an earlier second than
+                # the revocation, so a login right after it stays valid. Without iat they cannot be placed.
+                issued_at = payload.get("iat")
+                if issued_at is None or issued_at < revoked_us // 1_000_000:
+                    return True
+        jti = payload.get("jti")
+        if jti is None or jti not in self._filter:
+            return False
+        if jti in self._confirmed:
+            return True
+        async with async_session() as session:
+            result = await session.execute(select(RevokedToken.jti).where(RevokedToken.jti == jti))
+            if result.scalar() is None:
+                return False
+        self._confirmed.add(jti)
+        return True
+
+    async def sync(self, force_rebuild: bool = False):
+        async with self._lock:
+            async with async_session() as session:
+                if (force_rebuild or self._watermark is None
+                        or time.monotonic() - self._rebuilt_at >= self.rebuild_seconds
+                        or self._filter.count > self._filter.capacity):
+                    await self._rebuild(session)
+                else:
+                    await self._pull(session)
+
+    async def _pull(self, session: AsyncSession):
+        # Re-read a little before the watermark so rows committed late are not skipped
+        since = self._watermark - self.lookback
+        tokens = (await session.execute(
+            select(RevokedToken.jti, RevokedToken.revoked_at).where(RevokedToken.revoked_at >= since)
+        )).all()
+        subjects = (await session.execute(select(RevokedSubject).where(RevokedSubject.revoked_at >= since))).scalars().all()
+        for jti, revoked_at in tokens:
+            if jti not in self._filter:
+                self._filter.add(jti)
+            self._watermark = max(self._watermark, revoked_at)
+        for subject in subjects:
+            self.add_subject(subject.user_type, subject.user_id, subject.revoked_at)
+            self._watermark = max(self._watermark, subject.revoked_at)
+
+    async def _rebuild(self, session: AsyncSession):
+        started = time.monotonic()
+        now = datetime.utcnow()
+        await session.execute(delete(RevokedToken).where(RevokedToken.expires_at < now))
+        await session.commit()
+        tokens = (await session.execute(select(RevokedToken.jti, RevokedToken.revoked_at))).all()
+        subjects = (await session.execute(select(RevokedSubject))).scalars().all()
+        capacity = self._filter.capacity
+        while len(tokens) > capacity // 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity, self.error_rate)
+        watermark = now
+        for jti, revoked_at in tokens:
+            bloom.add(jti)
+            watermark = max(watermark, revoked_at)
+        self._subjects = {}
+        for subject in subjects:
+            self.add_subject(subject.user_type, subject.user_id, subject.revoked_at)
+            watermark = max(watermark, subject.revoked_at)
+        self._filter = bloom
+        self._confirmed = set()
+        self._watermark = watermark
+        self._rebuilt_at = started
+
+
+token_denylist = TokenDenylist(
+    Config.TOKEN_DENYLIST_CAPACITY,
+    Config.TOKEN_DENYLIST_ERROR_RATE,
+    Config.TOKEN_DENYLIST_REBUILD_SECONDS,
+    Config.TOKEN_DENYLIST_SYNC_SECONDS,
+)
+
+
+async def revoke_token(session: AsyncSession, payload: dict):
+    """Denylist one access token until it expires. Other workers pick it up on their next sync."""
+    if payload.get("jti") is None:
+        # Issued before tokens carried a jti: only revocable with the rest of the user's tokens
+        await revoke_subject(session, payload["user_type"], int(payload["sub"]))
+        return
+    await session.execute(
+        insert(RevokedToken)
+        .values(
+            jti=payload["jti"],
+            user_type=payload["user_type"],
+            user_id=int(payload["sub"]),
+            expires_at=datetime.utcfromtimestamp(payload["exp"]),
+            revoked_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+    )
+    await session.commit()
+    token_denylist.add(payload["jti"])
+
+
+async def revoke_subject(session: AsyncSession, user_type: str, user_id: int):
+    """Revoke every token issued to the user so far; tokens issued afterwards stay valid."""
+    revoked_at = datetime.utcnow()
+    await session.execute(
+        insert(RevokedSubject)
+        .values(user_type=user_type, user_id=user_id, revoked_at=revoked_at)
+        .on_conflict_do_update(
+            index_elements=[RevokedSubject.user_type, RevokedSubject.user_id],
+            set_={"revoked_at": revoked_at},
+        )
+    )
+    await session.commit()
+    token_denylist.add_subject(user_type, user_id, revoked_at)
+
+
+async def run_denylist_sync(interval: int = Config.TOKEN_DENYLIST_SYNC_SECONDS):
+    """Background loop keeping this worker's denylist in step with the revocation tables."""
+    while True:
+        try:
+            await token_denylist.sync()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Token denylist sync failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,109 @@
+import asyncio
+from email import message_from_bytes
+from email.message import Message
+from typing import List, Optional, Set
+
+
+class LocalSMTPServer:
+    """
+    Minimal in-process SMTP server that accepts every message and keeps it in
+    memory. Point SMTP_HOST/SMTP_PORT at it for tests and local development
+    instead of a real mail relay:
+
+        python -m utils.smtp_stub
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1025):
+        self.host = host
+        self.port = port
+        self.messages: List[Message] = []
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        # Port 0 lets the OS pick a free port; expose the one actually bound.
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self.drop_connections()
+            await self._server.wait_closed()
+            self._server = None
+
+    def drop_connections(self):
+        """Hang up on every connected client, as a relay dropping idle connections does."""
+        for writer in list(self._connections):
+            writer.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        self._connections.add(writer)
+        await reply("220 localhost WTA SMTP stand-in ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    await reply("250-localhost")
+                    await reply("250 8BITMIME")
+                elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    await reply("250 OK")
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    self.messages.append(message_from_bytes(await self._read_data(reader)))
+                    await reply("250 OK: queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_data(reader: asyncio.StreamReader) -> bytes:
+        lines = []
+        while True:
+            line = await reader.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            # Undo dot-stuffing (RFC 5321 4.5.2)
+            if line.startswith(b".."):
+                line = line[1:]
+            lines.append(line)
+        return b"".join(lines)
+
+
+async def _serve_forever(host: str, port: int):
+    server = LocalSMTPServer(host, port)
+    await server.start()
+    print(f"SMTP stand-in listening on {server.host}:{server.port}")
+    seen = 0
+    while True:
+        await asyncio.sleep(1)
+        for message in server.messages[seen:]:
+            print(f"--- To: {message['To']} | Subject: {message['Subject']}")
+            print(message.get_payload())
+        seen = len(server.messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve_forever("127.0.0.1", 1025))
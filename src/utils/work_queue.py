@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from typing import List, Sequence
+from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def claim_available(model):
+    """Rows nobody holds a live lease on."""
+    return or_(model.claim_expires_at.is_(None), model.claim_expires_at < datetime.utcnow())
+
+
+async def claim_rows(
+    session: AsyncSession,
+    model,
+    *,
+    ready: Sequence,
+    order_by: Sequence,
+    claimant_id: int,
+    lease_seconds: int,
+    limit: int = 1,
+) -> List[int]:
+    """
+    Lease up to `limit` ready rows of `model` to `claimant_id` and return their ids.
+
+    The candidate rows are picked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    concurrent claimers never wait on each other or receive the same row; a
+    row whose lease has expired becomes claimable again. The model needs
+    `claimed_by_id` and `claim_expires_at` columns. Commits the claim.
+    """
+    candidates = (
+        select(model.id)
+        .where(*ready, claim_available(model))
+        .order_by(*order_by)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.execute(
+        update(model)
+        .where(model.id.in_(candidates))
+        .values(
+            claimed_by_id=claimant_id,
+            claim_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds),
+        )
+        .returning(model.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = sorted(result.scalars().all())
+    await session.commit()
+    return claimed
+
+
+def held_by(model, claimant_id: int):
+    """Condition for rows `claimant_id` still holds a live lease on."""
+    return (model.claimed_by_id == claimant_id) & (model.claim_expires_at >= datetime.utcnow())
+
+
+def held_by_other(row, claimant_id: int) -> bool:
+    """True if someone other than `claimant_id` holds a live lease on a loaded row."""
+    return (
+        row.claimed_by_id is not None
+        and row.claimed_by_id != claimant_id
+        and row.claim_expires_at is not None
+        and row.claim_expires_at >= datetime.utcnow()
+    )
+
+
+async def release_claim(session: AsyncSession, model, row_id: int, claimant_id: int) -> bool:
+    result = await session.execute(
+        update(model)
+        .where(model.id == row_id, model.claimed_by_id == claimant_id)
+        .values(claimed_by_id=None, claim_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+async def renew_claim(session: AsyncSession, model, row_id: int, claimant_id: int, lease_seconds: int) -> bool:
+    """Extend a lease `claimant_id` still holds; False if it was lost. Commits."""
+    result = await session.execute(
+        update(model)
+        .where(model.id == row_id, held_by(model, claimant_id))
+        .values(claim_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount > 0